@@ -61,6 +61,12 @@ def get_parser(sys):
         "-c", "--config", type=Path, default=None, help="Override default config path"
     )
     parser.add_argument("--smelt_api", type=str, help="SMELT graphQL API endpoint")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="resume the last session of the update from its journal",
+    )
     group = parser.add_mutually_exclusive_group()
     group.add_argument(
         "-a",
@@ -0,0 +1,115 @@
+from logging import getLogger
+from traceback import format_exc
+
+from mtui.commands import Command
+from mtui.messages import NoRefhostsDefinedError
+from mtui.target.locks import TargetLockedError
+from mtui.template.batchtestreport import BatchTestReport
+from mtui.types.updateid import AutoOBSUpdateID
+from mtui.utils import complete_choices, requires_update
+
+logger = getLogger("mtui.command.batchupdate")
+
+
+class BatchUpdate(Command):
+    """
+    Applies the loaded update together with other updates of the same
+    product to the target hosts. The repositories of all updates are
+    added at once and their packages are prepared and updated in one
+    transaction per host. The pre-, post- and compare scripts of every
+    update are run and the package versions of each update are kept
+    with its testreport, so "export" writes all of them.
+    """
+
+    command = "batch_update"
+
+    @classmethod
+    def _add_arguments(cls, parser) -> None:
+        parser.add_argument(
+            "-a",
+            "--auto-review-id",
+            metavar="RequestReviewID",
+            type=AutoOBSUpdateID,
+            action="append",
+            required=True,
+            help="OBS request review id of another update, can be used"
+            " multiple times\nexample: SUSE:Maintenance:1:1",
+            dest="updates",
+        )
+        parser.add_argument(
+            "--newpackage",
+            action="store_const",
+            const="newpackage",
+            help="Install new packages after update",
+        )
+        parser.add_argument(
+            "--noprepare",
+            action="store_const",
+            const="noprepare",
+            help="Skip prepare procedure",
+        )
+        parser.add_argument(
+            "--noscript",
+            action="store_const",
+            const="noscript",
+            help="Don't run pre and post scripts",
+        )
+
+        cls._add_hosts_arg(parser)
+
+    @requires_update
+    def __call__(self):
+        targets = self.parse_hosts()
+        if not targets:
+            raise NoRefhostsDefinedError
+
+        reports = [self.metadata]
+        for update in self.args.updates:
+            if str(update.id) in {str(x.id) for x in reports}:
+                continue
+            logger.info("Loading {!s}".format(update.id))
+            reports.append(update.load_testreport(self.config))
+
+        batch = BatchTestReport(reports)
+        self.prompt.batch = reports[1:]
+        logger.info("Updating {!s}".format(batch.id))
+
+        params = [self.args.newpackage, self.args.noprepare, self.args.noscript]
+
+        try:
+            batch.perform_update(targets, params)
+
+        except TargetLockedError as e:
+            logger.warning(e)
+            logger.critical("failed to update target systems")
+            logger.debug(format_exc())
+            return
+        except Exception:
+            logger.critical("failed to update target systems")
+            logger.debug(format_exc())
+            self.prompt.notify_user(
+                "updating {!s} failed".format(batch.id), "stock_dialog-error"
+            )
+            raise
+
+        except KeyboardInterrupt:
+            logger.info("update process canceled")
+            return
+
+        self.prompt.notify_user("updating {!s} finished".format(batch.id))
+        logger.info("done")
+
+    @staticmethod
+    def complete(state, text, line, begidx, endidx):
+        return complete_choices(
+            [
+                ("-a", "--auto-review-id"),
+                ("-t", "--target"),
+                ("--noprepare",),
+                ("--newpackage",),
+                ("--noscript",),
+            ],
+            line,
+            text,
+            state["hosts"].names(),
+        )
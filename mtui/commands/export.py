@@ -17,6 +17,9 @@ class Export(Command):
     current testing template.
 
     To export a specific updatelog, provide the hostname as parameter.
+
+    After batch_update, the templates of the other updates are written
+    as well unless an output file is given.
     """
 
     command = "export"
@@ -42,6 +45,15 @@ class Export(Command):
         filename = (
             self.args.filename if self.args.filename else Path(self.metadata.path)
         )
+        self._export(self.metadata, filename, targets)
+
+        # updates applied along with the loaded one by batch_update are
+        # exported into their own templates
+        if not self.args.filename:
+            for metadata in self.prompt.batch:
+                self._export(metadata, Path(metadata.path), targets)
+
+    def _export(self, metadata, filename, targets):
         exporter = {
             (True, False): AutoExport,
             (False, True): KernelExport,
@@ -49,9 +61,7 @@ class Export(Command):
         }[(self.config.auto, self.config.kernel)]
 
         if issubclass(exporter, ManualExport):
-            results = self.metadata.report_results(
-                self.targets.select(targets).values()
-            )
+            results = metadata.report_results(self.targets.select(targets).values())
         else:
             results = []
 
@@ -59,10 +69,10 @@ class Export(Command):
             try:
                 template = exporter(
                     self.config,
-                    self.metadata.openqa,
+                    metadata.openqa,
                     text,
                     self.args.force,
-                    self.metadata.id,
+                    metadata.id,
                     self.prompt.interactive,
                     results=results,
                 ).run(targets)
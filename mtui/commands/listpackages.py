@@ -1,6 +1,5 @@
 from . import Command
 from .. import messages
-from ..types.rpmver import RPMVersion
 from ..utils import blue, complete_choices, green, red, requires_update, yellow
 
 
@@ -70,11 +69,11 @@ class ListPackages(Command):
             for p, v in list(pvs.items()):
                 if self.metadata:
                     try:
-                        wanted = target.packages[p].required
+                        wanted = target.packages[p].version("required")
                     except KeyError:
                         state = None
                     else:
-                        state = self._vers2state(v, RPMVersion(wanted))
+                        state = self._vers2state(v, wanted)
                 else:
                     state = "" if v else self.state_map[None]
 
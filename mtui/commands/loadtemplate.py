@@ -57,9 +57,8 @@ class LoadTemplate(Command):
                 return
 
         re_add = list(self.targets.keys())
-        for target in re_add:
-            self.targets[target].close()
-            del self.targets[target]
+        self.targets.close()
+        self.targets.clear()
 
         if self.args.update.kind == "kernel":
             self.config.kernel = True
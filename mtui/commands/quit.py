@@ -1,4 +1,3 @@
-import concurrent.futures
 import readline
 
 from mtui.commands import Command
@@ -22,20 +21,12 @@ class Quit(Command):
             help="reboot or poweroff refhosts",
         )
 
-    def _close_target(self, target, args):
-        self.targets[target].close(*args)
-        self.targets.pop(target)
-
     def __call__(self):
 
         args_ = [self.args.bootarg] if self.args.bootarg else []
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            targets = [
-                executor.submit(self._close_target, target, args_)
-                for target in set(self.targets)
-            ]
-            concurrent.futures.wait(targets, timeout=45)
+        self.targets.close(*args_, timeout=45)
+        self.targets.clear()
 
         try:
             readline.write_history_file(
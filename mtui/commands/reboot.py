@@ -0,0 +1,68 @@
+from logging import getLogger
+
+from mtui.commands import Command
+from mtui.messages import NoRefhostsDefinedError
+from mtui.target import reboot
+from mtui.utils import complete_choices
+
+logger = getLogger("mtui.commands.reboot")
+
+
+class Reboot(Command):
+    """
+    Reboots hosts and waits until they are reachable again. Hosts are
+    reconnected, their products are reloaded and the running kernel is
+    reported together with the downtime of each host. Hosts which didn't
+    boot the default kernel or snapshot set before the reboot are
+    reported with a warning.
+
+    Hosts are rebooted in parallel, use --wave-size to reboot only a
+    given number of hosts at once.
+    """
+
+    command = "reboot"
+
+    @classmethod
+    def _add_arguments(cls, parser) -> None:
+        parser.add_argument(
+            "-w",
+            "--wave-size",
+            type=int,
+            default=0,
+            help="number of hosts rebooted at once, all if omitted",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=600,
+            help="seconds to wait for each host to come back (default: 600)",
+        )
+        cls._add_hosts_arg(parser)
+
+    def __call__(self):
+        targets = self.parse_hosts()
+        if not targets:
+            raise NoRefhostsDefinedError
+
+        try:
+            results = reboot.Reboot(
+                targets, self.args.timeout, self.args.wave_size
+            ).run()
+        except KeyboardInterrupt:
+            logger.info("reboot canceled")
+            return
+
+        for hn in sorted(results):
+            self.display.list_reboot(hn, targets[hn].system, results[hn])
+
+            if hn in self.metadata.systems and not results[hn].error:
+                self.metadata.systems[hn] = targets[hn].get_system()
+
+    @staticmethod
+    def complete(state, text, line, begidx, endidx):
+        return complete_choices(
+            [("-t", "--target"), ("-w", "--wave-size"), ("--timeout",)],
+            line,
+            text,
+            state["hosts"].names(),
+        )
@@ -17,9 +17,7 @@ class ReloadProducts(Command):
 
     def __call__(self):
         targets = self.parse_hosts()
-        for target in targets:
-            system = targets[target]._parse_system()
-            targets[target].system = system
+        for target in targets.reload_products():
             logger.info("Reloaded products on refhost {}".format(target))
 
     @staticmethod
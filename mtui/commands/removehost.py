@@ -1,5 +1,3 @@
-import concurrent.futures
-
 from mtui.commands import Command
 from mtui.utils import complete_choices
 
@@ -17,18 +15,14 @@ class RemoveHost(Command):
     def _add_arguments(cls, parser) -> None:
         cls._add_hosts_arg(parser)
 
-    def _remove_target(self, target):
-        self.targets[target].close()
-        self.targets.pop(target)
-        if target in self.metadata.systems:
-            del self.metadata.systems[target]
-
     def __call__(self):
-        targets = list(self.parse_hosts(enabled=None).keys())
-        # for target in targets:
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            conn = [executor.submit(self._remove_target, target) for target in targets]
-            concurrent.futures.wait(conn, timeout=30)
+        targets = self.parse_hosts(enabled=None)
+        targets.close(timeout=30)
+
+        for target in targets.names():
+            self.targets.pop(target)
+            if target in self.metadata.systems:
+                del self.metadata.systems[target]
 
     @staticmethod
     def complete(state, text, line, begidx, endidx):
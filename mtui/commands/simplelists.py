@@ -1,3 +1,6 @@
+from argparse import ArgumentTypeError
+from datetime import datetime
+
 from mtui.commands import Command
 from mtui.utils import complete_choices, page, requires_update
 
@@ -32,6 +35,10 @@ class ListHosts(Command):
     current state.
 
     State could be "Enabled", "Disabled" or "Dryrun".
+
+    The state of the last background job on the host, like the
+    repository warm-up or the prefetch of the update packages, is shown
+    as well.
     """
 
     command = "list_hosts"
@@ -169,6 +176,13 @@ class ListVersions(Command):
         )
 
 
+def _timestamp(date):
+    try:
+        return int(datetime.fromisoformat(date).timestamp())
+    except ValueError:
+        raise ArgumentTypeError("invalid date: {!r}".format(date))
+
+
 class ListHistory(Command):
     """
     Lists a history of mtui events on the target hosts like installing
@@ -178,7 +192,7 @@ class ListHistory(Command):
 
     command = "list_history"
 
-    filters = set(["connect", "disconnect", "install", "update", "downgrade"])
+    filters = set(["connect", "disconnect", "install", "update", "downgrade", "reboot"])
 
     @classmethod
     def _add_arguments(cls, parser) -> None:
@@ -190,6 +204,15 @@ class ListHistory(Command):
             choices=cls.filters,
             help="event to list",
         )
+        parser.add_argument(
+            "-s",
+            "--since",
+            type=_timestamp,
+            help="list events since date, e.g. 2021-03-01 or '2021-03-01 12:00'",
+        )
+        parser.add_argument(
+            "-u", "--until", type=_timestamp, help="list events until date"
+        )
         cls._add_hosts_arg(parser)
 
     def __call__(self):
@@ -200,17 +223,26 @@ class ListHistory(Command):
         if len(targets) >= 3:
             count = 10
 
-        targets.report_history(self.display.list_history, count, option)
+        targets.report_history(
+            self.display.list_history,
+            count,
+            option,
+            self.args.since,
+            self.args.until,
+        )
 
     @staticmethod
     def complete(state, text, line, begidx, endidx):
         cstring = [
             ("-t", "--target"),
             ("-e", "--event"),
+            ("-s", "--since"),
+            ("-u", "--until"),
             ("connect",),
             ("disconnect",),
             ("update",),
             ("downgrade",),
             ("install",),
+            ("reboot",),
         ]
         return complete_choices(cstring, line, text, state["hosts"].names())
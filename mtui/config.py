@@ -155,6 +155,62 @@ class Config:
                 Path("/usr/share/qam-metadata/refhosts.yml"),
                 Path,
             ),
+            (
+                "facts_cache",
+                ("mtui", "facts_cache"),
+                True,
+                bool,
+                self.config.getboolean,
+            ),
+            (
+                "hostlog_limit",
+                ("mtui", "hostlog_limit"),
+                0,
+                int,
+                self.config.getint,
+            ),
+            (
+                "lock_registry",
+                ("mtui", "lock_registry"),
+                "",
+                lambda p: Path(p).expanduser() if p else None,
+            ),
+            ("lock_lease", ("mtui", "lock_lease"), 300, int, self.config.getint),
+            (
+                "prefetch",
+                ("mtui", "prefetch"),
+                True,
+                bool,
+                self.config.getboolean,
+            ),
+            (
+                "warm_up",
+                ("mtui", "warm_up"),
+                True,
+                bool,
+                self.config.getboolean,
+            ),
+            (
+                "repo_cache",
+                ("mtui", "repo_cache"),
+                False,
+                bool,
+                self.config.getboolean,
+            ),
+            (
+                "session_journal",
+                ("mtui", "session_journal"),
+                True,
+                bool,
+                self.config.getboolean,
+            ),
+            (
+                "snapshot_rollback",
+                ("mtui", "snapshot_rollback"),
+                True,
+                bool,
+                self.config.getboolean,
+            ),
             (
                 "use_keyring",
                 ("mtui", "use_keyring"),
@@ -11,6 +11,7 @@ import socket
 import stat
 import sys
 import termios
+from threading import Lock, Thread
 import tty
 from logging import getLogger
 from pathlib import Path
@@ -24,6 +25,11 @@ from .utils import termsize
 logger = getLogger("mtui.connection")
 RETRIES: int = 5
 
+# remote ports forwarded to local ports, kept for the whole session so
+# URLs pointing at a forwarded port stay valid across reconnects
+_remote_ports = {}
+_remote_ports_mutex = Lock()
+
 
 if not sys.warnoptions:
     import warnings
@@ -59,6 +65,7 @@ class Connection:
         "stdin",
         "command",
         "stderr",
+        "forwards",
     ]
 
     def __init__(self, hostname: str, port: Union[int, str], timeout: int) -> None:
@@ -110,6 +117,9 @@ class Connection:
 
     def connect(self):
         """connect to the remote host using paramiko as ssh subsystem"""
+        # forwardings don't survive the transport
+        self.forwards = {}
+
         cfg = paramiko.config.SSHConfig()
         try:
             with Path("~/.ssh/config").expanduser().open() as fd:
@@ -198,9 +208,13 @@ class Connection:
             )
 
             # wait 10s and try to reconnect
+            forwards = list(self.forwards)
             select.select([], [], [], 10)
             self.connect()
 
+            for local_port in forwards:
+                self.forward_remote(local_port)
+
         assert self.is_active()
 
     def new_session(self):
@@ -251,6 +265,77 @@ class Connection:
                 # pass all exceptions since the session is already closed or broken
                 pass
 
+    def forward_remote(self, local_port):
+        """forward a port on the remote loopback to local_port on localhost
+
+        The forwarding is set up once per connection and set up again
+        after a reconnect. The remote port is the same for the whole
+        session, the first one bound is requested again on new
+        connections to the host.
+
+        returns: port bound on the remote host
+        """
+
+        if local_port not in self.forwards:
+            transport = self.client.get_transport()
+
+            def handler(channel, origin, server):
+                # called from the transport thread, which must not block
+                Thread(
+                    target=self.__forward, args=(channel, local_port), daemon=True
+                ).start()
+
+            key = (self.hostname, local_port)
+            with _remote_ports_mutex:
+                port = _remote_ports.get(key, local_port)
+                try:
+                    bound = transport.request_port_forward("127.0.0.1", port, handler)
+                except paramiko.SSHException:
+                    if key in _remote_ports:
+                        logger.warning(
+                            "{!s}: remote port {!s} is taken, repositories added"
+                            " before use the old port".format(self.hostname, port)
+                        )
+                    bound = transport.request_port_forward("127.0.0.1", 0, handler)
+                _remote_ports[key] = bound
+            self.forwards[local_port] = bound
+            logger.debug(
+                "forwarding {!s}:{!s} to localhost:{!s}".format(
+                    self.hostname, self.forwards[local_port], local_port
+                )
+            )
+
+        return self.forwards[local_port]
+
+    @staticmethod
+    def __forward(channel, port):
+        """copy data between a forwarded channel and a local port"""
+        try:
+            sock = socket.create_connection(("127.0.0.1", port))
+        except OSError as e:
+            logger.debug("forwarding to localhost:{!s} failed: {!s}".format(port, e))
+            channel.close()
+            return
+
+        try:
+            while True:
+                ready, _, _ = select.select([sock, channel], [], [])
+                if sock in ready:
+                    data = sock.recv(32768)
+                    if not data:
+                        break
+                    channel.sendall(data)
+                if channel in ready:
+                    data = channel.recv(32768)
+                    if not data:
+                        break
+                    sock.sendall(data)
+        except (OSError, EOFError):
+            pass
+        finally:
+            channel.close()
+            sock.close()
+
     def __run_command(self, command):
         """open new session and run command in it
 
@@ -269,7 +354,7 @@ class Connection:
             return False
         return session
 
-    def run(self, command, lock=None):
+    def run(self, command, lock=None, feed=None):
         """run command over SSH channel
 
         Blocks until command terminates. returncode of issued command is returned.
@@ -281,11 +366,29 @@ class Connection:
         Keyword arguments:
         command -- the command to run
         lock    -- lock object for write on stdout
+        feed    -- callable receiving stdout in chunks as it arrives
         """
 
         self.stdin = command
         self.stdout = ""
         self.stderr = ""
+
+        exitcode, self.stdout, self.stderr = self.execute(command, lock, feed)
+        return exitcode
+
+    def execute(self, command, lock=None, feed=None, interactive=True):
+        """run command over SSH channel and return its results
+
+        Same as run() but doesn't store the output in the connection, so it
+        can be used from other threads while run() is in progress.
+
+        Keyword arguments:
+        interactive -- if False, a timeout raises CommandTimeout instead of
+                       asking the user, for commands run in background
+
+        returns: (exitcode, stdout, stderr)
+        """
+
         stdout = b""
         stderr = b""
 
@@ -308,6 +411,10 @@ class Connection:
             if select.select([session], [], [], self.timeout) == ([], [], []):
                 assert session
 
+                if not interactive:
+                    self.close_session(session)
+                    raise CommandTimeout(command)
+
                 # writing on stdout needs locking as all run threads could
                 # write at the same time to stdout
                 if lock:
@@ -336,6 +443,8 @@ class Connection:
                 if session.recv_ready():
                     buffer = session.recv(1024)
                     stdout += buffer
+                    if feed:
+                        feed(buffer)
                     for line in buffer.decode("utf-8", "ignore").split("\n"):
                         if line:
                             logger.debug(line)
@@ -356,9 +465,7 @@ class Connection:
         exitcode = session.recv_exit_status()
 
         self.close_session(session)
-        self.stdout = stdout.decode("utf-8")
-        self.stderr = stderr.decode("utf-8")
-        return exitcode
+        return exitcode, stdout.decode("utf-8"), stderr.decode("utf-8")
 
     def __invoke_shell(self, width, height):
         """
@@ -50,7 +50,7 @@ class CommandPromptDisplay:
             )
         self.println()
 
-    def list_host(self, hostname, system, state, exclusive):
+    def list_host(self, hostname, system, state, exclusive, background=None):
         if exclusive:
             mode = "serial"
         else:
@@ -63,9 +63,15 @@ class CommandPromptDisplay:
         else:
             state = red("Disabled")
 
+        job = ""
+        if background:
+            name, status = background
+            color = {"running": yellow, "failed": red}.get(status, green)
+            job = " [{}: {}]".format(name, color(status))
+
         self.println(
-            "{0:20} {1:20}: {2} ({3})".format(
-                hostname, "({!s})".format(system), state, mode
+            "{0:20} {1:20}: {2} ({3}){4}".format(
+                hostname, "({!s})".format(system), state, mode, job
             )
         )
 
@@ -94,6 +100,30 @@ class CommandPromptDisplay:
                 "{0:20} {1:20}: {2}".format(hostname, system, green("not locked"))
             )
 
+    def list_reboot(self, hostname, system, result):
+        system = "({!s})".format(system)
+        if result.error:
+            self.println(
+                "{0:20} {1:20}: {2}".format(
+                    hostname, system, red("failed ({})".format(result.error))
+                )
+            )
+            return
+
+        msg = "up after {:.0f}s".format(result.downtime)
+        if result.after:
+            msg += ", kernel {}".format(result.after.kernel)
+            if result.before and result.before.kernel != result.after.kernel:
+                msg += " (was {})".format(result.before.kernel)
+            if result.after.snapshot:
+                msg += ", snapshot {}".format(result.after.snapshot)
+        if result.unexpected:
+            msg += ", booted {}".format(", ".join(result.unexpected))
+            msg = yellow(msg)
+        else:
+            msg = green(msg)
+        self.println("{0:20} {1:20}: {2}".format(hostname, system, msg))
+
     def list_sessions(self, hostname, system, stdout):
         self.println("sessions on {} ({}):".format(hostname, system))
         self.println(stdout)
@@ -3,8 +3,6 @@ import re
 from itertools import zip_longest
 from logging import getLogger
 
-from mtui.types.rpmver import RPMVersion
-
 from .base import BaseExport
 
 logger = getLogger("mtui.export.manual")
@@ -117,7 +115,6 @@ class ManualExport(BaseExport):
 
         # add package version log and script results for each host to the template
         for host in self.results:
-            versions = {}
             hostname = host.hostname
             systemtype = host.system
 
@@ -136,7 +133,6 @@ class ManualExport(BaseExport):
                 logger.warning(f"host section {hostname} not found")
                 continue
             for state in ["before", "after"]:
-                versions[state] = {}
                 try:
                     index = self.template.index("      {state}:\n", index) + 1
                 except ValueError:
@@ -149,7 +145,6 @@ class ManualExport(BaseExport):
                 for package in host.packages.values():
                     name = package.name
                     version = getattr(package, state)
-                    versions[state].update({name: version})
                     try:
                         # if the package version was already exported, overwrite it with
                         # the new version. if the package version was not yet exported,
@@ -184,16 +179,12 @@ class ManualExport(BaseExport):
             # if the package versions were not updated or one of the testscripts
             # failed, set the result to FAILED, otherwise to PASSED
             failed = False
-            for package in versions["before"].keys():
+            for package in host.packages.values():
                 # check if the packages have a higher version after the update
-                if (
-                    versions["after"][package] is not None
-                    and versions["before"][package] is not None
-                ):
-                    if not RPMVersion(versions["before"][package]) < RPMVersion(
-                        versions["after"][package]
-                    ):
-                        failed = True
+                before = package.version("before")
+                after = package.version("after")
+                if after is not None and before is not None and not before < after:
+                    failed = True
             if failed:
                 logger.warning(
                     f"installation test result on {hostname} set to FAILED as some packages were not updated. please override manually."
@@ -0,0 +1,150 @@
+#
+# crash-safe journal of a testing session
+#
+# Every command result, package version query and lock change is
+# appended to an SQLite database in WAL mode as it happens, so a session
+# interrupted by a crash or a dropped terminal can be resumed with its
+# logs, versions and locks intact.
+#
+
+from collections import namedtuple
+from json import dumps, loads
+from logging import getLogger
+import os
+import sqlite3
+from threading import Lock
+from time import time
+
+from .xdg import save_cache_path
+
+logger = getLogger("mtui.journal")
+
+HostState = namedtuple("HostState", ["commands", "packages", "lock"])
+
+
+class SessionJournal:
+    """
+    Append-only journal of one testing session per update
+
+    Each L{SessionJournal} starts a new session in the database of the
+    update unless `resume` is set, in which case the last session is
+    continued.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = str(path)
+        self._mutex = Lock()
+        self._db = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        with self._mutex:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id INTEGER PRIMARY KEY, started REAL, pid INTEGER)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "id INTEGER PRIMARY KEY, session INTEGER, ts REAL,"
+                " hostname TEXT, kind TEXT, data TEXT)"
+            )
+
+            self.session = None
+            if resume:
+                row = self._db.execute("SELECT max(id) FROM sessions").fetchone()
+                self.session = row[0]
+                if self.session is None:
+                    logger.warning("no session to resume in {}".format(self.path))
+            if self.session is None:
+                self.session = self._db.execute(
+                    "INSERT INTO sessions (started, pid) VALUES (?, ?)",
+                    (time(), os.getpid()),
+                ).lastrowid
+
+    @classmethod
+    def open(cls, config, update, resume=False):
+        """
+        :returns: L{SessionJournal} of `update` or None if the journal is
+            disabled or can't be opened
+        """
+        if not config.session_journal:
+            return None
+
+        path = save_cache_path("journal", "{!s}.db".format(update))
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            return cls(path, resume)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("failed to open session journal: {!s}".format(e))
+            return None
+
+    def record(self, hostname, kind, data=None):
+        try:
+            with self._mutex:
+                self._db.execute(
+                    "INSERT INTO events (session, ts, hostname, kind, data)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (self.session, time(), hostname, kind, dumps(data)),
+                )
+        except sqlite3.Error as e:
+            logger.warning("failed to write session journal: {!s}".format(e))
+
+    def command(self, hostname, entry):
+        """
+        :type entry: L{mtui.types.hostlog.HostLog.log}
+        """
+        self.record(hostname, "command", list(entry))
+
+    def packages(self, hostname, packages):
+        """
+        :type packages: {str: L{mtui.types.package.Package}}
+        """
+        self.record(
+            hostname,
+            "packages",
+            {
+                name: {"before": p.before, "after": p.after, "current": p.current}
+                for name, p in packages.items()
+            },
+        )
+
+    def lock(self, hostname, line):
+        """
+        :param line: lockfile line of our lock, empty once unlocked
+        """
+        self.record(hostname, "lock", line)
+
+    def replay(self):
+        """
+        :returns: {hostname: L{HostState}} of hosts connected at the end
+            of the session
+        """
+        with self._mutex:
+            rows = self._db.execute(
+                "SELECT hostname, kind, data FROM events WHERE session = ?"
+                " ORDER BY id",
+                (self.session,),
+            ).fetchall()
+
+        hosts = {}
+        for hostname, kind, data in rows:
+            data = loads(data)
+            if kind == "connect":
+                hosts.setdefault(hostname, HostState([], {}, None))
+            elif kind == "disconnect":
+                hosts.pop(hostname, None)
+            elif hostname not in hosts:
+                continue
+            elif kind == "command":
+                hosts[hostname].commands.append(data)
+            elif kind == "packages":
+                hosts[hostname].packages.update(data)
+            elif kind == "lock":
+                hosts[hostname] = hosts[hostname]._replace(lock=data or None)
+
+        return hosts
+
+    def close(self):
+        with self._mutex:
+            self._db.close()
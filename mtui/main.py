@@ -27,6 +27,11 @@ def main():
         p.print_help()
         return 1
 
+    if args.resume and not args.update:
+        logger.error("--resume needs the update given by -a or -k")
+        p.print_help()
+        return 1
+
     cfg = Config(args.config)
 
     sys.exit(run_mtui(sys, cfg, logger, CommandPrompt, CommandPromptDisplay, args))
@@ -40,6 +45,7 @@ def run_mtui(sys, config, logger, Prompt, Display, args):
     config.merge_args(args)
     config.kernel = False
     config.auto = False
+    config.resume = args.resume
 
     config.distro, config.distro_ver, config.distro_kernel = detect_system()
 
@@ -54,10 +60,16 @@ def run_mtui(sys, config, logger, Prompt, Display, args):
         else:
             pass
         try:
-            prompt.load_update(args.update, autoconnect=not bool(args.sut))
+            prompt.load_update(args.update, autoconnect=not (args.sut or args.resume))
         except (SvnCheckoutInterruptedError, CalledProcessError) as e:
             logger.error(e)
             return 1
+        finally:
+            # only the first session continues the journal
+            config.resume = False
+
+        if args.resume:
+            prompt.metadata.resume()
 
     if args.sut:
         for x in args.sut:
@@ -230,6 +230,16 @@ class InvalidLocationError(UserError):
         self.message = self._msg.format(requested, ", ".join(available))
 
 
+class BatchProductMismatchError(UserError, ValueError):
+
+    """
+    Thrown when updates batched together don't share a product
+    """
+
+    def __init__(self, update, loaded):
+        self.message = "{0!s} shares no product with {1!s}".format(update, loaded)
+
+
 class ReConnectFailed(ErrorMessage):
     _msg = "Failed to re-connect to {}"
 
@@ -82,6 +82,12 @@ class CommandPrompt(cmd.Cmd):
         """
         alias to ease refactoring
         """
+        self.batch = []
+        """
+        :type batch: [L{TestReport}]
+        :param batch: testreports updated along with `metadata` by
+            batch_update
+        """
 
         self.homedir = Path("~").expanduser()
         self.config = config
@@ -233,4 +239,10 @@ class CommandPrompt(cmd.Cmd):
         tr = update.make_testreport(self.config, autoconnect=autoconnect)
         self.metadata = tr
         self.targets = tr.targets
+        self.batch = []
         self.set_prompt(None)
+
+        if self.config.warm_up and self.targets:
+            tr.perform_warm_up(self.targets)
+        if self.config.prefetch and self.targets:
+            tr.perform_prefetch(self.targets)
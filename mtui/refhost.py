@@ -6,6 +6,7 @@ import errno
 import os
 import re
 import time
+from collections import defaultdict
 from logging import getLogger
 from traceback import format_exc
 from urllib.request import urlopen
@@ -133,6 +134,129 @@ class Attributes(object):
         return attributes_list
 
 
+class _NotIndexable(Exception):
+    pass
+
+
+def _version_features(path, version, query=False):
+    """
+    :returns: features of the `version` of the product or addon at `path`
+
+    An empty minor in a query asks for hosts without minor version.
+    """
+    if not isinstance(version, dict) or "major" not in version:
+        raise _NotIndexable
+    features = [(path, "major", version["major"])]
+    if "minor" not in version:
+        if not query:
+            features.append((path, "nominor"))
+    elif query and version["minor"] == "":
+        features.append((path, "nominor"))
+    else:
+        features.append((path, "minor", version["minor"]))
+    return features
+
+
+def _dict_features(path, attribute, query=False):
+    features = []
+    for key, value in attribute.items():
+        if key == "version":
+            features += _version_features(path, value, query)
+        else:
+            features.append((path, "=", key, value))
+    return features
+
+
+def _addons_features(addons, query=False):
+    if not isinstance(addons, list):
+        raise _NotIndexable
+    features = []
+    # like _includes_addons_list, the last addon of a name counts
+    for name, addon in {addon["name"]: addon for addon in addons}.items():
+        features.append((("addons", name), "has"))
+        features += _dict_features(("addons", name), addon, query)
+    return features
+
+
+def _features(attributes, query=False):
+    """
+    :type attributes: dict
+    :param attributes: a refhost or, when `query` is set, the set
+        attributes of an L{Attributes}
+
+    :returns: features a host needs to match `attributes` or features of
+        the host
+
+    :raises: L{_NotIndexable} when `attributes` are shaped differently
+        than refhosts.yml entries
+    """
+    features = []
+    for key, value in attributes.items():
+        if key == "addons":
+            features += _addons_features(value, query)
+        elif isinstance(value, (str, int, bool)):
+            features.append(((), "=", key, value))
+        elif isinstance(value, dict):
+            features += _dict_features((key,), value, query)
+        else:
+            raise _NotIndexable
+    # fail on unhashable values here rather than during a lookup
+    hash(tuple(features))
+    return features
+
+
+class _RefhostsIndex(object):
+    """
+    Inverted index of the hosts of one location
+
+    Maps each feature of a host, like its arch, base product name and
+    version, addons and tags, to the positions of the hosts having it, so
+    a search is the intersection of the hosts of the searched features.
+    Hosts which can't be indexed are matched one by one.
+    """
+
+    def __init__(self, hosts, match):
+        """
+        :type hosts: [dict]
+        :param match: L{Refhosts.is_candidate_match}
+        """
+        self.hosts = hosts
+        self.match = match
+        self.features = defaultdict(set)
+        self.unindexed = []
+
+        for position, host in enumerate(hosts):
+            try:
+                features = _features(host)
+            except (_NotIndexable, KeyError, TypeError, AttributeError):
+                self.unindexed.append(position)
+                continue
+            for feature in features:
+                self.features[feature].add(position)
+
+    def search(self, attribute):
+        """
+        :returns: names of the hosts matching `attribute` in the order of
+            the refhosts file
+
+        :raises: L{_NotIndexable}, KeyError or TypeError if `attribute`
+            can't be searched in the index
+        """
+        query = {k: v for k, v in vars(attribute).items() if v}
+        found = [self.features.get(f, set()) for f in _features(query, True)]
+
+        if found:
+            found.sort(key=len)
+            positions = found[0].intersection(*found[1:])
+        else:
+            positions = set(range(len(self.hosts)))
+        positions.update(
+            p for p in self.unindexed if self.match(self.hosts[p], attribute)
+        )
+
+        return [self.hosts[p]["name"] for p in sorted(positions)]
+
+
 class Refhosts(object):
     _default_location = "default"
 
@@ -165,6 +289,37 @@ class Refhosts(object):
             logger.error("failed to parse refhosts.yml: {!s}".format(error))
             raise
 
+        self._index = {}
+        if isinstance(self.data, dict):
+            for location, hosts in self.data.items():
+                if isinstance(hosts, list):
+                    self._index[location] = _RefhostsIndex(
+                        hosts, self.is_candidate_match
+                    )
+
+    def _search_location(self, location, attribute):
+        """
+        :returns: names of the hosts in `location` matching `attribute`
+        """
+        index = self._index.get(location)
+        if index is not None:
+            try:
+                return index.search(attribute)
+            except (_NotIndexable, KeyError, TypeError, AttributeError):
+                pass
+        return self._scan(location, attribute)
+
+    def _scan(self, location, attribute):
+        """
+        Matches every host of `location` against `attribute`, used for
+        attributes the index doesn't cover
+        """
+        return [
+            candidate["name"]
+            for candidate in self.data[location]
+            if self.is_candidate_match(candidate, attribute)
+        ]
+
     def search(self, attributes=None):
         """
         Return hosts matching `attributes`
@@ -175,19 +330,10 @@ class Refhosts(object):
         results = []
 
         for attribute in attributes:
-            host = []
-            host = [
-                candidate["name"]
-                for candidate in self.data[self.location]
-                if self.is_candidate_match(candidate, attribute)
-            ]
+            host = self._search_location(self.location, attribute)
 
             if host == [] and self.location != self._default_location:
-                host = [
-                    candidate["name"]
-                    for candidate in self.data[self._default_location]
-                    if self.is_candidate_match(candidate, attribute)
-                ]
+                host = self._search_location(self._default_location, attribute)
 
             results += host
 
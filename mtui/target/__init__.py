@@ -5,17 +5,29 @@
 
 from logging import getLogger
 import re
+from threading import Thread, current_thread
+from time import monotonic, monotonic_ns, sleep
 from traceback import format_exc
 from typing import Dict, Optional
 
 from .. import messages
 from ..connection import CommandTimeout, Connection, errno
+from ..target.factscache import FactsCache
+from ..target.history import append_command, history_entry, parse_entries
 from ..target.locks import LockedTargets, RemoteLock, TargetLock, TargetLockedError
-from ..target.parsers import parse_system
+from ..target.registry import get_registry
+from ..target.repocache import DOWNLOAD_URL, get_repo_cache
+from ..target.parsers import (
+    MARKER,
+    PKGDB_COMMAND,
+    gather_facts,
+    parse_pkgdb,
+    parse_system,
+)
 from ..types.hostlog import HostLog
 from ..types.package import Package
 from ..types.rpmver import RPMVersion
-from ..utils import timestamp
+from ..types.versionmatrix import VersionMatrix
 
 logger = getLogger("mtui.target")
 
@@ -31,22 +43,53 @@ class Target:
         exclusive=False,
         lock=TargetLock,
         connection=Connection,
+        facts_cache=FactsCache,
+        journal=None,
+        versions=None,
     ):
         """
         :type connect: bool
         :param connect:
             introduced in order to run unit tests witout
             having the target automatically connect
+
+        :type journal: L{mtui.journal.SessionJournal} or None
+        :param journal: journal recording command results, package
+            versions and locks of the target
+
+        :type versions: L{VersionMatrix} or None
+        :param versions: package versions of all hosts of the session,
+            a new one if None
         """
 
         self.config = config
         self.host, _, self.port = hostname.partition(":")
         self.hostname = hostname
         self.system = None
+        self.kernel = None
+        self.versions = VersionMatrix() if versions is None else versions
         self.packages = {}
-        self.out = HostLog()
+        self.out = HostLog(maxlen=config.hostlog_limit)
         self.TargetLock = lock
         self.Connection = connection
+        self.facts_cache = facts_cache if config.facts_cache else None
+        self._facts_thread = None
+        self._prefetch_thread = None
+        self.background = None
+        """
+        :type background: (str, str) or None
+        :param background: name and state ("running", "done" or
+            "failed") of the last background job started by L{prefetch}
+        """
+        self._versions = {}
+        self._pkgdb = None
+        self.journal = journal
+        self.snapshot = None
+        """
+        :type snapshot: int or None
+        :param snapshot: number of the snapper snapshot taken before the
+            last update
+        """
 
         self.state = state
         """
@@ -61,26 +104,176 @@ class Target:
         # helper for packages before system analysis
         self._pkgs = packages
 
-    def _parse_packages(self):
-        ret = {}
+    def _required_versions(self, pkgs):
+        """
+        :type pkgs: {base version: {name: required version}}
+
+        :returns: {name: required version} packages of the installed
+            base product
+        """
         base_version = self.system.get_base().version
-        if self._pkgs:
-            packages = self._pkgs.get(base_version, {})
+        packages = {}
+        if pkgs:
+            packages = pkgs.get(base_version, {})
             if base_version.startswith("12"):
-                packages.update(self._pkgs.get("12", {}))
+                packages.update(pkgs.get("12", {}))
+        return packages
 
-            for key, value in packages.items():
-                package = Package(key)
-                package.required = value
-                ret[key] = package
+    def _parse_packages(self):
+        self.versions.clear_host(self.hostname)
+        ret = {}
+        for key, value in self._required_versions(self._pkgs).items():
+            package = Package(key, self.versions, self.hostname)
+            package.required = value
+            ret[key] = package
         return ret
 
+    def add_packages(self, pkgs) -> None:
+        """
+        Adds the packages of another update to the ones queried on the
+        target, the higher required version wins for packages in both
+
+        :type pkgs: {base version: {name: required version}}
+        """
+        self.wait_for_facts()
+        for name, required in self._required_versions(pkgs).items():
+            known = self.packages.get(name)
+            if known is None:
+                known = self.packages[name] = Package(
+                    name, self.versions, self.hostname
+                )
+            if required and (
+                not known.required or RPMVersion(required) > known.version("required")
+            ):
+                known.required = required
+
     def _parse_system(self):
         logger.debug("get and parse target installed products")
         if self.connection:
             return parse_system(self.connection)
 
-    def connect(self):
+    def _load_facts(self, history=None, cached=None, interactive=True):
+        """
+        Reads system, running kernel and lock state in one round-trip,
+        falls back to reading the files one by one over SFTP.
+
+        :type history: [str] or None
+        :param history: history entry to add in the same round-trip
+
+        :type cached: L{HostFacts} or None
+        :param cached: facts from the facts cache, products are read only
+            if the cached fingerprint doesn't match
+
+        :param interactive: if False, a timeout fails instead of asking
+            the user, for verifying cached facts in background
+        """
+        logger.debug("{}: gathering target facts".format(self.hostname))
+        facts = gather_facts(
+            self.connection,
+            self._lock.filename,
+            self._history_line(history) if history else None,
+            products=cached is None,
+            interactive=interactive,
+        )
+        if facts is not None:
+            history = None
+
+        if facts is not None and cached is not None:
+            if facts.fingerprint and facts.fingerprint == cached.fingerprint:
+                facts = facts._replace(system=cached.system)
+            else:
+                logger.debug("{}: cached facts outdated".format(self.hostname))
+                facts = gather_facts(self.connection, self._lock.filename)
+
+        if facts is None:
+            logger.debug("{}: falling back to SFTP".format(self.hostname))
+            self._lock.load()
+            self.system = self._parse_system()
+            if history:
+                self.add_history(history)
+        else:
+            self._lock.load(facts.lock)
+            self.system = facts.system
+            self.kernel = facts.kernel
+            if self.facts_cache:
+                self.facts_cache.put(self.hostname, facts)
+
+    def _verify_facts(self, cached, history):
+        try:
+            self._load_facts(history, cached, interactive=False)
+        except Exception:
+            logger.warning("{}: failed to refresh host facts".format(self.hostname))
+            logger.debug(format_exc())
+            return
+
+        if self.system != cached.system:
+            logger.info(
+                "{}: installed products changed since last session".format(
+                    self.hostname
+                )
+            )
+            self.packages = self._parse_packages()
+        if self._lock.state.user:
+            logger.warning(self._lock.locked_by_msg())
+
+    def wait_for_facts(self) -> None:
+        """
+        Blocks until the background verification of cached facts
+        started by L{connect} finished. Called by every accessor of the
+        system, packages and lock state the verification updates.
+        """
+        if self._facts_thread and self._facts_thread is not current_thread():
+            self._facts_thread.join()
+
+    def prefetch(self, function, name="prefetch") -> None:
+        """
+        Runs `function` in background, for example to download packages
+        of the update before the update locks the host. Jobs run one
+        after another in the order they were started. The update,
+        prepare, downgrade and install wait until all of them finished,
+        so they don't compete for the package manager lock.
+        `function` has to run its commands non-interactively.
+
+        :type function: callable() -> None
+        :param name: name of the job shown in L{background}
+        """
+        self._prefetch_thread = Thread(
+            target=self._prefetch,
+            args=(function, name, self._prefetch_thread),
+            daemon=True,
+        )
+        self._prefetch_thread.start()
+
+    def _prefetch(self, function, name, previous):
+        if previous:
+            previous.join()
+        self.background = (name, "running")
+        try:
+            function()
+        except Exception:
+            logger.warning("{}: {} failed".format(self.hostname, name))
+            logger.debug(format_exc())
+            self.background = (name, "failed")
+        else:
+            self.background = (name, "done")
+
+    def wait_for_prefetch(self) -> None:
+        """
+        Blocks until the background jobs started by L{prefetch} finished.
+        """
+        if self._prefetch_thread and self._prefetch_thread.is_alive():
+            logger.info("{}: waiting for prefetch to finish".format(self.hostname))
+            self._prefetch_thread.join()
+
+    def reload_system(self) -> None:
+        self.wait_for_facts()
+        self._load_facts()
+
+    def connect(self, history=None):
+        """
+        :type history: [str] or None
+        :param history: history entry to add once connected
+        """
         try:
             logger.info("connecting to {}".format(self.hostname))
             self.connection = self.Connection(self.host, self.port, self.timeout)
@@ -88,16 +281,73 @@ class Target:
             logger.critical(messages.ConnectingTargetFailedMessage(self.hostname, e))
             raise e
 
-        self._lock = self.TargetLock(self.connection, self.config)
-        if self.is_locked():
-            logger.warning(self._lock.locked_by_msg())
+        self._lock = self.TargetLock(
+            self.connection, self.config, registry=get_registry(self.config)
+        )
 
         # get system
-        self.system = self._parse_system()
+        cached = self.facts_cache.get(self.hostname) if self.facts_cache else None
+        if cached:
+            # use the cached system right away, verify it in background
+            self.system = cached.system
+            self.kernel = cached.kernel
+        else:
+            self._load_facts(history)
+            if self._lock.state.user:
+                logger.warning(self._lock.locked_by_msg())
 
         # parse packages
         self.packages = self._parse_packages()
 
+        if cached:
+            self._facts_thread = Thread(
+                target=self._verify_facts, args=(cached, history), daemon=True
+            )
+            self._facts_thread.start()
+
+        if self.journal:
+            self.journal.record(self.hostname, "connect")
+
+    def reconnect(self, timeout=600, delay=5, max_delay=60) -> bool:
+        """
+        Waits for the host to accept SSH connections again, for example
+        after reboot, and re-reads installed products. Already gathered
+        package versions are kept.
+
+        :param timeout: give up after `timeout` seconds
+        :param delay: initial delay between attempts, doubled after
+            every failed attempt up to `max_delay`
+
+        :returns: True if connected
+        """
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+        deadline = monotonic() + timeout
+        while True:
+            try:
+                self.connection = self.Connection(self.host, self.port, self.timeout)
+            except Exception as e:
+                if monotonic() + delay > deadline:
+                    logger.error(
+                        "{}: not reachable after {}s: {}".format(
+                            self.hostname, timeout, e
+                        )
+                    )
+                    return False
+                logger.debug("{}: not reachable yet: {}".format(self.hostname, e))
+                sleep(delay)
+                delay = min(delay * 2, max_delay)
+            else:
+                break
+
+        self._lock = self.TargetLock(
+            self.connection, self.config, registry=get_registry(self.config)
+        )
+        self._load_facts()
+        return True
+
     def __lt__(self, other):
         return sorted([self.system, other.system])[0] == self.system
 
@@ -111,6 +361,7 @@ class Target:
         return self.system != other.system
 
     def query_versions(self, packages=None) -> None:
+        self.wait_for_facts()
         if packages is None:
             packages = self.packages.keys()
 
@@ -121,6 +372,7 @@ class Target:
                     self.packages[p].current = str(v)
                 else:
                     self.packages[p].current = None
+            self.journal_packages()
         elif self.state == "dryrun":
 
             logger.info(
@@ -131,6 +383,40 @@ class Target:
 
             self.out.append(["", "", "", 0, 0])
 
+    def journal_packages(self) -> None:
+        """
+        Records the before, after and current package versions
+        """
+        if self.journal:
+            self.wait_for_facts()
+            self.journal.packages(self.hostname, self.packages)
+
+    def invalidate_versions(self) -> None:
+        """
+        Drops cached package versions, used after mtui changed packages
+        on the target
+        """
+        self._versions = {}
+        self._pkgdb = None
+
+    def _cached_versions(self, packages) -> Optional[Dict[str, RPMVersion]]:
+        if not self._pkgdb or self.state != "enabled":
+            return None
+        if not all(p in self._versions for p in packages):
+            return None
+
+        try:
+            _, stdout, _ = self.connection.execute(PKGDB_COMMAND)
+        except Exception:
+            stdout = ""
+
+        if parse_pkgdb(stdout) != self._pkgdb:
+            logger.debug("{}: package database changed".format(self.hostname))
+            self.invalidate_versions()
+            return None
+
+        return {p: self._versions[p] for p in packages}
+
     def query_package_versions(self, packages) -> Optional[Dict[str, RPMVersion]]:
         """
         :type packages: [str]
@@ -139,22 +425,33 @@ class Target:
         :return: {package: RPMVersion or None}
             where
               package = str
+
+        Versions are cached until the package database on the target
+        changes, so repeated queries cost only a stat.
         """
+        self.wait_for_facts()
+        packages = list(packages)
+        cached = self._cached_versions(packages)
+        if cached is not None:
+            return cached
+
         if self.system.get_base().name != "ubuntu":
             self.run(
-                'rpm -q --queryformat "%{{Name}} %{{Version}}-%{{Release}}\n" {}'.format(
-                    " ".join(packages)
+                '{}; rpm -q --queryformat "%{{Name}} %{{Version}}-%{{Release}}\n" {}'.format(
+                    PKGDB_COMMAND, " ".join(packages)
                 )
             )
         else:
             self.run(
-                "dpkg-query -W -f='${{package}} ${{version}}\n' {}".format(
-                    " ".join(packages)
+                "{}; dpkg-query -W -f='${{package}} ${{version}}\n' {}".format(
+                    PKGDB_COMMAND, " ".join(packages)
                 )
             )
 
         packages = {}
         for line in self.lastout().splitlines():
+            if line.startswith(MARKER):
+                continue
             match = re.search("package (.*) is not installed", line)
             if match:
                 packages[match.group(1)] = None
@@ -166,6 +463,14 @@ class Target:
                     packages[p] = RPMVersion(v)
             else:
                 packages[p] = RPMVersion(v)
+
+        pkgdb = parse_pkgdb(self.lastout())
+        if pkgdb:
+            if pkgdb != self._pkgdb:
+                self._versions = {}
+            self._pkgdb = pkgdb
+            self._versions.update(packages)
+
         return packages
 
     def disable_repo(self, repo: str) -> None:
@@ -184,49 +489,80 @@ class Target:
         return self.connection.timeout
 
     def get_system(self):
+        self.wait_for_facts()
         return str(self.system)
 
     def set_repo(self, operation, testreport) -> None:
         logger.debug("{}: enabling {} repos".format(self.hostname, operation))
         testreport.set_repo(self, operation)
 
-    def run_zypper(self, cmd, repos, rrid) -> None:
-        # ur - generator returning tuple with product, repopart
-        ur = ((x, y) for x, y in repos.items() if x in self.system.flatten())
+    def repo_url(self):
+        """
+        :returns: str base URL of the update repositories as seen by the
+            target, the local repo cache if it's enabled
+        """
+        cache = get_repo_cache(self.config)
+        if cache:
+            try:
+                port = self.connection.forward_remote(cache.port)
+                return "http://127.0.0.1:{}/".format(port)
+            except Exception as e:
+                logger.warning(
+                    "{}: failed to forward repo cache: {}".format(self.hostname, e)
+                )
+        return DOWNLOAD_URL
 
-        def name(product, rrid):
-            return "issue-{}:{}:p={}".format(
-                product.name, product.version, rrid.maintenance_id
+    def issue_repos(self, repos, rrid):
+        """
+        :type repos: {L{Product}: str}
+        :param repos: repository paths of the update per product
+
+        :returns: [(alias, url)] update repositories of the products
+            installed on the target
+        """
+        dl_path = self.repo_url() + ":/".join(str(rrid).split(":")[:-1])
+        return [
+            (
+                "issue-{}:{}:p={}".format(x.name, x.version, rrid.maintenance_id),
+                dl_path + "/" + y,
             )
+            for x, y in repos.items()
+            if x in self.system.flatten()
+        ]
+
+    def run_zypper(self, cmd, repos, rrid) -> None:
+        self.run_zypper_repos(cmd, self.issue_repos(repos, rrid))
 
-        def fullpath(path, rrid):
-            # TODO: confiruable download path?
-            dl_path = "http://download.suse.de/ibs/"
-            return dl_path + ":/".join(str(rrid).split(":")[:-1]) + "/" + path
+    def run_zypper_repos(self, cmd, repos) -> None:
+        """
+        Adds or removes all `repos` and refreshes the repositories once
 
-        for x, y in ur:
+        :type repos: [(alias, url)]
+        """
+        for alias, url in repos:
             if "ar" in cmd:
-                logger.info("Adding repo {} on {}".format(y, self.hostname))
-                self.run(
-                    "zypper {0} {1} {2} {1}".format(
-                        cmd, name(x, rrid), fullpath(y, rrid)
-                    )
-                )
+                logger.info("Adding repo {} on {}".format(url, self.hostname))
+                self.run("zypper {0} {1} {2} {1}".format(cmd, alias, url))
             elif "rr" in cmd:
-                logger.info("Removing repo {} on {}".format(y, self.hostname))
-                self.run("zypper {0} {1}".format(cmd, fullpath(y, rrid)))
+                logger.info("Removing repo {} on {}".format(url, self.hostname))
+                self.run("zypper {0} {1}".format(cmd, alias))
             else:
                 self.unlock(force=True)
                 raise ValueError
 
         self.run("zypper -n ref")
 
-    def run(self, command, lock=None) -> None:
+    def run(self, command, lock=None, feed=None) -> None:
+        """
+        :type feed: callable(bytes) -> None or None
+        :param feed: receives the output of `command` as it arrives
+        """
         if self.state == "enabled":
+            self.wait_for_facts()
             logger.debug('{}: running "{}"'.format(self.hostname, command))
-            time_before = timestamp()
+            time_before = monotonic_ns()
             try:
-                exitcode = self.connection.run(command, lock)
+                exitcode = self.connection.run(command, lock, feed)
             except CommandTimeout:
                 logger.critical(
                     '{}: command "{}" timed out'.format(self.hostname, command)
@@ -243,8 +579,7 @@ class Target:
                 )
                 exitcode = -1
 
-            time_after = timestamp()
-            runtime = int(time_after) - int(time_before)
+            runtime = (monotonic_ns() - time_before) / 1e9
             # this is wrong
             self.out.append(
                 [
@@ -255,6 +590,8 @@ class Target:
                     runtime,
                 ]
             )
+            if self.journal:
+                self.journal.command(self.hostname, self.out[-1])
         elif self.state == "dryrun":
 
             logger.info('dryrun: {} running "{}"'.format(self.hostname, command))
@@ -342,38 +679,82 @@ class Target:
         """
         :returns bool: True if target is locked by someone else
         """
+        self.wait_for_facts()
         return self._lock.is_locked()
 
+    def refresh_lock(self) -> None:
+        """
+        Reads the lock state from the target, bypassing the cached state
+        """
+        if self.state == "enabled":
+            self.wait_for_facts()
+            self._lock.load(force=True)
+
     def lock(self, comment=None):
         """
         :returns None:
         """
+        self.wait_for_facts()
         self._lock.lock(comment)
+        if self.journal:
+            self.journal.lock(self.hostname, self._lock.state.to_lockfile())
 
     def unlock(self, force=False):
+        self.wait_for_facts()
         try:
             self._lock.unlock(force)
         except TargetLockedError as e:
             logger.warning(e)
             raise
+        if self.journal:
+            self.journal.lock(self.hostname, "")
+
+    def restore(self, state) -> None:
+        """
+        Restores command log, package versions and lock of the target
+        from the session journal
+
+        :type state: L{mtui.journal.HostState}
+        """
+        self.wait_for_facts()
+        out = HostLog(maxlen=self.config.hostlog_limit)
+        for entry in list(state.commands) + list(self.out):
+            out.append(entry)
+        self.out = out
+
+        for name, versions in state.packages.items():
+            if name in self.packages:
+                self.packages[name].before = versions["before"]
+                self.packages[name].after = versions["after"]
+                self.packages[name].current = versions["current"]
+
+        if state.lock:
+            previous = RemoteLock.from_lockfile(state.lock)
+            try:
+                self._lock.adopt(previous)
+            except TargetLockedError as e:
+                logger.warning(e)
+            else:
+                logger.info("{}: took over the lock".format(self.hostname))
+                if self.journal:
+                    self.journal.lock(self.hostname, self._lock.state.to_lockfile())
+
+    def _history_line(self, comment) -> str:
+        return history_entry(self.config.session_user, comment)
 
     def add_history(self, comment) -> None:
         if self.state == "enabled":
             logger.debug("{}: adding history entry".format(self.hostname))
             try:
-                filename = "/var/log/mtui.log"
-                historyfile = self.connection.open(filename, "a+")
+                exitcode, _, stderr = self.connection.execute(
+                    append_command(self._history_line(comment))
+                )
             except Exception as error:
-                logger.error("failed to open history file: {}".format(error))
+                logger.error("failed to write history: {}".format(error))
                 return
 
-            now = timestamp()
-            user = self.config.session_user
-            try:
-                historyfile.write("{}:{}:{}\n".format(now, user, ":".join(comment)))
-                historyfile.close()
-            except Exception:
-                pass
+            if exitcode:
+                logger.error("failed to write history: {}".format(stderr.strip()))
 
     def listdir(self, path):
         try:
@@ -408,6 +789,8 @@ class Target:
             if self.connection.is_active():
                 self.connection.timeout = 15
                 self.add_history(["disconnect"])
+                if self.journal:
+                    self.journal.record(self.hostname, "disconnect")
                 self.unlock()
         except Exception:
             # ignore if the connection seems to be lost
@@ -427,12 +810,15 @@ class Target:
             self.connection = None
 
     def report_self(self, sink):
-        return sink(self.hostname, self.system, self.state, self.exclusive)
+        return sink(
+            self.hostname, self.system, self.state, self.exclusive, self.background
+        )
 
     def report_history(self, sink):
-        return sink(self.hostname, self.system, self.lastout().split("\n"))
+        return sink(self.hostname, self.system, parse_entries(self.lastout()))
 
     def report_locks(self, sink):
+        self.wait_for_facts()
         return sink(self.hostname, self.system, self._lock)
 
     def report_timeout(self, sink):
@@ -453,4 +839,5 @@ class Target:
         )
 
     def report_products(self, sink):
+        self.wait_for_facts()
         return sink(self.hostname, self.system)
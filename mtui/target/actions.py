@@ -102,9 +102,14 @@ class FileDownload(ThreadedTargetGroup):
 
 
 class RunCommand:
-    def __init__(self, targets, command):
+    def __init__(self, targets, command, feed=None):
+        """
+        :type feed: {str: callable(bytes) -> None} or None
+        :param feed: receivers of the command output per hostname
+        """
         self.targets = targets
         self.command = command
+        self.feed = feed or {}
 
     def run(self):
         parallel = {}
@@ -123,9 +128,19 @@ class RunCommand:
                 thread.daemon = True
                 thread.start()
                 if isinstance(self.command, dict):
-                    queue.put([parallel[target].run, [self.command[target], lock]])
+                    queue.put(
+                        [
+                            parallel[target].run,
+                            [self.command[target], lock, self.feed.get(target)],
+                        ]
+                    )
                 elif isinstance(self.command, str):
-                    queue.put([parallel[target].run, [self.command, lock]])
+                    queue.put(
+                        [
+                            parallel[target].run,
+                            [self.command, lock, self.feed.get(target)],
+                        ]
+                    )
 
             while queue.unfinished_tasks:
                 spinner(lock)
@@ -142,7 +157,20 @@ class RunCommand:
                 thread = ThreadedMethod(queue)
                 thread.daemon = True
                 thread.start()
-                queue.put([serial[target].run, [self.command, lock]])
+                if isinstance(self.command, dict):
+                    queue.put(
+                        [
+                            serial[target].run,
+                            [self.command[target], lock, self.feed.get(target)],
+                        ]
+                    )
+                elif isinstance(self.command, str):
+                    queue.put(
+                        [
+                            serial[target].run,
+                            [self.command, lock, self.feed.get(target)],
+                        ]
+                    )
                 while queue.unfinished_tasks:
                     spinner(lock)
 
@@ -168,6 +196,17 @@ class RunCommand:
             raise
 
 
+def wait_for_prefetch(targets):
+    """
+    Waits for the background jobs of `targets` before running package
+    manager commands, as the jobs hold the package manager lock too
+
+    :type targets: dict(hostname = L{Target})
+    """
+    for t in targets.values():
+        t.wait_for_prefetch()
+
+
 def spinner(lock=None):
     """simple spinner to show some process"""
 
@@ -2,12 +2,16 @@ import re
 from logging import getLogger
 
 from ..types.rpmver import RPMVersion
-from .actions import ThreadedMethod, UpdateError, queue, spinner
+from .actions import ThreadedMethod, UpdateError, queue, spinner, wait_for_prefetch
+from .timing import PhaseTimer, get_timings
 
 logger = getLogger("mtui.target.downgrade")
 
 
 class Downgrade:
+    # exit codes of successful transactions
+    success = (0,)
+
     def __init__(self, targets, packages, testreport):
         self.targets = targets
         self.packages = packages
@@ -15,11 +19,19 @@ class Downgrade:
 
         self.commands = {}
         self.install_command = None
+        self.transaction_command = None
+        """
+        :type transaction_command: str or None
+        :param transaction_command: installs all `name=version` pairs of a
+            host in one transaction, `install_command` is used package by
+            package on hosts where it fails
+        """
         self.list_command = None
         self.pre_commands = []
         self.post_commands = []
 
     def run(self):
+        wait_for_prefetch(self.targets)
         if hasattr(self, "kind") and self.kind == "transactional":
             self._run_transactional()
         else:
@@ -40,9 +52,8 @@ class Downgrade:
                     )
                 if "reboot to finish rollback" in t.lastout():
                     logger.warning(
-                        "Please reboot the host {!s} to finish rollback".format(
-                            t.hostname
-                        )
+                        "Please reboot the host {!s} to finish rollback "
+                        "(see the 'reboot' command)".format(t.hostname)
                     )
         except BaseException:
             raise
@@ -50,16 +61,18 @@ class Downgrade:
             self.unlock_hosts()
 
     def _run(self, kind=None):
+        timer = PhaseTimer(self.targets, "downgrade", get_timings())
         versions = {}
         self.lock_hosts()
         try:
-            for t in list(self.targets.values()):
-                queue.put([t.set_repo, ["remove", self.testreport]])
+            with timer("repos"):
+                for t in list(self.targets.values()):
+                    queue.put([t.set_repo, ["remove", self.testreport]])
 
-            while queue.unfinished_tasks:
-                spinner()
+                while queue.unfinished_tasks:
+                    spinner()
 
-            queue.join()
+                queue.join()
 
             for t in list(self.targets.values()):
                 if t.lasterr():
@@ -70,17 +83,11 @@ class Downgrade:
                     )
                     return
 
-            self.targets.run(self.list_command)
+            with timer("query"):
+                self.targets.run(self.list_command)
 
             for hn, t in list(self.targets.items()):
-                lines = t.lastout().split("\n")
-                release = {}
-                for line in lines:
-                    match = re.search("(.*) = (.*)", line)
-                    if match:
-                        name = match.group(1)
-                        version = match.group(2)
-                        release.setdefault(name, []).append(version)
+                release = self.parse_versions(t.lastout())
 
                 for name in release:
                     version = sorted(release[name], key=RPMVersion, reverse=True)[0]
@@ -89,20 +96,54 @@ class Downgrade:
             for command in self.pre_commands:
                 self.targets.run(command)
 
-            for package in self.packages:
-                temp = self.targets.copy()
-                for hn in self.targets:
-                    try:
-                        command = self.install_command.format(
-                            package, package, versions[hn][package]
+            failed = list(self.targets.keys())
+            transaction = {}
+            if self.transaction_command:
+                transaction = {
+                    hn: self.transaction_command.format(
+                        " ".join("{!s}={!s}".format(*x) for x in sorted(v.items()))
+                    )
+                    for hn, v in versions.items()
+                    if v
+                }
+                failed = []
+
+            if transaction:
+                targets = self.targets.select(list(transaction))
+                with timer("install", targets):
+                    targets.run(transaction)
+
+                for t in targets.values():
+                    if t.lastexit() in self.success:
+                        self._check(
+                            t, t.lastin(), t.lastout(), t.lasterr(), t.lastexit()
                         )
-                        self.commands.update({hn: command})
-                    except KeyError:
-                        del temp[hn]
-                temp.run(self.commands)
+                    else:
+                        logger.warning(
+                            "{!s}: downgrading all packages at once failed,"
+                            " downgrading them one by one".format(t.hostname)
+                        )
+                        failed.append(t.hostname)
 
-                for t in list(self.targets.values()):
-                    self._check(t, t.lastin(), t.lastout(), t.lasterr(), t.lastexit())
+            if failed:
+                fallback = self.targets.select(failed)
+                for package in self.packages:
+                    temp = fallback.copy()
+                    for hn in fallback:
+                        try:
+                            command = self.install_command.format(
+                                package, package, versions[hn][package]
+                            )
+                            self.commands.update({hn: command})
+                        except KeyError:
+                            del temp[hn]
+                    with timer("install", temp):
+                        temp.run(self.commands)
+
+                    for t in temp.values():
+                        self._check(
+                            t, t.lastin(), t.lastout(), t.lasterr(), t.lastexit()
+                        )
 
             for command in self.post_commands:
                 self.targets.run(command)
@@ -112,6 +153,22 @@ class Downgrade:
         finally:
             self.unlock_hosts()
 
+    def parse_versions(self, stdout):
+        """
+        :param stdout: output of `list_command`
+
+        :returns: {name: [version]} versions of the packages available
+            in the repositories
+        """
+        release = {}
+        for line in stdout.split("\n"):
+            match = re.search("(.*) = (.*)", line)
+            if match:
+                name = match.group(1)
+                version = match.group(2)
+                release.setdefault(name, []).append(version)
+        return release
+
     # TODO: check if this work correctly -> maybe use re
     def _check(self, target, stdin, stdout, stderr, exitcode):
         if "A ZYpp transaction is already in progress." in stderr:
@@ -156,6 +213,7 @@ class Downgrade:
     def lock_hosts(self):
         try:
             skipped = False
+            self.targets.refresh_locks()
             for t in self.targets.values():
                 if t.is_locked() and not t._lock.is_mine():
                     skipped = True
@@ -190,6 +248,7 @@ class Downgrade:
 
     def unlock_hosts(self):
         for t in self.targets.values():
+            t.invalidate_versions()
             if t.is_locked():
                 try:
                     t.unlock()
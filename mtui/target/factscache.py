@@ -0,0 +1,84 @@
+#
+# persistent cache of host facts shared between mtui sessions
+#
+
+from json import dumps, loads
+from logging import getLogger
+from threading import Lock
+
+from ..types import Product
+from ..types.systems import System
+from ..utils import atomic_write_file
+from ..xdg import save_cache_path
+from .parsers import HostFacts
+
+logger = getLogger("mtui.target.factscache")
+
+
+class HostFactsCache:
+    """
+    Stores L{HostFacts} of each host, without the lock state, in a json
+    file. Entries are validated by the caller comparing the fingerprint.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = None
+        self._mutex = Lock()
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path) as f:
+                    self._data = loads(f.read())
+            except (OSError, ValueError) as e:
+                logger.debug("host facts cache not loaded: {}".format(e))
+                self._data = {}
+        return self._data
+
+    def get(self, hostname):
+        """
+        :returns: L{HostFacts} or None
+        """
+        with self._mutex:
+            entry = self._load().get(hostname)
+
+        if not entry:
+            return None
+
+        try:
+            base = Product(*entry["base"])
+            addons = {Product(*x) for x in entry["addons"]}
+        except (KeyError, TypeError):
+            return None
+
+        return HostFacts(
+            System(base, addons), entry.get("kernel"), None, entry.get("fingerprint")
+        )
+
+    def put(self, hostname, facts):
+        """
+        :type facts: L{HostFacts}
+        """
+        if not (facts.system and facts.fingerprint):
+            return
+
+        entry = {
+            "base": list(facts.system.get_base()),
+            "addons": sorted(list(x) for x in facts.system.get_addons()),
+            "kernel": facts.kernel,
+            "fingerprint": facts.fingerprint,
+        }
+
+        with self._mutex:
+            data = self._load()
+            if data.get(hostname) == entry:
+                return
+            data[hostname] = entry
+            try:
+                atomic_write_file(dumps(data, indent=1, sort_keys=True), self.path)
+            except OSError as e:
+                logger.warning("failed to write host facts cache: {}".format(e))
+
+
+FactsCache = HostFactsCache(save_cache_path("hostfacts.json"))
@@ -0,0 +1,162 @@
+#
+# mtui event history kept on the targets
+#
+# Events are stored as JSON lines in /var/log/mtui/history.jsonl. When
+# the file grows over SEGMENT_SIZE it is rotated into a segment named by
+# the timestamp of its first entry, so the segment names are the index
+# used to skip whole segments when looking for a time window. Queries
+# read the newest entries first and stop as soon as enough entries
+# matched, so their cost doesn't depend on the size of the history.
+#
+
+from json import dumps, loads
+from shlex import quote
+
+from ..utils import timestamp
+
+HISTORY_DIR = "/var/log/mtui"
+HISTORY_FILE = HISTORY_DIR + "/history.jsonl"
+LEGACY_FILE = "/var/log/mtui.log"
+
+SEGMENT_SIZE = 256 * 1024
+SEGMENTS = 8
+
+APPEND_COMMAND = """d={d}; f={f}
+if [ "$(stat -c %s "$f" 2>/dev/null || echo 0)" -ge {size} ]; then
+  first=$(head -n 1 "$f" | sed -n 's/^{{"ts":\\([0-9]*\\).*/\\1/p')
+  mv "$f" "$d/history.$(printf %010d "${{first:-0}}").jsonl"
+  ls "$d" | grep '^history\\.[0-9]*\\.jsonl$' | sort -r | tail -n +{keep} |
+    while read s; do rm -f "$d/$s"; done
+fi
+mkdir -p "$d" && printf '%s\\n' {entry} >> "$f"
+"""
+
+# the newest entries come first. Files starting before `since` are the
+# last ones read and awk stops at the first entry older than `since`. The
+# legacy text history, still appended to by older mtui versions, is read
+# newest first along with them and merged by timestamp.
+QUERY_COMMAND = """d={d}
+{{
+  tac {f} 2>/dev/null
+  first=$(head -n 1 {f} 2>/dev/null | sed -n 's/^{{"ts":\\([0-9]*\\).*/\\1/p')
+  [ -n "$first" ] && [ {since} -gt 0 ] && [ "$first" -lt {since} ] && exit 0
+  for s in $(ls "$d" 2>/dev/null | grep '^history\\.[0-9]*\\.jsonl$' | sort -r); do
+    start=${{s#history.}}; start=${{start%.jsonl}}
+    [ {until} -gt 0 ] && [ "$start" -gt {until} ] && continue
+    tac "$d/$s"
+    [ {since} -gt 0 ] && [ "$start" -lt {since} ] && exit 0
+  done
+}} | awk -v count={count} -v since={since} -v until={until} -v events={events} \\
+  -v legacy={legacy} '
+function parse(line) {{
+  if (substr(line, 1, 1) == "{{") {{
+    if (!match(line, /"ts":[0-9]+/)) return 0
+    ts = substr(line, RSTART + 5, RLENGTH - 5) + 0
+    if (!match(line, /"event":"[^"]*"/)) return 0
+    ev = substr(line, RSTART + 9, RLENGTH - 10)
+  }} else {{
+    if (split(line, field, ":") < 3) return 0
+    ts = field[1] + 0; ev = field[3]
+  }}
+  return 1
+}}
+function emit(line, ts, ev) {{
+  if (until && ts > until) return
+  if (since && ts < since) {{ stop = 1; exit }}
+  if (events != "" && index(events, " " ev " ") == 0) return
+  print line
+  if (++found >= count) {{ stop = 1; exit }}
+}}
+function next_legacy() {{
+  while ((legacy | getline old) > 0)
+    if (parse(old)) {{ old_ts = ts; old_ev = ev; return }}
+  old_ts = -1
+}}
+BEGIN {{ next_legacy() }}
+{{
+  if (!parse($0)) next
+  new_ts = ts; new_ev = ev
+  while (old_ts > new_ts) {{ emit(old, old_ts, old_ev); next_legacy() }}
+  emit($0, new_ts, new_ev)
+}}
+END {{
+  while (!stop && old_ts >= 0) {{ emit(old, old_ts, old_ev); next_legacy() }}
+}}'
+"""
+
+
+def history_entry(user, comment, when=None):
+    """
+    :type comment: [str]
+    :param comment: event followed by its arguments
+
+    :returns: str history entry as a single JSON line
+    """
+    entry = {
+        "ts": int(when if when is not None else timestamp()),
+        "user": user,
+        "event": comment[0] if comment else "",
+        "args": [str(x) for x in comment[1:]],
+    }
+    return dumps(entry, separators=(",", ":"))
+
+
+def append_command(entry):
+    """
+    :returns: str shell command appending `entry` to the history,
+        rotating it if needed
+    """
+    return APPEND_COMMAND.format(
+        d=quote(HISTORY_DIR),
+        f=quote(HISTORY_FILE),
+        size=SEGMENT_SIZE,
+        keep=SEGMENTS + 1,
+        entry=quote(entry),
+    )
+
+
+def query_command(count, events=(), since=None, until=None):
+    """
+    :param count: maximal number of entries returned
+    :type events: [str]
+    :param events: return only these events, all if empty
+    :type since: int or None
+    :param since: oldest timestamp returned
+    :type until: int or None
+    :param until: newest timestamp returned
+
+    :returns: str shell command printing the matching entries, newest
+        first
+    """
+    return QUERY_COMMAND.format(
+        d=quote(HISTORY_DIR),
+        f=quote(HISTORY_FILE),
+        legacy=quote("tac {} 2>/dev/null".format(quote(LEGACY_FILE))),
+        count=int(count),
+        since=int(since or 0),
+        until=int(until or 0),
+        events=quote(" {} ".format(" ".join(events)) if events else ""),
+    )
+
+
+def parse_entries(stdout):
+    """
+    :param stdout: output of L{query_command}
+
+    :returns: [str] entries in the `timestamp:user:event:args` text
+        format, oldest first
+    """
+    lines = []
+    for line in stdout.splitlines():
+        if line.startswith("{"):
+            try:
+                entry = loads(line)
+                line = ":".join(
+                    [str(entry["ts"]), entry["user"], entry["event"]] + entry["args"]
+                )
+            except (ValueError, KeyError, TypeError):
+                continue
+        if line:
+            lines.append(line)
+    lines.reverse()
+    return lines
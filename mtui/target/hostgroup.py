@@ -1,13 +1,23 @@
 from collections import UserDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from logging import getLogger
 
 from mtui.target.actions import FileDelete
 from mtui.target.actions import FileDownload
 from mtui.target.actions import FileUpload
 from mtui.target.actions import RunCommand
+from mtui.target.history import query_command
 from mtui.target.locks import TargetLockedError
 
 from mtui.messages import HostIsNotConnectedError
 
+logger = getLogger("mtui.target.hostgroup")
+
+MAX_WORKERS: int = 16
+"""
+:param MAX_WORKERS: upper bound of per-host operations running at once
+"""
+
 
 class HostsGroup(UserDict):
 
@@ -49,30 +59,108 @@ class HostsGroup(UserDict):
             ]
         )
 
+    def _parallel(self, method, *a, timeout=None, **kw):
+        """
+        Calls L{Target} `method` on all hosts using bounded worker pool
+
+        :type method: str
+        :param method: name of the L{Target} method to call
+
+        :type timeout: int or float or None
+        :param timeout: seconds to wait for all hosts, hosts not done by
+            then are left running in background and reported with
+            L{TimeoutError}
+
+        :returns: (results, errors)
+            where results = {hostname: return value}
+                  errors = {hostname: exception}
+        """
+        results = {}
+        errors = {}
+
+        if not self.data:
+            return results, errors
+
+        workers = min(MAX_WORKERS, len(self.data))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = {
+            executor.submit(getattr(t, method), *a, **kw): hn
+            for hn, t in self.data.items()
+        }
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                hn = futures[future]
+                try:
+                    results[hn] = future.result()
+                except Exception as e:
+                    errors[hn] = e
+        except TimeoutError:
+            for future, hn in futures.items():
+                if not future.done():
+                    future.cancel()
+                    errors[hn] = TimeoutError(
+                        "{!s} not done after {!s}s".format(method, timeout)
+                    )
+            executor.shutdown(wait=False)
+        else:
+            executor.shutdown()
+
+        return results, errors
+
+    @staticmethod
+    def _reraise(errors, expected=()):
+        """
+        Raises the first error not listed in `expected` after all hosts
+        finished, so one failing host doesn't leave the others behind.
+        """
+        for hn, e in sorted(errors.items()):
+            if not isinstance(e, expected):
+                logger.debug("{!s}: {!r}".format(hn, e))
+                raise e
+
     def unlock(self, *a, **kw):
-        for x in self.data.values():
-            try:
-                x.unlock(*a, **kw)
-            except TargetLockedError:
-                pass  # logged in Target#unlock
+        _, errors = self._parallel("unlock", *a, **kw)
+        # TargetLockedError is logged in Target#unlock
+        self._reraise(errors, TargetLockedError)
 
     def lock(self, *a, **kw):
-        for x in self.data.values():
-            try:
-                x.lock(*a, **kw)
-            except TargetLockedError:
-                pass
+        _, errors = self._parallel("lock", *a, **kw)
+        for e in (x for x in errors.values() if isinstance(x, TargetLockedError)):
+            logger.warning(e)
+        self._reraise(errors, TargetLockedError)
 
     def query_versions(self, packages):
-        rs = []
-        for x in self.data.values():
-            rs.append((x, x.query_package_versions(packages)))
+        results, errors = self._parallel("query_package_versions", packages)
+        self._reraise(errors)
 
-        return rs
+        return [(x, results[hn]) for hn, x in self.data.items()]
 
     def add_history(self, data):
-        for tgt in self.data.values():
-            tgt.add_history(data)
+        _, errors = self._parallel("add_history", data)
+        self._reraise(errors)
+
+    def close(self, *a, timeout=None, **kw):
+        """
+        Closes connections to all hosts. Errors on single hosts are
+        logged and don't prevent closing the rest.
+
+        :param timeout: seconds to wait for hosts to close, hung hosts
+            are given up on
+        """
+        _, errors = self._parallel("close", *a, timeout=timeout, **kw)
+        for hn, e in errors.items():
+            logger.warning("{!s}: failed to close connection: {!s}".format(hn, e))
+
+    def reload_products(self):
+        """
+        Re-reads installed products on all hosts
+
+        :returns: [str] hostnames reloaded successfully
+        """
+        results, errors = self._parallel("reload_system")
+        for hn, e in errors.items():
+            logger.warning("{!s}: failed to reload products: {!s}".format(hn, e))
+        return sorted(results)
 
     def names(self):
         return list(self.data.keys())
@@ -86,30 +174,59 @@ class HostsGroup(UserDict):
     def remove(self, path):
         return FileDelete(self.data.values(), path).run()
 
-    def run(self, cmd):
-        return self._run(cmd)
+    def run(self, cmd, feed=None):
+        """
+        :type feed: {str: callable(bytes) -> None} or None
+        :param feed: receivers of the command output per hostname
+        """
+        return self._run(cmd, feed)
 
-    def _run(self, cmd):
-        return RunCommand(self.data, cmd).run()
+    def _run(self, cmd, feed=None):
+        return RunCommand(self.data, cmd, feed).run()
 
     def report_self(self, sink):
         for hn in sorted(self.data.keys()):
             self.data[hn].report_self(sink)
 
-    def report_history(self, sink, count, events):
-        if events:
-            self._run(
-                "tac /var/log/mtui.log | grep -m {} {} | tac".format(
-                    count, " ".join([('-e ":{}"'.format(e)) for e in events])
-                )
-            )
-        else:
-            self._run("tail -n {} /var/log/mtui.log".format(count))
+    def report_history(self, sink, count, events, since=None, until=None):
+        self._run(query_command(count, events, since, until))
 
         for hn in sorted(self.data.keys()):
             self.data[hn].report_history(sink)
 
+    def refresh_locks(self):
+        """
+        Reads the lock state of all hosts in parallel, hosts failing to
+        answer keep the last known state
+
+        With a lock registry configured, it is queried first and hosts
+        holding a live lease are reported locked by it. Only the
+        lockfiles of the other hosts are read, as sessions not using the
+        registry only lock the host itself.
+        """
+        hosts = [t for t in self.data.values() if t.state == "enabled"]
+        registry = hosts[0]._lock.registry if hosts else None
+
+        leased = set()
+        if registry:
+            try:
+                locks = registry.query(t._lock.hostname for t in hosts)
+            except Exception as e:
+                logger.warning("failed to query lock registry: {!s}".format(e))
+                locks = {}
+            for t in hosts:
+                lock = locks.get(t._lock.hostname)
+                if lock:
+                    t._lock.load(lock.to_lockfile())
+                    leased.add(t.hostname)
+
+        unleased = HostsGroup(t for t in self.data.values() if t.hostname not in leased)
+        _, errors = unleased._parallel("refresh_lock")
+        for hn, e in errors.items():
+            logger.warning("{!s}: failed to read lock state: {!s}".format(hn, e))
+
     def report_locks(self, sink):
+        self.refresh_locks()
         for hn in sorted(self.data.keys()):
             self.data[hn].report_locks(sink)
 
@@ -1,6 +1,6 @@
 from logging import getLogger
 
-from mtui.target.actions import ThreadedMethod, UpdateError, queue
+from mtui.target.actions import ThreadedMethod, UpdateError, queue, wait_for_prefetch
 
 logger = getLogger("mtui.target.install")
 
@@ -12,8 +12,10 @@ class Install:
 
     def run(self):
         skipped = False
+        wait_for_prefetch(self.targets)
 
         try:
+            self.targets.refresh_locks()
             for t in self.targets.values():
                 if t.is_locked() and not t._lock.is_mine():
                     skipped = True
@@ -51,6 +53,7 @@ class Install:
             raise
         finally:
             for t in self.targets.values():
+                t.invalidate_versions()
                 if t.is_locked():
                     try:
                         t.unlock()
@@ -2,6 +2,8 @@ import errno
 import os
 from datetime import datetime
 from logging import getLogger
+from shlex import quote
+from time import monotonic
 
 from mtui.utils import timestamp
 
@@ -12,6 +14,51 @@ class TargetLockedError(Exception):
     pass
 
 
+# Creates the lockfile with noclobber, so checking the owner and setting
+# the lock is a single atomic step on the target. An empty lockfile is
+# being written by a concurrent creator and is retried, it is taken over
+# only if it stays empty. A lock held by the same owner or matching the
+# expired lease `stale` is replaced under a guard directory: the lockfile
+# is read again, renamed aside, checked to be the one read and the new
+# lock is linked in without clobbering a lock created meanwhile.
+# Prints "ok" on success or "locked" followed by the current lockfile
+# line.
+LOCK_SCRIPT = """f={filename}
+line={line}
+tmp="$f.$$"
+guard="$f.guard"
+for i in 1 2 3 4 5; do
+  if ( set -C; printf '%s' "$line" > "$f" ) 2>/dev/null; then
+    echo ok; exit 0
+  fi
+  current=$(head -n 1 "$f" 2>/dev/null) || continue
+  if [ -z "$current" ] && [ "$i" -lt 5 ]; then
+    sleep {delay}; continue
+  fi
+  if [ -z "$current" ] || [ "$current" = {stale} ] ||
+     [ "$(printf '%s' "$current" | cut -d: -f2,3)" = {owner} ]; then
+    find "$guard" -maxdepth 0 -mmin +1 -exec rmdir {{}} \\; 2>/dev/null
+    mkdir "$guard" 2>/dev/null || {{ sleep {delay}; continue; }}
+    printf '%s' "$line" > "$tmp"
+    taken=
+    if [ "$(head -n 1 "$f" 2>/dev/null)" = "$current" ] &&
+       mv "$f" "$tmp.old" 2>/dev/null; then
+      if [ "$(head -n 1 "$tmp.old")" = "$current" ]; then
+        ln "$tmp" "$f" 2>/dev/null && taken=1
+      else
+        ln "$tmp.old" "$f" 2>/dev/null
+      fi
+    fi
+    rm -f "$tmp" "$tmp.old"; rmdir "$guard"
+    [ -n "$taken" ] && echo ok && exit 0
+    continue
+  fi
+  echo locked; printf '%s\\n' "$current"; exit 0
+done
+exit 1
+"""
+
+
 class RemoteLock:
 
     """
@@ -115,8 +162,27 @@ class TargetLock:
 
     filename = "/var/lock/mtui.lock"
 
-    def __init__(self, connection, config):
+    ttl = 5
+    """
+    :type ttl: int or float
+    :param ttl: seconds the lock state read from the target is reused
+        before reading the lockfile again
+    """
+
+    retry_delay = 1
+    """
+    :type retry_delay: int or float
+    :param retry_delay: seconds to wait before reading a lockfile being
+        written by someone else again
+    """
+
+    def __init__(self, connection, config, registry=None):
+        """
+        :type registry: L{mtui.target.registry.LockRegistry} or None
+        :param registry: central registry the lock is also kept in
+        """
         self.connection = connection
+        self.registry = registry
         self.i_am_user = config.session_user
         self.i_am_pid = os.getpid()
         """
@@ -124,9 +190,50 @@ class TargetLock:
     """
 
         self._lock = RemoteLock()
+        self._loaded = None
+
+    def _set(self, lock):
+        self._lock = lock
+        self._loaded = monotonic()
+
+    def invalidate(self) -> None:
+        """
+        Forces the next query to read the lockfile from the target
+        """
+        self._loaded = None
+
+    @property
+    def hostname(self):
+        return self.connection.hostname
+
+    @property
+    def state(self):
+        """
+        :returns: L{RemoteLock} as seen by the last L{load}
+        """
+        return self._lock
+
+    def load(self, data=None, force=False) -> None:
+        """
+        :type data: str or None
+        :param data: content of the lockfile if already read by the
+            caller, the lockfile is read from the target otherwise
+
+        :type force: bool
+        :param force: read the lockfile even if the state read before
+            is younger than L{ttl}
+        """
+        if data is not None:
+            self._set(RemoteLock.from_lockfile(data))
+            return
+
+        if (
+            not force
+            and self._loaded is not None
+            and monotonic() - self._loaded < self.ttl
+        ):
+            return
 
-    # TODO: some cache needed
-    def load(self) -> None:
         logger.debug(f"{self.connection.hostname}: getting mtui lock state")
 
         self._lock = RemoteLock()  # make sure lock is reset.
@@ -141,7 +248,7 @@ class TargetLock:
             data = lockfile.readline()
             lockfile.close()
 
-        self._lock = RemoteLock.from_lockfile(data)
+        self._set(RemoteLock.from_lockfile(data))
 
     def is_locked(self) -> bool:
         """
@@ -160,17 +267,6 @@ class TargetLock:
         :returns: None
         :raises TargetLockedError: if target is already locked.
         """
-        if self.is_locked():
-            # NOTE: there is a slight race between between getting the
-            # state of the lock on target host and setting the lock.
-            # However, that has always been here afaik.
-            # TODO: test if using sftpclient.mkdir can be used to make
-            # the locking really atomic.
-            if not self.is_mine():
-                # NOTE: let the code pass through if is_mine() as
-                # setting a different comment may be desired.
-                raise TargetLockedError(self.locked_by_msg())
-
         logger.debug("{!s}: setting lock".format(self.connection.hostname))
 
         rl = RemoteLock()
@@ -179,15 +275,82 @@ class TargetLock:
         rl.pid = self.i_am_pid
         rl.comment = comment
 
+        stale = None
+        if self.registry:
+            acquired, previous = self.registry.acquire(self.hostname, rl)
+            if not acquired:
+                self._set(previous)
+                raise TargetLockedError(self.locked_by_msg())
+            stale = previous
+
+        try:
+            self._lock_host(rl, stale)
+        except BaseException:
+            if self.registry:
+                self.registry.release(self.hostname, rl)
+            raise
+
+    def adopt(self, previous):
+        """
+        Takes over `previous`, a lock of an earlier mtui process of this
+        user, keeping its comment. The target is locked again if the
+        lock is gone meanwhile.
+
+        :type previous: L{RemoteLock}
+        :raises TargetLockedError: if target is locked by someone else
+        """
+        if previous.user != self.i_am_user:
+            raise TargetLockedError(
+                "{!s}: not adopting lock of {!s}".format(self.hostname, previous.user)
+            )
+
+        rl = RemoteLock()
+        rl.user = self.i_am_user
+        rl.timestamp = timestamp()
+        rl.pid = self.i_am_pid
+        rl.comment = previous.comment
+
+        if self.registry:
+            self.registry.release(self.hostname, previous)
+            acquired, holder = self.registry.acquire(self.hostname, rl)
+            if not acquired:
+                self._set(holder)
+                raise TargetLockedError(self.locked_by_msg())
+
         try:
-            lockfile = self.connection.open(self.filename, "w+")
+            self._lock_host(rl, previous)
+        except BaseException:
+            if self.registry:
+                self.registry.release(self.hostname, rl)
+            raise
+
+    def _lock_host(self, rl, stale=None):
+        """
+        :type stale: L{RemoteLock} or None
+        :param stale: lock of an expired lease which may be overwritten
+        """
+        script = LOCK_SCRIPT.format(
+            filename=quote(self.filename),
+            line=quote(rl.to_lockfile()),
+            owner=quote("{!s}:{!s}".format(rl.user, rl.pid)),
+            stale=quote(stale.to_lockfile()) if stale else "''",
+            delay=self.retry_delay,
+        )
+        try:
+            exitcode, stdout, stderr = self.connection.execute(script)
         except Exception as e:
-            logger.error("failed to open lockfile: {!s}".format(e))
+            logger.error("failed to set lock: {!s}".format(e))
             raise
 
-        lockfile.write(rl.to_lockfile())
-        lockfile.close()
-        self._lock = rl
+        status, _, current = stdout.partition("\n")
+        if status == "locked":
+            self._set(RemoteLock.from_lockfile(current))
+            raise TargetLockedError(self.locked_by_msg())
+        if exitcode or status != "ok":
+            logger.error("failed to set lock: {!s}".format(stderr.strip()))
+            raise IOError("failed to set lock on {!s}".format(self.connection.hostname))
+
+        self._set(rl)
 
     def locked_by_msg(self) -> str:
         """
@@ -219,6 +382,18 @@ class TargetLock:
           locks anymore due to different pid) or someone elses mtui
           hangs and you need to access the systems
         """
+        try:
+            self._unlock_host(force)
+        finally:
+            # the lease is ours even if the lockfile is gone, e.g. after
+            # a reboot, or was taken over by someone else
+            if self.registry:
+                owner = RemoteLock()
+                owner.user = self.i_am_user
+                owner.pid = self.i_am_pid
+                self.registry.release(self.hostname, None if force else owner)
+
+    def _unlock_host(self, force):
         if not self.is_locked():
             return
 
@@ -234,7 +409,7 @@ class TargetLock:
             logger.error("failed to remove lockfile: {!s}".format(e))
             raise
 
-        self._lock = RemoteLock()
+        self._set(RemoteLock())
 
     def is_mine(self) -> bool:
         """
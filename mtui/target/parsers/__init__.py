@@ -1,11 +1,59 @@
+from collections import namedtuple
+from io import StringIO
 from logging import getLogger
+from shlex import quote
 
+from mtui.target.history import append_command
 from mtui.types import Product
 from mtui.types.systems import System
 from mtui.target.parsers import product
 
 logger = getLogger("mtui.target.parsers")
 
+HostFacts = namedtuple("HostFacts", ["system", "kernel", "lock", "fingerprint"])
+"""
+:param system: L{System} or None if products were not read
+:param kernel: str running kernel release
+:param lock: str first line of the mtui lockfile, empty if not locked
+:param fingerprint: str changes whenever products or packages change
+"""
+
+MARKER = "### mtui:"
+
+# files rewritten by every transaction of the supported package managers
+PKGDB_FILES = (
+    "/var/lib/rpm/Packages",
+    "/var/lib/rpm/Packages.db",
+    "/var/lib/rpm/rpmdb.sqlite",
+    "/usr/lib/sysimage/rpm/Packages",
+    "/usr/lib/sysimage/rpm/Packages.db",
+    "/usr/lib/sysimage/rpm/rpmdb.sqlite",
+    "/var/lib/dpkg/status",
+)
+
+PKGDB_COMMAND = "stat -c '{}pkgdb %n %Y %s' {} 2>/dev/null".format(
+    MARKER, " ".join(PKGDB_FILES)
+)
+
+# emits one section per fact, each introduced by a MARKER line
+STATE_COMMAND = r"""
+echo "{m}kernel"; uname -r
+echo "{m}fingerprint"
+stat -c '%n %Y %s' /etc/products.d {pkgdb} 2>/dev/null
+if [ -f {lockfile} ]; then echo "{m}lock"; head -n 1 {lockfile}; fi
+"""
+
+PRODUCTS_COMMAND = r"""
+if [ -d /etc/products.d ]; then
+  echo "{m}baseproduct"; readlink /etc/products.d/baseproduct
+  for f in /etc/products.d/*.prod; do
+    [ -f "$f" ] || continue
+    echo "{m}product:${{f##*/}}"; cat "$f"; echo
+  done
+fi
+if [ -f /etc/os-release ]; then echo "{m}os-release"; cat /etc/os-release; fi
+"""
+
 
 def parse_system(connection):
     try:
@@ -42,8 +90,106 @@ def parse_system(connection):
             logger.debug("parsing - {}".format(x))
             name, version, arch = product.parse_product(f)
             addons.add(Product(name, version, arch))
+    return _suse_system(base, addons)
+
+
+def _suse_system(base, addons):
     # SLE4SAP on sle12 contains also SLES repos :(
     if base.name == "SLES_SAP" and base.version.startswith("12"):
         addons.add(Product("SLES", base.version, base.arch))
         addons.add(Product("sle-ha", base.version, base.arch))
     return System(base, addons)
+
+
+def parse_pkgdb(stdout):
+    """
+    :returns: str package database generation marker found in output
+        of L{PKGDB_COMMAND}, empty if there is none
+    """
+    prefix = MARKER + "pkgdb "
+    return "\n".join(sorted(x for x in stdout.splitlines() if x.startswith(prefix)))
+
+
+def parse_facts(stdout):
+    """
+    Splits output of L{STATE_COMMAND} and L{PRODUCTS_COMMAND} into
+    sections
+
+    :returns: {section: [line]} where lines keep their line endings
+    """
+    sections = {}
+    current = None
+    for line in stdout.splitlines(keepends=True):
+        if line.startswith(MARKER):
+            current = line[len(MARKER) :].strip()
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    return sections
+
+
+def system_from_facts(sections):
+    """
+    :returns: L{System} described by parsed L{PRODUCTS_COMMAND} output
+    """
+    files = {
+        k.split(":", 1)[1]: v
+        for k, v in sections.items()
+        if k.startswith("product:") and k != "product:qa.prod"
+    }
+
+    if "baseproduct" not in sections:
+        if "os-release" not in sections:
+            # TODO: old RH systems have only /etc/redhat-release
+            return System(Product("rhel", "6", "x86_64"))
+        name, version, arch = product.parse_os_release(
+            StringIO("".join(sections["os-release"]))
+        )
+        return System(Product(name, version, arch))
+
+    basefile = "".join(sections["baseproduct"]).strip().split("/")[-1]
+    base = Product(*product.parse_product(files.pop(basefile)))
+    addons = {Product(*product.parse_product(x)) for x in files.values()}
+    return _suse_system(base, addons)
+
+
+def gather_facts(connection, lockfile, history=None, products=True, interactive=True):
+    """
+    Collects products, os-release, the lockfile and the running kernel
+    with a single remote command.
+
+    :param lockfile: path of the remote mtui lockfile
+    :type history: str or None
+    :param history: entry appended to the remote history in the same
+        round-trip, see L{mtui.target.history.history_entry}
+    :param products: if False, only the kernel, the lock and the
+        fingerprint are collected
+    :param interactive: if False, a timeout fails instead of asking the
+        user, for gathering facts in background
+
+    :returns: L{HostFacts} or None if the output could not be parsed
+    """
+    command = STATE_COMMAND.format(
+        m=MARKER, lockfile=quote(lockfile), pkgdb=" ".join(PKGDB_FILES)
+    )
+    if products:
+        command += PRODUCTS_COMMAND.format(m=MARKER)
+    if history:
+        command += append_command(history)
+
+    try:
+        _, stdout, _ = connection.execute(command, interactive=interactive)
+        sections = parse_facts(stdout)
+        if "kernel" not in sections:
+            raise ValueError("unexpected output")
+        system = system_from_facts(sections) if products else None
+    except Exception as e:
+        logger.debug("{}: gathering facts failed: {}".format(connection.hostname, e))
+        return None
+
+    return HostFacts(
+        system,
+        "".join(sections.get("kernel", [])).strip(),
+        "".join(sections.get("lock", [])).strip(),
+        "".join(sections.get("fingerprint", [])).strip(),
+    )
@@ -0,0 +1,200 @@
+#
+# parser of `zypper --xmlout` output
+#
+# The output is fed in chunks as it arrives from the host. Every complete
+# element is turned into an event right away and dropped from the tree,
+# so the output is read only once and never kept as a whole.
+#
+
+from collections import namedtuple
+import re
+import xml.etree.ElementTree as ET
+
+Patch = namedtuple("Patch", ["name", "status", "category", "repository"])
+Solvable = namedtuple("Solvable", ["name", "edition", "arch", "status", "repository"])
+Progress = namedtuple("Progress", ["id", "name", "value", "done"])
+Message = namedtuple("Message", ["type", "text"])
+Prompt = namedtuple("Prompt", ["id", "text", "options"])
+
+
+class ZypperXMLParser:
+    """
+    Incremental parser of `zypper --xmlout` output yielding L{Patch},
+    L{Solvable}, L{Progress}, L{Message} and L{Prompt} events
+
+    Anything zypper printed before the document is skipped. L{feed}
+    never raises, so it can be called from the channel reader, parse
+    errors are raised by L{close}.
+    """
+
+    def __init__(self):
+        self._parser = None
+        self._head = b""
+        self._events = []
+        self.error = None
+
+    def feed(self, data):
+        """
+        :type data: bytes or str
+        """
+        if self.error:
+            return
+        if isinstance(data, str):
+            data = data.encode()
+
+        try:
+            if not self._parser:
+                self._head += data
+                start = self._head.find(b"<?xml")
+                if start < 0:
+                    start = self._head.find(b"<stream")
+                if start < 0:
+                    return
+                self._parser = ET.XMLPullParser(events=("end",))
+                data, self._head = self._head[start:], b""
+
+            self._parser.feed(data)
+            self._read()
+        except ET.ParseError as e:
+            self.error = e
+
+    def _read(self):
+        for _, elem in self._parser.read_events():
+            event = self._event(elem)
+            if event:
+                self._events.append(event)
+                elem.clear()
+
+    @staticmethod
+    def _event(elem):
+        if elem.tag == "update" and elem.get("kind", "patch") == "patch":
+            source = elem.find("source")
+            return Patch(
+                elem.get("name"),
+                elem.get("status"),
+                elem.get("category"),
+                source.get("alias", "") if source is not None else "",
+            )
+        if elem.tag == "solvable":
+            return Solvable(
+                elem.get("name"),
+                elem.get("edition"),
+                elem.get("arch"),
+                elem.get("status"),
+                elem.get("repository", ""),
+            )
+        if elem.tag == "progress":
+            return Progress(
+                elem.get("id"),
+                elem.get("name"),
+                elem.get("value"),
+                elem.get("done") is not None,
+            )
+        if elem.tag == "message":
+            return Message(elem.get("type"), (elem.text or "").strip())
+        if elem.tag == "prompt":
+            return Prompt(
+                elem.get("id"),
+                (elem.findtext("text") or "").strip(),
+                [x.get("value") for x in elem.iter("option")],
+            )
+        return None
+
+    def events(self, kind=None):
+        """
+        :param kind: return only events of this type, all if None
+
+        :returns: [event] parsed so far
+        """
+        return [x for x in self._events if kind is None or isinstance(x, kind)]
+
+    def errors(self):
+        """
+        :returns: [str] error messages
+
+        Prompts are not errors, `zypper -n` answers them itself and
+        still emits them, see L{prompt}.
+        """
+        return [
+            x.text for x in self._events if isinstance(x, Message) and x.type == "error"
+        ]
+
+    def prompt(self):
+        """
+        :returns: L{Prompt} zypper asked last, which it aborted on if it
+            failed, None if there was none
+        """
+        prompts = self.events(Prompt)
+        return prompts[-1] if prompts else None
+
+    def close(self):
+        """
+        :raises ET.ParseError: if the output isn't a valid document
+        """
+        if not self.error:
+            try:
+                if not self._parser:
+                    raise ET.ParseError("no xml document found")
+                self._parser.close()
+                self._read()
+            except ET.ParseError as e:
+                self.error = e
+        if self.error:
+            raise self.error
+
+
+def parse(xml):
+    """
+    :param xml: complete `zypper --xmlout` output
+
+    :returns: L{ZypperXMLParser} holding the events
+    :raises ET.ParseError: if the output is not valid xml
+    """
+    parser = ZypperXMLParser()
+    parser.feed(xml)
+    parser.close()
+    return parser
+
+
+def parse_patches(xml):
+    """
+    :param xml: output of `zypper --xmlout patches`
+
+    :returns: [L{Patch}]
+    :raises ET.ParseError: if the output is not valid xml
+    """
+    return parse(xml).events(Patch)
+
+
+def patches_of(patches, repository):
+    """
+    :param repository: regular expression matching the repository alias
+
+    :returns: [L{Patch}] from repositories matching `repository`
+    """
+    pattern = re.compile(repository)
+    return [x for x in patches if pattern.search(x.repository)]
+
+
+def parse_search(xml):
+    """
+    :param xml: output of `zypper --xmlout search -s`
+
+    :returns: [L{Solvable}]
+    :raises ET.ParseError: if the output is not valid xml
+    """
+    return parse(xml).events(Solvable)
+
+
+def installed_versions(solvables):
+    """
+    :type solvables: [L{Solvable}]
+
+    :returns: {name: (version, ...)} sorted versions available of
+        installed packages
+    """
+    versions = {}
+    for x in solvables:
+        if x.status in ("installed", "other-version"):
+            versions.setdefault(x.name, set()).add(x.edition)
+    return {name: tuple(sorted(v)) for name, v in versions.items()}
@@ -1,11 +1,21 @@
 from logging import getLogger
 
-from mtui.target.actions import ThreadedMethod, UpdateError, queue, spinner
+from mtui.target.actions import (
+    ThreadedMethod,
+    UpdateError,
+    queue,
+    spinner,
+    wait_for_prefetch,
+)
+from mtui.target.timing import PhaseTimer, get_timings
 
 logger = getLogger("mtui.target.prepare")
 
 
 class Prepare(object):
+    # exit codes of successful transactions
+    success = (0,)
+
     def __init__(
         self,
         targets,
@@ -22,11 +32,24 @@ class Prepare(object):
         self.force = force
         self.installed_only = installed_only
         self.commands = []
+        """
+        :type commands: [str]
+        :param commands: installs the packages one by one
+        """
+        self.transaction = None
+        """
+        :type transaction: str or None
+        :param transaction: installs all packages in one transaction,
+            `commands` are used on hosts where it fails
+        """
 
     def run(self):
+        timer = PhaseTimer(self.targets, "prepare", get_timings())
         skipped = False
+        wait_for_prefetch(self.targets)
 
         try:
+            self.targets.refresh_locks()
             for t in self.targets.values():
                 if t.is_locked() and not t._lock.is_mine():
                     skipped = True
@@ -55,16 +78,17 @@ class Prepare(object):
                         pass
                 raise UpdateError("Hosts locked")
 
-            for t in self.targets.values():
-                if self.testing:
-                    queue.put([t.set_repo, ["add", self.testreport]])
-                else:
-                    queue.put([t.set_repo, ["remove", self.testreport]])
+            with timer("repos"):
+                for t in self.targets.values():
+                    if self.testing:
+                        queue.put([t.set_repo, ["add", self.testreport]])
+                    else:
+                        queue.put([t.set_repo, ["remove", self.testreport]])
 
-            while queue.unfinished_tasks:
-                spinner()
+                while queue.unfinished_tasks:
+                    spinner()
 
-            queue.join()
+                queue.join()
 
             for t in self.targets.values():
                 if t.lasterr():
@@ -75,15 +99,39 @@ class Prepare(object):
                     )
                     return
 
-            for command in self.commands:
-                self.targets.run(command)
+            targets = self.targets
+            if self.transaction:
+                with timer("install"):
+                    self.targets.run(self.transaction)
 
+                failed = []
                 for t in self.targets.values():
-                    self._check(t, t.lastin(), t.lastout(), t.lasterr(), t.lastexit())
+                    if t.lastexit() in self.success:
+                        self._check(
+                            t, t.lastin(), t.lastout(), t.lasterr(), t.lastexit()
+                        )
+                    else:
+                        logger.warning(
+                            "{!s}: installing all packages at once failed,"
+                            " installing them one by one".format(t.hostname)
+                        )
+                        failed.append(t.hostname)
+                targets = self.targets.select(failed) if failed else None
+
+            if targets:
+                for command in self.commands:
+                    with timer("install", targets):
+                        targets.run(command)
+
+                    for t in targets.values():
+                        self._check(
+                            t, t.lastin(), t.lastout(), t.lasterr(), t.lastexit()
+                        )
         except BaseException:
             raise
         finally:
             for t in self.targets.values():
+                t.invalidate_versions()
                 if t.is_locked():
                     try:
                         t.unlock()
@@ -0,0 +1,174 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+import os
+import re
+from time import monotonic, sleep
+
+from .hostgroup import MAX_WORKERS
+
+logger = getLogger("mtui.target.reboot")
+
+BootState = namedtuple(
+    "BootState",
+    ["boot_id", "kernel", "snapshot", "next_kernel", "next_snapshot"],
+    defaults=(None, None),
+)
+RebootResult = namedtuple(
+    "RebootResult",
+    ["hostname", "before", "after", "downtime", "error", "unexpected"],
+    defaults=((),),
+)
+
+
+def parse_boot_state(stdout):
+    """
+    :param stdout: output of L{Reboot.state_command}
+
+    :returns: L{BootState} or None if the output is incomplete
+    """
+    lines = stdout.splitlines()
+    if len(lines) < 3:
+        return None
+
+    snapshot = re.search(r"@/\.snapshots/(\d+)/snapshot", lines[2])
+    next_kernel = next_snapshot = None
+    if len(lines) >= 5:
+        # /boot/vmlinuz links to the kernel booted by default
+        next_kernel = os.path.basename(lines[3].strip()).partition("-")[2] or None
+        match = re.search(r"\.snapshots/(\d+)/snapshot", lines[4])
+        next_snapshot = match.group(1) if match else None
+    return BootState(
+        lines[0].strip(),
+        lines[1].strip(),
+        snapshot.group(1) if snapshot else None,
+        next_kernel,
+        next_snapshot,
+    )
+
+
+def unexpected_boot(before, after):
+    """
+    :type before: L{BootState}
+    :type after: L{BootState}
+
+    :returns: [str] kernel and snapshot booted which differ from the
+        defaults `before` the reboot. Defaults not known are not checked,
+        neither is the snapshot of hosts not booting from one.
+    """
+    unexpected = []
+    if before.next_kernel and after.kernel != before.next_kernel:
+        unexpected.append(
+            "kernel {} instead of {}".format(after.kernel, before.next_kernel)
+        )
+    snapshot = before.snapshot and before.next_snapshot
+    if snapshot and after.snapshot != before.next_snapshot:
+        unexpected.append(
+            "snapshot {} instead of {}".format(after.snapshot, before.next_snapshot)
+        )
+    return unexpected
+
+
+class Reboot:
+    """
+    Reboots targets in parallel, or in waves of `wave_size` hosts, and
+    waits for them to come back.
+    """
+
+    # detach from the session so the command returns before sshd dies
+    command = 'nohup sh -c "sleep 2; reboot" >/dev/null 2>&1 &'
+    # the running kernel and snapshot followed by the default ones, the
+    # echos keep a line for each even if the command fails
+    state_command = (
+        "cat /proc/sys/kernel/random/boot_id; uname -r; cat /proc/cmdline; "
+        'echo "$(readlink /boot/vmlinuz /boot/Image /boot/image 2>/dev/null '
+        '| head -n 1)"; '
+        'echo "$(btrfs subvolume get-default / 2>/dev/null)"'
+    )
+
+    def __init__(self, targets, timeout=600, wave_size=0):
+        """
+        :type targets: L{HostsGroup}
+        :param timeout: seconds to wait for each host to come back
+        :param wave_size: hosts rebooted at once, 0 means all
+        """
+        self.targets = targets
+        self.timeout = timeout
+        self.wave_size = wave_size
+
+    def waves(self):
+        hosts = [t for _, t in sorted(self.targets.items())]
+        size = self.wave_size or len(hosts) or 1
+        return [hosts[i : i + size] for i in range(0, len(hosts), size)]
+
+    def run(self):
+        """
+        :returns: {hostname: L{RebootResult}}
+        """
+        results = {}
+
+        for t in self.targets.values():
+            if t.is_locked() and not t._lock.is_mine():
+                logger.warning(
+                    "host {!s} is locked since {!s} by {!s}. skipping.".format(
+                        t.hostname, t._lock.time(), t._lock.locked_by()
+                    )
+                )
+                results[t.hostname] = RebootResult(
+                    t.hostname, None, None, None, "locked"
+                )
+
+        for n, wave in enumerate(self.waves(), 1):
+            wave = [t for t in wave if t.hostname not in results]
+            if not wave:
+                continue
+            logger.info(
+                "rebooting wave {}: {}".format(n, " ".join(t.hostname for t in wave))
+            )
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(wave))) as ex:
+                for r in ex.map(self._reboot_one, wave):
+                    results[r.hostname] = r
+
+        return results
+
+    def _boot_state(self, target):
+        target.run(self.state_command)
+        return parse_boot_state(target.lastout())
+
+    def _reboot_one(self, target):
+        if target.state != "enabled":
+            target.run("reboot")
+            return RebootResult(target.hostname, None, None, None, target.state)
+
+        before = self._boot_state(target)
+        target.add_history(["reboot"])
+        logger.info("rebooting {}".format(target.hostname))
+        target.run(self.command)
+        down = monotonic()
+
+        deadline = down + self.timeout
+        after = before
+        while after == before:
+            # the first attempts may still reach the host before it goes
+            # down, so wait for the boot id to change
+            remaining = deadline - monotonic()
+            if remaining <= 0 or not target.reconnect(timeout=remaining):
+                return RebootResult(target.hostname, before, None, None, "timeout")
+            after = self._boot_state(target)
+            if after == before:
+                sleep(5)
+
+        downtime = monotonic() - down
+        target.add_history(["connect"])
+        logger.info(
+            "{} is back after {:.0f}s, running kernel {}".format(
+                target.hostname, downtime, after.kernel if after else "unknown"
+            )
+        )
+
+        unexpected = unexpected_boot(before, after) if before and after else []
+        for x in unexpected:
+            logger.warning("{}: booted {}".format(target.hostname, x))
+        return RebootResult(
+            target.hostname, before, after, downtime, None, tuple(unexpected)
+        )
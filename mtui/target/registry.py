@@ -0,0 +1,229 @@
+#
+# central registry of target locks shared by mtui instances
+#
+
+from abc import ABCMeta, abstractmethod
+from logging import getLogger
+import sqlite3
+from threading import Event, Lock, Thread
+from time import time
+
+from .locks import RemoteLock
+
+logger = getLogger("mtui.target.registry")
+
+
+class LockRegistry(metaclass=ABCMeta):
+    """
+    Backend keeping leases of target locks in one place, so the lock
+    state of many hosts can be queried in a single request.
+
+    Leases of locks held by this process are renewed by a heartbeat
+    thread, locks of crashed sessions expire after `lease` seconds.
+    """
+
+    def __init__(self, lease=300):
+        self.lease = lease
+        self._held = {}
+        self._mutex = Lock()
+        self._stop = Event()
+        self._heartbeat = None
+
+    @abstractmethod
+    def acquire(self, hostname, lock):
+        """
+        Registers `lock` for `hostname` unless a live lease of someone
+        else exists
+
+        :type lock: L{RemoteLock}
+
+        :returns: (acquired, previous)
+            where acquired = bool
+                  previous = L{RemoteLock} replaced or blocking, or None
+        """
+
+    @abstractmethod
+    def release(self, hostname, lock=None):
+        """
+        Removes the lease of `hostname`
+
+        :type lock: L{RemoteLock} or None
+        :param lock: remove only the lease of this owner, any if None
+        """
+
+    @abstractmethod
+    def renew(self, hostnames, user, pid):
+        """
+        Extends the leases of `hostnames` owned by `user` and `pid`
+        """
+
+    @abstractmethod
+    def query(self, hostnames):
+        """
+        :returns: {hostname: L{RemoteLock}} for hosts with a live lease
+        """
+
+    def hold(self, hostname, lock):
+        with self._mutex:
+            self._held[hostname] = lock
+            if not self._heartbeat:
+                self._stop = Event()
+                self._heartbeat = Thread(
+                    target=self._beat, args=(self._stop,), daemon=True
+                )
+                self._heartbeat.start()
+
+    def drop(self, hostname):
+        """
+        Stops renewing the lease of `hostname`, the heartbeat ends with
+        the last lease held
+        """
+        with self._mutex:
+            self._held.pop(hostname, None)
+            if not self._held:
+                self._stop_heartbeat()
+
+    def _stop_heartbeat(self):
+        self._stop.set()
+        self._heartbeat = None
+
+    def _beat(self, stop):
+        while not stop.wait(max(self.lease / 3, 1)):
+            with self._mutex:
+                held = dict(self._held)
+            owners = {}
+            for hostname, lock in held.items():
+                owners.setdefault((lock.user, lock.pid), []).append(hostname)
+            for (user, pid), hostnames in owners.items():
+                try:
+                    self.renew(hostnames, user, pid)
+                except Exception as e:
+                    logger.warning("failed to renew lock leases: {!s}".format(e))
+
+    def close(self):
+        with self._mutex:
+            self._stop_heartbeat()
+
+
+class SQLiteLockRegistry(LockRegistry):
+    """
+    Keeps the leases in an SQLite database, which can be placed on a
+    path shared by all mtui users
+    """
+
+    def __init__(self, path, lease=300):
+        super().__init__(lease)
+        self.path = str(path)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS locks ("
+                "hostname TEXT PRIMARY KEY, timestamp TEXT, user TEXT,"
+                " pid INTEGER, comment TEXT, expires REAL)"
+            )
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.execute("BEGIN IMMEDIATE")
+        return _Transaction(db)
+
+    @staticmethod
+    def _row_to_lock(row):
+        lock = RemoteLock()
+        lock.timestamp, lock.user, lock.pid, lock.comment = row
+        return lock
+
+    def acquire(self, hostname, lock):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT timestamp, user, pid, comment, expires FROM locks"
+                " WHERE hostname = ?",
+                (hostname,),
+            ).fetchone()
+            previous = self._row_to_lock(row[:4]) if row else None
+
+            if row and row[4] > time() and (row[1], row[2]) != (lock.user, lock.pid):
+                return False, previous
+
+            db.execute(
+                "INSERT OR REPLACE INTO locks VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    hostname,
+                    lock.timestamp,
+                    lock.user,
+                    lock.pid,
+                    lock.comment,
+                    time() + self.lease,
+                ),
+            )
+
+        self.hold(hostname, lock)
+        return True, previous
+
+    def release(self, hostname, lock=None):
+        self.drop(hostname)
+        with self._connect() as db:
+            if lock:
+                db.execute(
+                    "DELETE FROM locks WHERE hostname = ? AND user = ? AND pid = ?",
+                    (hostname, lock.user, lock.pid),
+                )
+            else:
+                db.execute("DELETE FROM locks WHERE hostname = ?", (hostname,))
+
+    def renew(self, hostnames, user, pid):
+        with self._connect() as db:
+            db.executemany(
+                "UPDATE locks SET expires = ? WHERE hostname = ? AND user = ?"
+                " AND pid = ?",
+                [(time() + self.lease, hn, user, pid) for hn in hostnames],
+            )
+
+    def query(self, hostnames):
+        hostnames = list(hostnames)
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT hostname, timestamp, user, pid, comment FROM locks"
+                " WHERE expires > ? AND hostname IN ({})".format(
+                    ", ".join("?" * len(hostnames))
+                ),
+                [time()] + hostnames,
+            ).fetchall()
+
+        return {row[0]: self._row_to_lock(row[1:]) for row in rows}
+
+
+class _Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, type_, value, tb):
+        try:
+            self.db.execute("ROLLBACK" if type_ else "COMMIT")
+        finally:
+            self.db.close()
+
+
+_registries = {}
+_registries_mutex = Lock()
+
+
+def get_registry(config):
+    """
+    :returns: L{LockRegistry} configured by `mtui.lock_registry` shared
+        by all targets, or None if no registry is configured
+    """
+    path = config.lock_registry
+    if not path:
+        return None
+
+    with _registries_mutex:
+        if path not in _registries:
+            try:
+                _registries[path] = SQLiteLockRegistry(path, config.lock_lease)
+            except sqlite3.Error as e:
+                logger.error("failed to open lock registry {!s}: {!s}".format(path, e))
+                _registries[path] = None
+        return _registries[path]
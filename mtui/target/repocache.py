@@ -0,0 +1,187 @@
+#
+# caching HTTP proxy for the update repositories
+#
+# The proxy listens on localhost of the mtui host and is forwarded to the
+# targets through a reverse tunnel of their SSH connection. Packages and
+# checksum-named repository metadata never change, so each of them is
+# downloaded once and served to all targets from the local cache.
+# repomd.xml and everything else is always passed through.
+#
+
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+import os
+from pathlib import Path
+import shutil
+from threading import Lock, Thread
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+
+from ..xdg import save_cache_path
+
+logger = getLogger("mtui.target.repocache")
+
+DOWNLOAD_URL = "http://download.suse.de/ibs/"
+
+RepoCacheStats = namedtuple("RepoCacheStats", ["hits", "misses", "saved"])
+
+
+def cacheable(path):
+    """
+    :param path: path of the requested object
+
+    :returns: True if the object never changes once published
+    """
+    name = path.rsplit("/", 1)[-1]
+    if name.endswith(".rpm"):
+        return True
+    return "/repodata/" in path and not name.startswith("repomd.xml")
+
+
+class RepoCache:
+    """
+    Caching proxy of the repositories below `upstream`
+    """
+
+    def __init__(self, upstream=DOWNLOAD_URL, path=None, timeout=60):
+        """
+        :param path: cache directory, `$XDG_CACHE_HOME/mtui/repos` if None
+        :param timeout: seconds to wait for the upstream server
+        """
+        self.upstream = upstream.rstrip("/") + "/"
+        self.path = Path(path or save_cache_path("repos"))
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0
+        self._mutex = Lock()
+        self._fetching = {}
+        """
+        :type _fetching: dict(path = [Lock, int])
+        :param _fetching: lock of the objects being fetched and the number
+            of requests using it
+        """
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.cache = self
+        self.port = self.server.server_address[1]
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stats(self):
+        """
+        :returns: L{RepoCacheStats} where saved is the number of bytes
+            served from the cache
+        """
+        with self._mutex:
+            return RepoCacheStats(self.hits, self.misses, self.saved)
+
+    def summary(self):
+        hits, misses, saved = self.stats()
+        ratio = 100.0 * hits / (hits + misses) if hits + misses else 0.0
+        return "repo cache: {} hits, {} misses ({:.0f}% hit ratio), {:.1f} MiB saved".format(
+            hits, misses, ratio, saved / 2**20
+        )
+
+    def local(self, path):
+        """
+        :returns: L{Path} of `path` in the cache
+        :raises ValueError: if `path` points outside of the cache
+        """
+        parts = [x for x in path.split("/") if x]
+        if any(x in (".", "..") for x in parts):
+            raise ValueError(path)
+        return self.path.joinpath(*parts)
+
+    def fetch(self, path):
+        """
+        Downloads `path` into the cache unless it's there already. The
+        same object is downloaded only once at a time.
+
+        :returns: L{Path} of the cached object
+        """
+        local = self.local(path)
+        with self._mutex:
+            entry = self._fetching.setdefault(path, [Lock(), 0])
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                if local.exists():
+                    with self._mutex:
+                        self.hits += 1
+                        self.saved += local.stat().st_size
+                    return local
+
+                local.parent.mkdir(parents=True, exist_ok=True)
+                tmp = local.with_name(local.name + ".part")
+                url = self.upstream + path.lstrip("/")
+                with urlopen(url, timeout=self.timeout) as r, tmp.open("wb") as f:
+                    shutil.copyfileobj(r, f)
+                os.replace(tmp, local)
+                with self._mutex:
+                    self.misses += 1
+                return local
+        finally:
+            # the lock is dropped once no request waits for it anymore
+            with self._mutex:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._fetching[path]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug("{}: {}".format(self.address_string(), format % args))
+
+    def do_GET(self):
+        cache = self.server.cache
+        path = self.path.split("?", 1)[0]
+
+        try:
+            if cacheable(path):
+                local = cache.fetch(path)
+                self.send_response(200)
+                self.send_header("Content-Length", str(local.stat().st_size))
+                self.end_headers()
+                with local.open("rb") as f:
+                    shutil.copyfileobj(f, self.wfile)
+            else:
+                url = cache.upstream + path.lstrip("/")
+                with urlopen(url, timeout=cache.timeout) as r:
+                    self.send_response(200)
+                    length = r.headers.get("Content-Length")
+                    if length:
+                        self.send_header("Content-Length", length)
+                    self.end_headers()
+                    shutil.copyfileobj(r, self.wfile)
+        except ValueError:
+            self.send_error(400)
+        except HTTPError as e:
+            self.send_error(e.code)
+        except (URLError, OSError) as e:
+            logger.warning("failed to fetch {}: {}".format(path, e))
+            self.send_error(502)
+
+
+_caches = {}
+_caches_mutex = Lock()
+
+
+def get_repo_cache(config):
+    """
+    :returns: L{RepoCache} shared by all targets, or None if
+        `mtui.repo_cache` is disabled
+    """
+    if not config.repo_cache:
+        return None
+
+    with _caches_mutex:
+        if DOWNLOAD_URL not in _caches:
+            try:
+                _caches[DOWNLOAD_URL] = RepoCache(DOWNLOAD_URL)
+            except OSError as e:
+                logger.error("failed to start repo cache: {!s}".format(e))
+                _caches[DOWNLOAD_URL] = None
+        return _caches[DOWNLOAD_URL]
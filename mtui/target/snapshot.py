@@ -0,0 +1,119 @@
+#
+# snapper snapshots of refhosts with btrfs root filesystem
+#
+# A snapshot is taken before every update. Rolling back to it replaces
+# the whole root filesystem at once and needs a reboot, which is much
+# faster than downgrading the packages one by one and also undoes
+# changes a downgrade can't revert.
+#
+
+from logging import getLogger
+from shlex import quote
+
+from .locks import LockedTargets
+from .reboot import Reboot
+
+logger = getLogger("mtui.target.snapshot")
+
+# prints the number of the new snapshot, fails if the root filesystem
+# isn't btrfs or isn't managed by snapper
+CREATE_COMMAND = (
+    '[ "$(stat -f -c %T /)" = btrfs ]'
+    " && snapper --no-dbus list >/dev/null 2>&1"
+    " && snapper --no-dbus create --print-number --cleanup-algorithm number"
+    " --description {description}"
+)
+
+ROLLBACK_COMMAND = "snapper --no-dbus rollback --description {description} {number}"
+
+
+def parse_snapshot(stdout):
+    """
+    :param stdout: output of L{CREATE_COMMAND}
+
+    :returns: int number of the snapshot or None
+    """
+    words = stdout.split()
+    if words and words[-1].isdigit():
+        return int(words[-1])
+    return None
+
+
+def create_snapshots(targets, description):
+    """
+    Takes a snapshot on all `targets` supporting it. Its number is kept
+    in L{Target.snapshot}, which is None on the other hosts.
+
+    :type targets: L{HostsGroup}
+
+    :returns: {hostname: int} numbers of the snapshots taken
+    """
+    targets.run(CREATE_COMMAND.format(description=quote(description)))
+
+    snapshots = {}
+    for hn, t in targets.items():
+        t.snapshot = parse_snapshot(t.lastout()) if t.lastexit() == 0 else None
+        if t.snapshot is None:
+            logger.debug("{!s}: snapshots are not available".format(hn))
+        else:
+            logger.info("{!s}: created snapshot {!s}".format(hn, t.snapshot))
+            snapshots[hn] = t.snapshot
+    return snapshots
+
+
+class Rollback:
+    """
+    Rolls targets with a snapshot back to it in parallel, reboots them
+    and waits for them to come back.
+    """
+
+    def __init__(self, targets, description, timeout=600):
+        """
+        :type targets: L{HostsGroup}
+        :param timeout: seconds to wait for each host to come back
+        """
+        self.targets = targets
+        self.description = description
+        self.timeout = timeout
+
+    def run(self):
+        """
+        :returns: [str] hostnames rolled back to their snapshot
+        """
+        commands = {
+            hn: ROLLBACK_COMMAND.format(
+                description=quote(self.description), number=t.snapshot
+            )
+            for hn, t in self.targets.items()
+            if t.snapshot is not None
+        }
+        if not commands:
+            return []
+
+        targets = self.targets.select(list(commands))
+        with LockedTargets(targets.values()):
+            targets.run(commands)
+
+        rolled = []
+        for hn, t in targets.items():
+            if t.lastexit() == 0:
+                logger.info("{!s}: rolled back to snapshot {!s}".format(hn, t.snapshot))
+                t.snapshot = None
+                t.invalidate_versions()
+                rolled.append(hn)
+            else:
+                logger.error(
+                    "{!s}: rollback to snapshot {!s} failed:\n{!s}".format(
+                        hn, t.snapshot, t.lasterr()
+                    )
+                )
+
+        if rolled:
+            results = Reboot(self.targets.select(rolled), self.timeout).run()
+            for hn, r in results.items():
+                if r.error:
+                    logger.error(
+                        "{!s}: not back after rollback: {!s}".format(hn, r.error)
+                    )
+
+        return rolled
@@ -0,0 +1,221 @@
+#
+# timing of update, prepare and downgrade phases
+#
+# Every phase of an action is measured per host and kept in a local
+# SQLite database, so the expected duration of the next run can be
+# estimated from the previous ones.
+#
+
+from contextlib import contextmanager
+from logging import getLogger
+import os
+import sqlite3
+from statistics import median
+from threading import Lock
+from time import monotonic, time
+from uuid import uuid4
+
+from ..utils import yellow
+from ..xdg import save_cache_path
+
+logger = getLogger("mtui.target.timing")
+
+# spans kept in the database
+KEEP = 20000
+
+
+class Timings:
+    """
+    Durations of action phases per host
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._mutex = Lock()
+        self._db = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        with self._mutex:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS spans ("
+                "id INTEGER PRIMARY KEY, ts REAL, hostname TEXT, action TEXT,"
+                " phase TEXT, duration REAL, run TEXT)"
+            )
+            columns = [x[1] for x in self._db.execute("PRAGMA table_info(spans)")]
+            if "run" not in columns:
+                self._db.execute("ALTER TABLE spans ADD COLUMN run TEXT")
+            self._db.execute(
+                "DELETE FROM spans WHERE id <= (SELECT max(id) FROM spans) - ?",
+                (KEEP,),
+            )
+
+    def record(self, hostname, action, phase, duration, run=None):
+        """
+        :type run: str or None
+        :param run: id of the run the span belongs to, spans of a phase
+            repeated in one run are added up
+        """
+        try:
+            with self._mutex:
+                self._db.execute(
+                    "INSERT INTO spans (ts, hostname, action, phase, duration, run)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (time(), hostname, action, phase, duration, run),
+                )
+        except sqlite3.Error as e:
+            logger.warning("failed to record timing: {!s}".format(e))
+
+    def expected(self, hostnames, action, runs=10):
+        """
+        :param runs: number of past runs the estimate is based on
+
+        :returns: ([phase], {hostname: {phase: seconds}}) median
+            durations of the last `runs` runs, phases in the order they
+            run
+        """
+        hostnames = list(hostnames)
+        # spans recorded without a run id count as a run of their own
+        with self._mutex:
+            rows = self._db.execute(
+                "SELECT hostname, phase, sum(duration) FROM spans WHERE action = ?"
+                " AND hostname IN ({}) GROUP BY hostname, phase,"
+                " coalesce(run, 'span:' || id) ORDER BY min(id)".format(
+                    ", ".join("?" * len(hostnames))
+                ),
+                [action] + hostnames,
+            ).fetchall()
+
+        durations = {}
+        phases = []
+        for hostname, phase, duration in rows:
+            durations.setdefault(hostname, {}).setdefault(phase, []).append(duration)
+            if phase not in phases:
+                phases.append(phase)
+
+        return phases, {
+            hn: {phase: median(x[-runs:]) for phase, x in p.items()}
+            for hn, p in durations.items()
+        }
+
+
+class PhaseTimer:
+    """
+    Measures named phases of `action` on `targets`
+
+    The duration of a phase on a host is the runtime of the commands
+    it ran on the host, or the duration of the whole phase if it ran
+    none or runs locally.
+    """
+
+    def __init__(self, targets, action, timings=None):
+        """
+        :type timings: L{Timings} or None
+        :param timings: store of the measured spans, not stored if None
+        """
+        self.targets = targets
+        self.action = action
+        self.timings = timings
+        self.run = uuid4().hex
+        self.spans = []
+        """
+        :type spans: [(hostname, phase, seconds)]
+        """
+
+    @contextmanager
+    def __call__(self, phase, targets=None, local=False):
+        """
+        :param targets: hosts the phase runs on, all `targets` if None
+        :param local: the phase runs its commands on this machine, like
+            the compare scripts, so their runtime isn't known
+        """
+        targets = self.targets if targets is None else targets
+        start = monotonic()
+        counts = {hn: t.out.appended for hn, t in targets.items()}
+        try:
+            yield
+        finally:
+            wall = monotonic() - start
+            for hn, t in targets.items():
+                new = min(t.out.appended - counts[hn], len(t.out))
+                if new and not local:
+                    duration = sum(x.runtime for x in t.out[-new:])
+                else:
+                    duration = wall
+                self.spans.append((hn, phase, duration))
+                if self.timings:
+                    self.timings.record(hn, self.action, phase, duration, self.run)
+            logger.debug("{} {}: {:.1f}s".format(self.action, phase, wall))
+
+
+_timings = {}
+_timings_mutex = Lock()
+
+
+def get_timings():
+    """
+    :returns: L{Timings} kept in `$XDG_CACHE_HOME/mtui/timings.db`, or
+        None if it can't be opened
+    """
+    path = save_cache_path("timings.db")
+    with _timings_mutex:
+        if path not in _timings:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                _timings[path] = Timings(path)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("failed to open timings: {!s}".format(e))
+                _timings[path] = None
+        return _timings[path]
+
+
+def format_duration(seconds):
+    seconds = round(seconds)
+    if seconds < 60:
+        return "{}s".format(seconds)
+    return "{}m{:02}s".format(*divmod(seconds, 60))
+
+
+def expected_table(timings, hostnames, action):
+    """
+    Table of the expected duration of each phase of `action` on the
+    hosts, slowest host first. Durations more than twice the median of
+    their phase are highlighted.
+
+    :type timings: L{Timings}
+
+    :returns: [str] lines of the table, empty if there are no past runs
+    """
+    phases, expected = timings.expected(hostnames, action)
+    if not expected:
+        return []
+
+    totals = {hn: sum(p.values()) for hn, p in expected.items()}
+    columns = phases + ["total"]
+    rows = {hn: dict(p, total=totals[hn]) for hn, p in expected.items()}
+    medians = {
+        c: median(r[c] for r in rows.values() if c in r)
+        for c in columns
+        if any(c in r for r in rows.values())
+    }
+
+    width = max(len(x) for x in list(rows) + ["host"])
+    widths = [max(len(c), 6) for c in columns]
+    lines = [
+        "  ".join(["host".ljust(width)] + [c.rjust(w) for c, w in zip(columns, widths)])
+    ]
+    for hn in sorted(rows, key=lambda x: totals[x], reverse=True):
+        cells = [hn.ljust(width)]
+        for c, w in zip(columns, widths):
+            if c not in rows[hn]:
+                cells.append("-".rjust(w))
+                continue
+            cell = format_duration(rows[hn][c]).rjust(w)
+            if rows[hn][c] >= 1 and rows[hn][c] > 2 * medians[c]:
+                cell = yellow(cell)
+            cells.append(cell)
+        lines.append("  ".join(cells))
+
+    missing = sorted(set(hostnames) - set(rows))
+    if missing:
+        lines.append("no past runs on {}".format(", ".join(missing)))
+    return lines
@@ -2,10 +2,12 @@ from abc import ABCMeta, abstractmethod
 from logging import getLogger
 
 from ..hooks import CompareScript, PostScript, PreScript
-from ..types.rpmver import RPMVersion
+from ..types.versionmatrix import NEEDS_UPDATE, NOT_INSTALLED, UPDATED, compare
 from ..utils import yellow
-from .actions import ThreadedMethod, UpdateError, queue, spinner
+from .actions import ThreadedMethod, UpdateError, queue, spinner, wait_for_prefetch
 from .locks import LockedTargets
+from .snapshot import create_snapshots
+from .timing import PhaseTimer, get_timings
 
 logger = getLogger("mtui.target.update")
 
@@ -15,12 +17,27 @@ class Update(metaclass=ABCMeta):
         self.targets = targets
         self.testreport = testreport
         self.commands = []
+        self.timer = PhaseTimer(targets, "update")
+
+    def prefetch(self):
+        """
+        Downloads the packages of the update in background, so `run`
+        doesn't wait for downloads while the hosts are locked
+        """
 
     def run(self, params):
+        self.timer = PhaseTimer(self.targets, "update", get_timings())
+        wait_for_prefetch(self.targets)
         with LockedTargets(self.targets.values()):
             if hasattr(self, "type") and self.type == "transactional":
                 self._run_transactional(params)
             else:
+                if self.testreport.config.snapshot_rollback:
+                    with self.timer("snapshot"):
+                        create_snapshots(
+                            self.targets,
+                            "mtui: before update {!s}".format(self.testreport.id),
+                        )
                 self._run(params)
 
     def _run_transactional(self, params):
@@ -31,33 +48,34 @@ class Update(metaclass=ABCMeta):
 
         self.lock_and_run()
         logger.warning(
-            "Please reboot the host to activate the changes and avoid data loss"
+            "Please reboot the host to activate the changes and avoid data loss, "
+            "the 'reboot' command waits for the hosts to come back"
         )
 
     def _run(self, params):
         if "noprepare" not in params:
-            self.testreport.perform_prepare(self.targets)
-
-        for hn, t in self.targets.items():
-            not_installed = []
-
-            t.query_versions()
+            with self.timer("prepare"):
+                self.testreport.perform_prepare(self.targets)
 
-            for pkg in t.packages.keys():
-                required = t.packages[pkg].required
-                before = t.packages[pkg].current
+        with self.timer("query"):
+            for t in self.targets.values():
+                t.query_versions()
+                for package in t.packages.values():
+                    package.before = package.current
 
-                t.packages[pkg].before = before
+        for hn, states in compare(self.targets, "before", "required").items():
+            packages = self.targets[hn].packages
+            not_installed = []
 
-                if not before:
+            for pkg, state in states.items():
+                if state is NOT_INSTALLED:
                     not_installed.append(pkg)
-                else:
-                    if RPMVersion(before) >= RPMVersion(required):
-                        logger.warning(
-                            "{!s}: package is too recent: {!s} ({!s}, target version is {!s})".format(
-                                hn, pkg, before, required
-                            )
+                elif state != NEEDS_UPDATE:
+                    logger.warning(
+                        "{!s}: package is too recent: {!s} ({!s}, target version is {!s})".format(
+                            hn, pkg, packages[pkg].before, packages[pkg].required
                         )
+                    )
 
             if not_installed:
                 logger.warning(
@@ -65,41 +83,46 @@ class Update(metaclass=ABCMeta):
                 )
 
         if "noscript" not in params and not self.testreport.config.auto:
-            self.testreport.run_scripts(PreScript, self.targets)
+            with self.timer("pre scripts"):
+                self.testreport.run_scripts(PreScript, self.targets)
 
         self.lock_and_run()
         if "newpackage" in params:
             # TODO: testing=True for newpackage ? oh
-            self.testreport.perform_prepare(self.targets, testing=True)
-
-        for hn, t in list(self.targets.items()):
-            t.query_versions()
+            with self.timer("newpackage"):
+                self.testreport.perform_prepare(self.targets, testing=True)
 
-            for pkg in t.packages.keys():
-                before = t.packages[pkg].before
-                required = t.packages[pkg].required
-                after = t.packages[pkg].current
-
-                t.packages[pkg].after = after
+        with self.timer("query"):
+            for t in self.targets.values():
+                t.query_versions()
+                for package in t.packages.values():
+                    package.after = package.current
 
-                if after and before:
-                    if RPMVersion(before) == RPMVersion(after):
-                        logger.warning(
-                            "{!s}: package was not updated: {!s} ({!s})".format(
-                                hn, pkg, after
-                            )
+        updated = compare(self.targets, "after", "before")
+        matching = compare(self.targets, "after", "required")
+        for hn, t in list(self.targets.items()):
+            for pkg, state in updated.get(hn, {}).items():
+                if state == UPDATED:
+                    logger.warning(
+                        "{!s}: package was not updated: {!s} ({!s})".format(
+                            hn, pkg, t.packages[pkg].after
                         )
-                if after:
-                    if RPMVersion(after) < RPMVersion(required):
-                        logger.warning(
-                            "{!s}: package does not match required version: {!s} ({!s}, required {!s})".format(
-                                hn, pkg, after, required
-                            )
+                    )
+            for pkg, state in matching.get(hn, {}).items():
+                if state == NEEDS_UPDATE:
+                    logger.warning(
+                        "{!s}: package does not match required version: {!s} ({!s}, required {!s})".format(
+                            hn, pkg, t.packages[pkg].after, t.packages[pkg].required
                         )
+                    )
+
+            t.journal_packages()
 
         if "noscript" not in params and not self.testreport.config.auto:
-            self.testreport.run_scripts(PostScript, self.targets)
-            self.testreport.run_scripts(CompareScript, self.targets)
+            with self.timer("post scripts"):
+                self.testreport.run_scripts(PostScript, self.targets)
+            with self.timer("compare scripts", local=True):
+                self.testreport.run_scripts(CompareScript, self.targets)
 
     def _check(self, target, stdin, stdout, stderr, exitcode):
         if "zypper" in stdin and exitcode == 104:
@@ -152,6 +175,14 @@ class Update(metaclass=ABCMeta):
         """stub. needs to be overwritten by inherited classes"""
         pass
 
+    def _run_commands(self):
+        with self.timer("install"):
+            for command in self.commands:
+                self.targets.run(command)
+
+                for t in self.targets.values():
+                    self._check(t, t.lastin(), t.lastout(), t.lasterr(), t.lastexit())
+
     def lock_and_run(self):
         """
         Locks the targets and run the commands
@@ -159,6 +190,7 @@ class Update(metaclass=ABCMeta):
         skipped = False
 
         try:
+            self.targets.refresh_locks()
             for t in self.targets.values():
                 if t.is_locked() and not t._lock.is_mine():
                     skipped = True
@@ -186,26 +218,24 @@ class Update(metaclass=ABCMeta):
                         pass
                 raise UpdateError("Hosts locked")
 
-            for t in self.targets.values():
-                if (
-                    hasattr(self, "type") and self.type != "transactional"
-                ) or not hasattr(self, "type"):
-                    queue.put([t.set_repo, ["add", self.testreport]])
+            with self.timer("repos"):
+                for t in self.targets.values():
+                    if (
+                        hasattr(self, "type") and self.type != "transactional"
+                    ) or not hasattr(self, "type"):
+                        queue.put([t.set_repo, ["add", self.testreport]])
 
-            while queue.unfinished_tasks:
-                spinner()
+                while queue.unfinished_tasks:
+                    spinner()
 
-            queue.join()
+                queue.join()
 
-            for command in self.commands:
-                self.targets.run(command)
-
-                for t in self.targets.values():
-                    self._check(t, t.lastin(), t.lastout(), t.lasterr(), t.lastexit())
+            self._run_commands()
         except BaseException:
             raise
         finally:
             for t in self.targets.values():
+                t.invalidate_versions()
                 if t.is_locked():
                     try:
                         t.unlock()
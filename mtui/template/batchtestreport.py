@@ -0,0 +1,153 @@
+#
+# several updates of the same product tested together
+#
+# The incident repositories of all updates are added at once and the
+# packages of all of them are prepared and updated in one transaction per
+# host. Versions and script results stay with each testreport, so every
+# one of them is exported on its own.
+#
+
+from logging import getLogger
+
+from ..messages import BatchProductMismatchError
+from ..target.actions import UpdateError
+from ..target.repocache import get_repo_cache
+from ..target.snapshot import Rollback
+from ..types.package import Package
+from ..types.versionmatrix import FIELDS
+
+logger = getLogger("mtui.template.batchtestreport")
+
+
+class BatchTestReport:
+    """
+    Updates L{OBSTestReport}s sharing refhosts together
+
+    Stands in for a single testreport where L{Update}, L{Prepare} and
+    L{Downgrade} expect one.
+    """
+
+    def __init__(self, reports):
+        """
+        :type reports: [L{OBSTestReport}]
+        :param reports: the loaded testreport first
+
+        :raises BatchProductMismatchError: if one of the updates shares no
+            product with the loaded one
+        """
+        products = set(reports[0].update_repos)
+        for x in reports[1:]:
+            if not products & set(x.update_repos):
+                raise BatchProductMismatchError(x.id, reports[0].id)
+
+        self.reports = reports
+        self.config = reports[0].config
+
+    @property
+    def id(self):
+        return ",".join(str(x.id) for x in self.reports)
+
+    @property
+    def rrids(self):
+        return [x.rrid for x in self.reports]
+
+    def __repr__(self):
+        return "<{0}.{1} {2}>".format(self.__module__, self.__class__.__name__, self.id)
+
+    def get_package_list(self):
+        return sorted({p for x in self.reports for p in x.get_package_list()})
+
+    def _get_doer(self, getter):
+        return getattr(self.reports[0], getter)()
+
+    def set_repo(self, target, operation):
+        repos = [
+            repo
+            for x in self.reports
+            for repo in target.issue_repos(x.update_repos, x.rrid)
+        ]
+        if operation == "add":
+            target.run_zypper_repos("-n ar -ckn", repos)
+        elif operation == "remove":
+            target.run_zypper_repos("-n rr", repos)
+        else:
+            raise ValueError("Not supported repose operation {}".format(operation))
+
+    def run_scripts(self, s, targets):
+        """
+        Runs the scripts of every testreport, their results are kept
+        with the testreport
+        """
+        for x in self.reports:
+            x.run_scripts(s, targets)
+
+    def perform_prepare(self, targets, **kw):
+        preparer = self._get_doer("get_preparer")
+        preparer(targets, self.get_package_list(), self, **kw).run()
+
+    def perform_update(self, targets, params):
+        """
+        :type  targets: dict(hostname = L{Target})
+            where hostname = str
+
+        The packages of the other updates are added to the targets for
+        the update only. Afterwards their versions are moved from the
+        version matrix of the session to the C{batch_versions} of each
+        testreport, where L{TestReport.report_results} finds them.
+        """
+        saved = {
+            hn: (dict(t.packages), {k: v.required for k, v in t.packages.items()})
+            for hn, t in targets.items()
+        }
+        try:
+            for x in self.reports[1:]:
+                for t in targets.values():
+                    t.add_packages(x.packages)
+
+            targets.add_history(["update", self.id, " ".join(self.get_package_list())])
+
+            updater = self._get_doer("get_updater")
+            logger.debug("chosen updater: {!r}".format(updater))
+            try:
+                updater(targets, self).run(params)
+            except UpdateError as e:
+                logger.error("Update failed: %s" % e)
+                logger.warning("Error while updating. Rolling back changes")
+                self.perform_downgrade(targets)
+        finally:
+            for hn, t in targets.items():
+                packages, required = saved[hn]
+                self._keep_batch_versions(t, set(t.packages) - set(packages))
+                for name, package in packages.items():
+                    package.required = required[name]
+                t.packages = packages
+
+        cache = get_repo_cache(self.config)
+        if cache:
+            logger.info(cache.summary())
+
+    def _keep_batch_versions(self, target, names):
+        """
+        Moves the versions of the packages `names` added to `target` for
+        the batch to the testreports they belong to
+        """
+        for x in self.reports[1:]:
+            for name in names.intersection(x.get_package_list()):
+                package = Package(name, x.batch_versions, target.hostname)
+                for f in FIELDS:
+                    setattr(package, f, getattr(target.packages[name], f))
+        for name in names:
+            target.versions.clear(target.hostname, name)
+
+    def perform_downgrade(self, targets):
+        targets.add_history(["downgrade", self.id, " ".join(self.get_package_list())])
+
+        if self.config.snapshot_rollback:
+            rolled = Rollback(targets, "mtui: rollback of {!s}".format(self.id)).run()
+            remaining = [hn for hn in targets if hn not in rolled]
+            if not remaining:
+                return
+            targets = targets.select(remaining)
+
+        downgrader = self._get_doer("get_downgrader")
+        downgrader(targets, self.get_package_list(), self).run()
@@ -24,6 +24,13 @@ class OBSTestReport(TestReport):
     def id(self):
         return self.rrid
 
+    @property
+    def rrids(self):
+        """
+        :returns: [L{RequestReviewID}] updates applied together
+        """
+        return [self.rrid]
+
     def _get_updater_id(self):
         return self.get_release()
 
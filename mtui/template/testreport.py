@@ -2,29 +2,62 @@ from abc import ABCMeta, abstractmethod
 from collections import namedtuple
 import concurrent.futures
 from errno import EEXIST, ENOENT
+from functools import partial
 import glob
 from json import loads
 from json.decoder import JSONDecodeError
 from logging import getLogger
 import os
-import re
 import shutil
 import stat
+from subprocess import CalledProcessError
 from traceback import format_exc
 from typing import Any, Dict, List
 from urllib.request import urlopen
+from xml.etree.ElementTree import ParseError
 
 from .. import updater
+from ..journal import SessionJournal
+from ..messages import MissingUpdaterError
 from ..refhost import Attributes, RefhostsFactory, RefhostsResolveFailed
 from ..target import Target
 from ..target.actions import UpdateError
 from ..target.hostgroup import HostsGroup
+from ..target.parsers.zypper import Solvable, ZypperXMLParser, installed_versions
+from ..target.repocache import get_repo_cache
+from ..target.snapshot import Rollback
+from ..target.timing import expected_table, get_timings
 from ..template import TestReportAlreadyLoaded, _TemplateIOError
+from ..types.package import Package
+from ..types.versionmatrix import VersionMatrix
 from ..utils import ensure_dir_exists
 
 logger = getLogger("mtui.template.testreport")
 TargetMeta = namedtuple("TargetMeta", ["hostname", "system", "packages", "hostlog"])
 
+# lowers the CPU and I/O priority of the shell running the commands
+LOW_PRIORITY = "renice -n 19 -p $$ >/dev/null 2>&1; ionice -c 3 -p $$ >/dev/null 2>&1; "
+
+
+def group_versions(by_host_pkg):
+    """
+    Groups hosts with the same versions of a package
+
+    :type by_host_pkg: {hostname: {package: (version, ...)}}
+
+    :returns: {(hostname, ...): [(package, (version, ...))]} packages
+        with identical versions on the same hosts
+    """
+    hosts = {}
+    for hn, pvs in by_host_pkg.items():
+        for pv in pvs.items():
+            hosts.setdefault(pv, []).append(hn)
+
+    by_hosts_pkg = {}
+    for pv, hs in hosts.items():
+        by_hosts_pkg.setdefault(tuple(hs), []).append(pv)
+    return by_hosts_pkg
+
 
 class TestReport(metaclass=ABCMeta):
     # FIXME: the code around read() (_open_and_parse, _parse and factory
@@ -86,6 +119,12 @@ class TestReport(metaclass=ABCMeta):
         self.reviewer = ""
         self.repository = None
         self.packages = {}
+        self.batch_versions = VersionMatrix()
+        """
+        :type batch_versions: L{VersionMatrix}
+        :param batch_versions: versions of the packages of this update
+            on the hosts of a batch update along with another testreport
+        """
 
         self._attrs = [
             "products",
@@ -104,6 +143,17 @@ class TestReport(metaclass=ABCMeta):
 
         self.openqa = {"auto": None, "kernel": []}
 
+        self.journal = None
+        """
+        :type journal: L{SessionJournal} or None
+        """
+
+        self.versions = VersionMatrix()
+        """
+        :type versions: L{VersionMatrix}
+        :param versions: package versions of all connected hosts
+        """
+
     def _open_and_parse(self, path):
         metadata = path.parent / "metadata.json"
         try:
@@ -130,6 +180,9 @@ class TestReport(metaclass=ABCMeta):
     def read(self, path):
         self._open_and_parse(path)
         self.path = path.resolve()
+        self.journal = SessionJournal.open(
+            self.config, self.id, getattr(self.config, "resume", False)
+        )
         self._update_repos_parse()
         if self.config.chdir_to_template_dir:
             os.chdir(path.parent)
@@ -235,6 +288,60 @@ class TestReport(metaclass=ABCMeta):
             display("\n".join(updater(targets, self).commands))
             del updater
 
+        timings = get_timings()
+        if timings:
+            table = expected_table(timings, targets.keys(), "update")
+            if table:
+                display("\nexpected duration based on past runs:")
+                display("\n".join(table))
+
+    def perform_warm_up(self, targets):
+        """
+        Refreshes the repository metadata on `targets` in background, so
+        the update doesn't wait for it while the hosts are locked
+        """
+        targets.refresh_locks()
+        for t in targets.values():
+            if t.is_locked() and not t._lock.is_mine():
+                logger.info("{!s}: host is locked, not warming up".format(t.hostname))
+                continue
+            t.prefetch(partial(self.warm_up, t), "warm-up")
+
+    def _warm_up_commands(self, target):
+        """
+        :returns: [str] commands refreshing the repositories of `target`
+        """
+        if target.system.get_release() == "YUM":
+            return ["yum -q makecache"]
+        return ["zypper -n ref"]
+
+    def warm_up(self, target):
+        """
+        Runs L{_warm_up_commands} with low CPU and I/O priority, outside
+        of the host log
+
+        :raises CalledProcessError: if refreshing failed
+        """
+        command = "; ".join(self._warm_up_commands(target))
+        exitcode, _, stderr = target.connection.execute(
+            LOW_PRIORITY + command, interactive=False
+        )
+        if exitcode:
+            raise CalledProcessError(exitcode, command, stderr=stderr)
+        logger.debug("{!s}: repositories refreshed".format(target.hostname))
+
+    def perform_prefetch(self, targets):
+        """
+        Downloads the packages of the update on `targets` in background
+        """
+        try:
+            updater = self.get_updater()
+        except (IndexError, MissingUpdaterError) as e:
+            logger.debug("not prefetching packages: {!s}".format(e))
+            return
+
+        updater(targets, self).prefetch()
+
     def perform_get(self, targets, remote):
         local = self.report_wd("downloads", os.path.basename(remote), filepath=True)
 
@@ -260,11 +367,22 @@ class TestReport(metaclass=ABCMeta):
             logger.warning("Error while updating. Rolling back changes")
             self.perform_downgrade(targets)
 
+        cache = get_repo_cache(self.config)
+        if cache:
+            logger.info(cache.summary())
+
     def perform_downgrade(self, targets):
         targets.add_history(
             ["downgrade", str(self.id), " ".join(self.get_package_list())]
         )
 
+        if self.config.snapshot_rollback:
+            rolled = Rollback(targets, "mtui: rollback of {!s}".format(self.id)).run()
+            remaining = [hn for hn in targets if hn not in rolled]
+            if not remaining:
+                return
+            targets = targets.select(remaining)
+
         downgrader = self.get_downgrader()
         downgrader(targets, self.get_package_list(), self).run()
 
@@ -328,9 +446,10 @@ class TestReport(metaclass=ABCMeta):
                 host,
                 self.packages,
                 timeout=self.config.connection_timeout,
+                journal=self.journal,
+                versions=self.versions,
             )
-            target.connect()
-            target.add_history(["connect"])
+            target.connect(history=["connect"])
             new_system = target.get_system()
         except KeyboardInterrupt:
             logger.warning("Connection to {} canceled by user".format(host))
@@ -397,7 +516,13 @@ class TestReport(metaclass=ABCMeta):
             )
             return
         try:
-            self.targets[hostname] = Target(self.config, hostname, self.packages)
+            self.targets[hostname] = Target(
+                self.config,
+                hostname,
+                self.packages,
+                journal=self.journal,
+                versions=self.versions,
+            )
             self.targets[hostname].connect()
 
             if self:
@@ -411,6 +536,34 @@ class TestReport(metaclass=ABCMeta):
             logger.warning("failed to add host {0} to target list".format(hostname))
             logger.debug(format_exc())
 
+    def resume(self):
+        """
+        Reconnects the hosts of the journaled session and restores their
+        command logs, package versions and locks
+        """
+        if not self.journal:
+            logger.error("no session journal to resume from")
+            return
+
+        hosts = self.journal.replay()
+        if not hosts:
+            logger.warning("no hosts to resume in {}".format(self.journal.path))
+            return
+
+        logger.info("Resuming session on %s" % set(hosts))
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            connected = dict(zip(hosts, executor.map(self.connect_target, hosts)))
+
+        for hostname, (target, system) in connected.items():
+            if not target:
+                logger.warning(
+                    "{}: journaled results are not restored".format(hostname)
+                )
+                continue
+            target.restore(hosts[hostname])
+            self.targets[hostname] = target
+            self.systems[hostname] = system
+
     def refhosts_from_tp(self, testplatform):
         try:
             refhosts = self.refhostsFactory(self.config)
@@ -532,52 +685,28 @@ class TestReport(metaclass=ABCMeta):
             dst.writelines(src)
 
     def list_versions(self, sink, targets, packages):
-        query = r"""
-            for p in {!s}; do \
-                zypper -n search -s --match-exact -t package $p; \
-            done \
-            | grep -e ^[iv] \
-            | awk -F '|' '{{ print $2 $4 }}' \
-            | sort -u
-        """
+        query = "zypper -n --xmlout search -s --match-exact -t package {!s}"
 
         packages = packages or self.get_package_list()
 
-        targets.run(query.format(" ".join(packages)))
-
-        # this is a bit convoluted because the data is aggregated
-        # on display (see the example in CommandPrompt#do_list_versions)
-        # but acquired piecemeal in random order.
-        #
-        # input for a single target:
-        #
-        #   line = PKKGNAME +SP PKGVER
-        #   input = *(line EOL)
+        # all packages are searched at once, the output is parsed while
+        # it arrives
+        parsers = {hn: ZypperXMLParser() for hn in targets.keys()}
+        targets.run(
+            query.format(" ".join(sorted(packages))),
+            feed={hn: p.feed for hn, p in parsers.items()},
+        )
 
-        # by_host_pkg[hostname][package] = [version, ...]
         by_host_pkg = {}
-        for hn, t in list(targets.items()):
-            by_host_pkg[hn] = {}
-            for line in t.lastout().split("\n"):
-                match = re.search(r"(\S+)\s+(\S+)", line)
-                if not match:
-                    continue
-                pkg, ver = match.group(1), match.group(2)
-                by_host_pkg[hn].setdefault(pkg, []).append(ver)
-
-        # by_pkg_vers[package][(version, ...)] = [hostname, ...]
-        by_pkg_vers = {}
-        for hn, pvs in list(by_host_pkg.items()):
-            for pkg, vs in list(pvs.items()):
-                by_pkg_vers.setdefault(pkg, {}).setdefault(tuple(vs), []).append(hn)
-
-        # by_hosts_pkg[(hostname, ...)] = [(package, (version, ...)), ...]
-        by_hosts_pkg = {}
-        for pkg, vshs in list(by_pkg_vers.items()):
-            for vs, hs in list(vshs.items()):
-                by_hosts_pkg.setdefault(tuple(hs), []).append((pkg, vs))
-
-        return sink(targets, by_hosts_pkg)
+        for hn, parser in parsers.items():
+            try:
+                parser.close()
+            except ParseError as e:
+                logger.warning("{!s}: failed to search packages: {!s}".format(hn, e))
+                continue
+            by_host_pkg[hn] = installed_versions(parser.events(Solvable))
+
+        return sink(targets, group_versions(by_host_pkg))
 
     def report_results(self, targetHosts=None) -> List[TargetMeta]:
         results = []
@@ -587,8 +716,16 @@ class TestReport(metaclass=ABCMeta):
         else:
             targets = self.targets.values()
 
+        # versions of updates applied by a batch update along with the
+        # loaded one are kept with the testreport, not on the targets
         for t in targets:
-            results.append(TargetMeta(t.hostname, str(t.system), t.packages, t.out))
+            packages = {}
+            for k in self.get_package_list():
+                if k in t.packages:
+                    packages[k] = t.packages[k]
+                elif self.batch_versions.has(t.hostname, k):
+                    packages[k] = Package(k, self.batch_versions, t.hostname)
+            results.append(TargetMeta(t.hostname, str(t.system), packages, t.out))
 
         return results
 
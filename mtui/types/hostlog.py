@@ -1,4 +1,6 @@
 from collections import namedtuple
+from collections.abc import Sequence
+import zlib
 
 
 def to_string(item):
@@ -8,62 +10,120 @@ def to_string(item):
         return item
 
 
-class HostLog(list):
+class HostLog(Sequence):
+    """
+    Append-only log of commands run on a target
+
+    Entries are kept as compact tuples with the runtime in nanoseconds.
+    Outputs of entries older than the `hot` most recent ones are zlib
+    compressed in place and decompressed on access. If `maxlen` is set,
+    only the last `maxlen` entries are retained.
+
+    Items are L{HostLog.log} tuples with the runtime in seconds.
+    """
+
     log = namedtuple(
         "CommandLog", ["command", "stdout", "stderr", "exitcode", "runtime"]
     )
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, maxlen=None, hot=8, threshold=1024):
+        """
+        :type maxlen: int or None
+        :param maxlen: number of retained entries, unlimited if not set
+        :param hot: number of most recent entries kept uncompressed
+        :param threshold: outputs shorter than this are not compressed
+        """
+        self.maxlen = maxlen or None
+        self.hot = hot
+        self.threshold = threshold
+        # (command, exitcode, runtime_ns, payload, split)
+        #   where payload = (stdout, stderr) and split = None
+        #      or payload = compressed stdout + stderr
+        #         split = length of encoded stdout
+        self._entries = []
+        self.appended = 0
+        """
+        :type appended: int
+        :param appended: number of entries ever added, including the
+            ones trimmed or cleared since
+        """
 
-    def append(self, *args):
-        if isinstance(*args, (list, tuple, set)):
-            if len(*args) != 5:
-                raise ValueError(f"it need 5 args, got {len(*args)}")
-            items = args[0]
-            command = to_string(items[0])
-            stdout = to_string(items[1])
-            stderr = to_string(items[2])
-            exitcode = int(items[3])
-            runtime = int(items[4])
-        else:
-            command = to_string(args[0])
-            stdout = to_string(args[1])
-            stderr = to_string(args[2])
-            exitcode = int(args[3])
-            runtime = int(args[4])
-        super().append(
-            self.log(
-                to_string(command),
-                to_string(stdout),
-                to_string(stderr),
-                exitcode,
-                runtime,
-            )
+    @staticmethod
+    def _parse(args):
+        if len(args) == 1 and isinstance(args[0], (list, tuple)):
+            args = args[0]
+        if len(args) != 5:
+            raise ValueError(f"it need 5 args, got {len(args)}")
+        command, stdout, stderr, exitcode, runtime = args
+        return (
+            to_string(command),
+            int(exitcode),
+            int(round(float(runtime) * 1e9)),
+            (to_string(stdout), to_string(stderr)),
+            None,
         )
 
-    def insert(self, pos, *args):
-        if isinstance(*args, (list, tuple, set)):
-            if len(*args) != 5:
-                raise ValueError(f"it need 5 args, got {len(*args)}")
-            command = to_string(*args[0])
-            stdout = to_string(*args[1])
-            stderr = to_string(*args[2])
-            exitcode = int(*args[3])
-            runtime = int(*args[4])
-        else:
-            command = to_string(args[0])
-            stdout = to_string(args[1])
-            stderr = to_string(args[2])
-            exitcode = int(args[3])
-            runtime = int(args[4])
-        super().insert(
-            pos,
-            self.log(
-                to_string(command),
-                to_string(stdout),
-                to_string(stderr),
-                exitcode,
-                runtime,
-            ),
+    def _compress(self, index):
+        command, exitcode, runtime, payload, split = self._entries[index]
+        if split is not None:
+            return
+        stdout, stderr = payload
+        if len(stdout) + len(stderr) < self.threshold:
+            return
+        out = stdout.encode()
+        self._entries[index] = (
+            command,
+            exitcode,
+            runtime,
+            zlib.compress(out + stderr.encode()),
+            len(out),
         )
+
+    def _trim(self):
+        if self.maxlen and len(self._entries) > self.maxlen:
+            del self._entries[: len(self._entries) - self.maxlen]
+
+    def _view(self, entry):
+        command, exitcode, runtime, payload, split = entry
+        if split is None:
+            stdout, stderr = payload
+        else:
+            data = zlib.decompress(payload)
+            stdout, stderr = data[:split].decode(), data[split:].decode()
+        return self.log(command, stdout, stderr, exitcode, runtime / 1e9)
+
+    def append(self, *args):
+        """
+        :param args: command, stdout, stderr, exitcode and runtime in
+            seconds, either as a single sequence or as five arguments
+        """
+        self._entries.append(self._parse(args))
+        self.appended += 1
+        self._trim()
+        if len(self._entries) > self.hot:
+            self._compress(len(self._entries) - self.hot - 1)
+
+    def insert(self, pos, *args):
+        self._entries.insert(pos, self._parse(args))
+        self.appended += 1
+        self._trim()
+        for i in range(len(self._entries) - self.hot):
+            self._compress(i)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._view(x) for x in self._entries[index]]
+        return self._view(self._entries[index])
+
+    def __iter__(self):
+        for entry in self._entries:
+            yield self._view(entry)
+
+    def __repr__(self):
+        return "<{} {} entries>".format(self.__class__.__name__, len(self))
@@ -1,50 +1,68 @@
 from typing import Optional
 
+from .rpmver import RPMVersion
+from .versionmatrix import VersionMatrix
+
 
 class Package:
+    """
+    Versions of a package on a host, kept in a L{VersionMatrix} shared
+    by all hosts of the session
+    """
+
     __slots__ = [
         "name",
-        "_before",
-        "_after",
-        "_required",
-        "_current",
+        "_matrix",
+        "_row",
+        "_column",
     ]
 
-    def __init__(self, name):
+    def __init__(self, name, matrix=None, hostname=""):
+        """
+        :type matrix: L{VersionMatrix} or None
+        :param matrix: versions of all hosts, a new one if None
+        """
         self.name = name
-        self._before = None
-        self._after = None
-        self._required = None
-        self._current = None
+        self._matrix = VersionMatrix() if matrix is None else matrix
+        self._row = self._matrix.host(hostname)
+        self._column = self._matrix.package(name)
+
+    def version(self, field: str) -> Optional[RPMVersion]:
+        """
+        :param field: "required", "before", "after" or "current"
+
+        :returns: L{RPMVersion} of `field`, None if it's not set
+        """
+        return self._matrix.version(field, self._row, self._column)
 
     @property
     def before(self) -> Optional[str]:
-        return self._before
+        return self._matrix.get("before", self._row, self._column)
 
     @before.setter
     def before(self, ver: Optional[str]) -> None:
-        self._before = ver
+        self._matrix.set("before", self._row, self._column, ver)
 
     @property
     def after(self) -> Optional[str]:
-        return self._after
+        return self._matrix.get("after", self._row, self._column)
 
     @after.setter
     def after(self, ver: Optional[str]) -> None:
-        self._after = ver
+        self._matrix.set("after", self._row, self._column, ver)
 
     @property
     def required(self) -> Optional[str]:
-        return self._required
+        return self._matrix.get("required", self._row, self._column)
 
     @required.setter
     def required(self, ver: Optional[str]) -> None:
-        self._required = ver
+        self._matrix.set("required", self._row, self._column, ver)
 
     @property
     def current(self) -> Optional[str]:
-        return self._current
+        return self._matrix.get("current", self._row, self._column)
 
     @current.setter
     def current(self, ver: Optional[str]) -> None:
-        self._current = ver
+        self._matrix.set("current", self._row, self._column, ver)
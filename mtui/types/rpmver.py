@@ -1,8 +1,75 @@
 """Quering and comparing tags of RPM file names """
-from typing import Any
-import rpm  # type: ignore
+from functools import lru_cache, total_ordering
+import re
+from string import digits
+from typing import Any, Tuple
+
+_arch_suffixes = [
+    "noarch",
+    "x86_64",
+    "s390x",
+    "ppc64le",
+    "aarch64",
+    "ia64",
+    "ppc64",
+]
+"""
+:param _arch_suffixes: arch suffixes we get in addition to version on sle12
+"""
+
+_arch = re.compile(r"\.(?:{})".format("|".join(map(re.escape, _arch_suffixes))))
+
+# runs of digits, runs of letters, "~" and "^", everything else separates
+# segments and is ignored, like rpmvercmp does
+_segments = re.compile(r"[0-9]+|[A-Za-z]+|~|\^")
+
+# ranks of the segments, "~" sorts before the end of the version, "^"
+# after it and numbers after letters
+_TILDE, _END, _CARET, _ALPHA, _NUM = range(5)
+
+
+def vercmp_key(version: str) -> Tuple[Tuple[Any, ...], ...]:
+    """
+    :returns: key of `version` ordered like rpmvercmp orders versions,
+        keys of versions rpmvercmp considers equal are equal
+    """
+    key = []
+    for segment in _segments.findall(version):
+        if segment == "~":
+            key.append((_TILDE,))
+        elif segment == "^":
+            key.append((_CARET,))
+        elif segment[0] in digits:
+            key.append((_NUM, int(segment)))
+        else:
+            key.append((_ALPHA, segment))
+    key.append((_END,))
+    return tuple(key)
+
+
+def rpmvercmp(a: str, b: str) -> int:
+    """
+    :returns: -1, 0 or 1 if version `a` is lower, equal or higher than `b`
+    """
+    ka, kb = vercmp_key(a), vercmp_key(b)
+    return (ka > kb) - (ka < kb)
+
+
+@lru_cache(maxsize=4096)
+def _parse(ver: str):
+    ver = _arch.sub("", ver)
 
+    if "-" in ver:
+        # split rpm version string into version and release string
+        (version, release) = ver.rsplit("-", 1)
+    else:
+        version = ver
+        release = "0"
 
+    return version, release, (vercmp_key(version), vercmp_key(release))
+
+
+@total_ordering
 class RPMVersion:
 
     """RPMVersion holds an rpm version-release string
@@ -10,68 +77,32 @@ class RPMVersion:
     this is userd for rpm version arithmetics, like comparing
     if a specific rpm version is lower or higher than another one
 
+    Versions are compared like rpm.labelCompare compares them, using a
+    key computed once per version string.
     """
 
-    _arch_suffixes = [
-        "noarch",
-        "x86_64",
-        "s390x",
-        "ppc64le",
-        "aarch64",
-        "ia64",
-        "ppc64",
-    ]
-    """
-    :param _arch_suffixes: arch suffixes we get in addition to version on sle12
-    """
+    __slots__ = ["ver", "rel", "_key"]
+
+    _arch_suffixes = _arch_suffixes
 
     def __init__(self, ver: str) -> None:
         if not ver:
             raise ValueError
 
-        for x in self._arch_suffixes:
-            ver = ver.replace("." + x, "")
+        self.ver, self.rel, self._key = _parse(ver)
 
-        if "-" in ver:
-            # split rpm version string into version and release string
-            (self.ver, self.rel) = ver.rsplit("-")
-        else:
-            self.ver = ver
-            self.rel = "0"
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RPMVersion):
+            return NotImplemented
+        return self._key == other._key
 
     def __lt__(self, other) -> bool:
-        return (
-            rpm.labelCompare(("1", self.ver, self.rel), ("1", other.ver, other.rel)) < 0
-        )
+        if not isinstance(other, RPMVersion):
+            return NotImplemented
+        return self._key < other._key
 
-    def __gt__(self, other) -> bool:
-        return (
-            rpm.labelCompare(("1", self.ver, self.rel), ("1", other.ver, other.rel)) > 0
-        )
-
-    def __eq__(self, other) -> bool:
-        return (
-            rpm.labelCompare(("1", self.ver, self.rel), ("1", other.ver, other.rel))
-            == 0
-        )
-
-    def __le__(self, other) -> bool:
-        return (
-            rpm.labelCompare(("1", self.ver, self.rel), ("1", other.ver, other.rel))
-            <= 0
-        )
-
-    def __ge__(self, other) -> bool:
-        return (
-            rpm.labelCompare(("1", self.ver, self.rel), ("1", other.ver, other.rel))
-            >= 0
-        )
-
-    def __ne__(self, other) -> bool:
-        return (
-            rpm.labelCompare(("1", self.ver, self.rel), ("1", other.ver, other.rel))
-            != 0
-        )
+    def __hash__(self) -> int:
+        return hash(self._key)
 
     def __str__(self) -> str:
         s = str(self.ver)
@@ -37,6 +37,18 @@ class UpdateID(metaclass=ABCMeta):
         directory = config.template_dir / str(self.id) / config.install_logs
         directory.mkdir(parents=False, exist_ok=True)
 
+    def load_testreport(self, config):
+        """
+        Loads the testreport without connecting its refhosts or querying
+        openQA, used for updates tested along with the loaded one
+
+        :returns: L{TestReport}
+        """
+        tr = self._checkout(config)
+        self._create_installogs_dir(config)
+        tr.updateid = self
+        return tr
+
     @abstractmethod
     def make_testreport(self, config, autoconnect=True):
         pass
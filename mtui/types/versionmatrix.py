@@ -0,0 +1,161 @@
+"""Package versions of all hosts of a session"""
+
+from typing import Dict, Iterable, List, Optional
+
+from .rpmver import RPMVersion
+
+FIELDS = ("required", "before", "after", "current")
+
+# states of a version compared to another one, the keys of
+# ListPackages.state_map
+NOT_INSTALLED = None
+NEEDS_UPDATE = -1
+UPDATED = 0
+TOO_RECENT = 1
+
+
+class VersionMatrix:
+    """
+    Host x package matrix of the required, before, after and current
+    versions
+
+    Hosts and packages are interned to row and column indices. Every
+    field is kept as a row-major array of version strings next to an
+    array of the parsed L{RPMVersion}s, so versions are parsed once when
+    they are set and compared across all hosts in one pass.
+    """
+
+    def __init__(self) -> None:
+        self.hosts: List[str] = []
+        self.packages: List[str] = []
+        self._hosts: Dict[str, int] = {}
+        self._packages: Dict[str, int] = {}
+        self._versions: Dict[str, List[Optional[str]]] = {f: [] for f in FIELDS}
+        self._parsed: Dict[str, List[Optional[RPMVersion]]] = {f: [] for f in FIELDS}
+
+    def host(self, hostname: str) -> int:
+        """
+        :returns: row of `hostname`, added if it's new
+        """
+        if hostname not in self._hosts:
+            self._hosts[hostname] = len(self.hosts)
+            self.hosts.append(hostname)
+            for f in FIELDS:
+                self._versions[f].extend([None] * len(self.packages))
+                self._parsed[f].extend([None] * len(self.packages))
+        return self._hosts[hostname]
+
+    def package(self, name: str) -> int:
+        """
+        :returns: column of package `name`, added if it's new
+        """
+        if name not in self._packages:
+            width = len(self.packages)
+            self._packages[name] = width
+            self.packages.append(name)
+            for f in FIELDS:
+                for array in (self._versions[f], self._parsed[f]):
+                    for row in reversed(range(len(self.hosts))):
+                        array.insert((row + 1) * width, None)
+        return self._packages[name]
+
+    def _cell(self, row: int, column: int) -> int:
+        return row * len(self.packages) + column
+
+    def get(self, field: str, row: int, column: int) -> Optional[str]:
+        return self._versions[field][self._cell(row, column)]
+
+    def version(self, field: str, row: int, column: int) -> Optional[RPMVersion]:
+        """
+        :returns: L{RPMVersion} parsed when the version was set
+        """
+        return self._parsed[field][self._cell(row, column)]
+
+    def set(self, field: str, row: int, column: int, version: Optional[str]) -> None:
+        cell = self._cell(row, column)
+        self._versions[field][cell] = version
+        self._parsed[field][cell] = RPMVersion(version) if version else None
+
+    def has(self, hostname: str, name: str) -> bool:
+        """
+        :returns: True if any version of package `name` is set on
+            `hostname`
+        """
+        if hostname not in self._hosts or name not in self._packages:
+            return False
+        cell = self._cell(self._hosts[hostname], self._packages[name])
+        return any(self._versions[f][cell] is not None for f in FIELDS)
+
+    def clear(self, hostname: str, name: str) -> None:
+        """
+        Drops all versions of package `name` on `hostname`
+        """
+        if hostname not in self._hosts or name not in self._packages:
+            return
+        cell = self._cell(self._hosts[hostname], self._packages[name])
+        for f in FIELDS:
+            self._versions[f][cell] = None
+            self._parsed[f][cell] = None
+
+    def clear_host(self, hostname: str) -> None:
+        """
+        Drops all versions of `hostname`, its packages are set again
+        """
+        start = self._cell(self.host(hostname), 0)
+        for f in FIELDS:
+            for array in (self._versions[f], self._parsed[f]):
+                array[start : start + len(self.packages)] = [None] * len(self.packages)
+
+    def compare(
+        self, field: str, against: str, hostnames: Optional[Iterable[str]] = None
+    ) -> Dict[str, Dict[str, Optional[int]]]:
+        """
+        Compares `field` to `against` on all hosts in one pass
+
+        :param hostnames: hosts to compare, all if None
+
+        :returns: {hostname: {package: state}} where state is
+            L{NOT_INSTALLED} if `field` isn't set, otherwise -1, 0 or 1
+            like L{NEEDS_UPDATE}, L{UPDATED} and L{TOO_RECENT}. Packages
+            without `against` version are left out.
+        """
+        if hostnames is None:
+            rows = range(len(self.hosts))
+        else:
+            rows = [self._hosts[hn] for hn in hostnames if hn in self._hosts]
+
+        width = len(self.packages)
+        values = self._parsed[field]
+        others = self._parsed[against]
+        states: Dict[str, Dict[str, Optional[int]]] = {}
+        for row in rows:
+            host = states.setdefault(self.hosts[row], {})
+            for column in range(width):
+                other = others[row * width + column]
+                if other is None:
+                    continue
+                value = values[row * width + column]
+                if value is None:
+                    host[self.packages[column]] = NOT_INSTALLED
+                else:
+                    host[self.packages[column]] = (value > other) - (value < other)
+        return states
+
+
+def compare(targets, field: str, against: str) -> Dict[str, Dict[str, Optional[int]]]:
+    """
+    L{VersionMatrix.compare} of the matrices of `targets`
+
+    The matrix is shared by all reports of a session, so only the
+    packages of each target are kept.
+
+    :type targets: {hostname: L{Target}}
+    """
+    matrices = {id(t.versions): t.versions for t in targets.values()}
+    states: Dict[str, Dict[str, Optional[int]]] = {}
+    for matrix in matrices.values():
+        states.update(matrix.compare(field, against, targets.keys()))
+    for hn, host in states.items():
+        packages = targets[hn].packages
+        states[hn] = {k: v for k, v in host.items() if k in packages}
+    return states
@@ -2,7 +2,10 @@
 # update and software stack management
 #
 
+from functools import partial
 from logging import getLogger
+import re
+from xml.etree.ElementTree import ParseError
 
 from .messages import (
     MissingDowngraderError,
@@ -14,12 +17,27 @@ from .messages import (
 from .target.actions import UpdateError
 from .target.downgrade import Downgrade
 from .target.install import Install
+from .target.parsers.zypper import (
+    Message,
+    Patch,
+    ZypperXMLParser,
+    parse_search,
+    patches_of,
+)
 from .target.prepare import Prepare
 from .target.update import Update
-from .utils import DictWithInjections
+from .utils import DictWithInjections, yellow
 
 logger = getLogger("mtui.updater")
 
+# zypper package cache of the update, kept apart from the system cache so
+# packages downloaded in advance survive removing the update repositories
+PACKAGE_CACHE = "/var/cache/mtui/packages"
+
+# zypper exit codes of a successful run, 100-103 report needed updates or
+# a required restart, 106 skipped repositories
+ZYPPER_SUCCESS = (0, 100, 101, 102, 103, 106)
+
 
 class ZypperUpdate(Update):
     def check(self, target, stdin, stdout, stderr, exitcode):
@@ -39,26 +57,198 @@ class ZypperUpdate(Update):
             end = stdout.find("\n\n", start)
             print(stdout[start:end])
 
+    @staticmethod
+    def run_xml(targets, command):
+        """
+        Runs a `zypper --xmlout` command and parses its output per host
+        while it arrives
+
+        :returns: {hostname: L{ZypperXMLParser}}
+        """
+        parsers = {hn: ZypperXMLParser() for hn in targets.keys()}
+        targets.run(command, feed={hn: p.feed for hn, p in parsers.items()})
+        return parsers
+
+    def check_events(self, target, parser):
+        """
+        Checks the result of a `zypper --xmlout` command from its events
+        instead of scanning the output text
+        """
+        errors = parser.errors()
+        failed = target.lastexit() not in ZYPPER_SUCCESS
+        prompt = parser.prompt()
+        if failed and prompt:
+            errors.append("aborted at prompt: {!s}".format(prompt.text))
+        if errors or failed:
+            logger.critical(
+                '{!s}: command "{!s}" failed:\n{!s}\nstderr:\n{!s}'.format(
+                    target.hostname,
+                    target.lastin(),
+                    "\n".join(errors),
+                    target.lasterr(),
+                )
+            )
+            raise UpdateError("RPM Error", target.hostname)
+        if target.lastexit() == 106:
+            logger.warning(
+                "{!s}: zypper returns exitcode 106:\n{!s}".format(
+                    target.hostname, target.lasterr()
+                )
+            )
+        for m in parser.events(Message):
+            if "Additional rpm output" in m.text:
+                logger.warning(
+                    "There was additional rpm output on {!s}:".format(target.hostname)
+                )
+                print(m.text.replace("warning", yellow("warning")))
+            if "not supported by its vendor" in m.text:
+                logger.critical(
+                    "{!s}: package support is uncertain:".format(target.hostname)
+                )
+                print(m.text)
+
 
 class ZypperOBSUpdate(ZypperUpdate):
     def __init__(self, *a, **kw):
         super().__init__(*a, **kw)
         repat = ":p={:d}"
-        repo = repat.format(self.testreport.rrid.maintenance_id)
+        repos = [repat.format(x.maintenance_id) for x in self.testreport.rrids]
+        repo = "|".join(repos)
+        self.repository = "(?:{!s})\\b".format("|".join(map(re.escape, repos)))
 
-        self.commands = [
+        self.prepare = [
             r"""export LANG=""",
             r"""zypper -n lr -puU""",
             r"""zypper -n refresh""",
-            r"""zypper -n patches | grep {!s}""".format(repo),
-            r"""zypper -n patches | awk -F "|" '/{!s}\>/ {{ print $2; }}' | while read p; do zypper -n install -l -y -t patch $p; done""".format(
-                repo
-            ),
-            r"""zypper -n patches | grep {!s}""".format(repo),
-            r"""zypper -n lr | awk -F "|" '/{!s}\>/ {{ print $2; }}' | while read r; do zypper rr $r; done""".format(
-                repo
-            ),
         ]
+        self.patches = r"""zypper -n --xmlout patches"""
+        zypper = "zypper -n --xmlout --pkg-cache-dir {!s}".format(PACKAGE_CACHE)
+        self.install = zypper + " install -l -y -t patch {!s}"
+        self.download = zypper + " install --download-only -l -y -t patch {!s}"
+        self.cleanup = r"""zypper -n lr | awk -F "|" '/({!s})\>/ {{ print $2; }}' | while read r; do zypper rr $r; done; rm -rf {!s}""".format(
+            repo, PACKAGE_CACHE
+        )
+
+        self.commands = self.prepare + [
+            self.patches,
+            self.install.format("<needed patches of {!s}>".format(", ".join(repos))),
+            self.patches,
+            self.cleanup,
+        ]
+
+    def prefetch(self):
+        self.targets.refresh_locks()
+        for t in self.targets.values():
+            if t.is_locked() and not t._lock.is_mine():
+                logger.info("{!s}: host is locked, not prefetching".format(t.hostname))
+                continue
+            t.prefetch(partial(self._prefetch, t))
+
+    def _prefetch(self, target):
+        # runs outside of the host log, concurrently with other commands
+        repos = target.issue_repos(self.testreport.update_repos, self.testreport.rrid)
+        execute = partial(target.connection.execute, interactive=False)
+        _, stdout, _ = execute(
+            "; ".join(
+                "zypper -n ar -ckn {0} {1} {0} >/dev/null 2>&1 && echo {0}".format(
+                    alias, url
+                )
+                for alias, url in repos
+            )
+        )
+        added = stdout.split()
+
+        try:
+            if added:
+                execute("zypper -n refresh {!s}".format(" ".join(added)))
+            parser = ZypperXMLParser()
+            execute(self.patches, feed=parser.feed)
+            parser.close()
+            needed = sorted(
+                {
+                    p.name
+                    for p in patches_of(parser.events(Patch), self.repository)
+                    if p.status == "needed"
+                }
+            )
+            if needed:
+                logger.info(
+                    "{!s}: downloading packages of {!s}".format(
+                        target.hostname, " ".join(needed)
+                    )
+                )
+                exitcode, _, stderr = execute(self.download.format(" ".join(needed)))
+                if exitcode:
+                    logger.warning(
+                        "{!s}: prefetch failed:\n{!s}".format(target.hostname, stderr)
+                    )
+        finally:
+            if added:
+                execute("zypper -n rr {!s}".format(" ".join(added)))
+
+    def _query_patches(self):
+        """
+        :returns: {hostname: [L{Patch}]} patches of the update per host
+        """
+        patches = {}
+        for hn, parser in self.run_xml(self.targets, self.patches).items():
+            try:
+                parser.close()
+            except ParseError as e:
+                logger.critical(
+                    "{!s}: failed to parse patches: {!s}\n{!s}".format(
+                        hn, e, self.targets[hn].lasterr()
+                    )
+                )
+                raise UpdateError("Patch query failed", hn)
+            patches[hn] = patches_of(parser.events(Patch), self.repository)
+        return patches
+
+    def _run_commands(self):
+        with self.timer("refresh"):
+            for command in self.prepare:
+                self.targets.run(command)
+
+                for t in self.targets.values():
+                    self._check(t, t.lastin(), t.lastout(), t.lasterr(), t.lastexit())
+
+        with self.timer("patches"):
+            queried = self._query_patches()
+
+        install = {}
+        for hn, patches in queried.items():
+            for p in patches:
+                logger.info(
+                    "{!s}: {!s} ({!s}, {!s})".format(hn, p.name, p.category, p.status)
+                )
+            needed = sorted({p.name for p in patches if p.status == "needed"})
+            if needed:
+                install[hn] = self.install.format(" ".join(needed))
+            else:
+                logger.warning("{!s}: no patches of the update are needed".format(hn))
+
+        if install:
+            targets = self.targets.select(list(install))
+
+            with self.timer("install", targets):
+                parsers = self.run_xml(targets, install)
+            for hn, parser in parsers.items():
+                self.check_events(targets[hn], parser)
+
+        with self.timer("patches"):
+            queried = self._query_patches()
+
+        for hn, patches in queried.items():
+            needed = [p.name for p in patches if p.status == "needed"]
+            if needed:
+                logger.warning(
+                    "{!s}: patches are still needed: {!s}".format(hn, " ".join(needed))
+                )
+
+        with self.timer("cleanup"):
+            self.targets.run(self.cleanup)
+        for t in self.targets.values():
+            self._check(t, t.lastin(), t.lastout(), t.lasterr(), t.lastexit())
 
 
 class RedHatUpdate(Update):
@@ -71,6 +261,11 @@ class RedHatUpdate(Update):
             "yum -y update {!s}".format(" ".join(self.packages)),
         ]
 
+    def prefetch(self):
+        command = "yum -y --downloadonly update {!s}".format(" ".join(self.packages))
+        for t in self.targets.values():
+            t.prefetch(partial(t.connection.execute, command, interactive=False))
+
 
 class CaaSPUpdate(Update):
     def __init__(self, *a, **kw):
@@ -100,7 +295,17 @@ Updater = DictWithInjections(
 )
 
 
+# runs `command` once with all `packages` installed on the target
+INSTALLED_ONLY = (
+    "pkgs=$(rpm -q --qf '%{{NAME}}\\n' {packages} 2>/dev/null"
+    " | grep -v ' is not installed$' | sort -u);"
+    ' [ -z "$pkgs" ] || {command} $pkgs'
+)
+
+
 class ZypperPrepare(Prepare):
+    success = ZYPPER_SUCCESS
+
     def __init__(self, *a, **kw):
         super().__init__(*a, **kw)
 
@@ -110,9 +315,10 @@ class ZypperPrepare(Prepare):
         if self.force:
             parameter = "--force-resolution"
 
-        for package in self.packages:
-            if "branding-upstream" in package:
-                continue
+        packages = [p for p in self.packages if "branding-upstream" not in p]
+        command = "zypper -n in -y -l {!s}".format(parameter)
+
+        for package in packages:
             if self.installed_only:
                 commands.append(
                     "rpm -q {!s} &>/dev/null && zypper -n in -y -l {!s} {!s}".format(
@@ -126,6 +332,14 @@ class ZypperPrepare(Prepare):
 
         self.commands = commands
 
+        if packages:
+            if self.installed_only:
+                self.transaction = INSTALLED_ONLY.format(
+                    packages=" ".join(packages), command=command
+                )
+            else:
+                self.transaction = "{!s} {!s}".format(command, " ".join(packages))
+
     def check(self, target, stdin, stdout, stderr, exitcode):
         if "Error:" in stderr:
             logger.critical(
@@ -146,6 +360,8 @@ class RedHatPrepare(Prepare):
         if not self.testing:
             parameter = "--disablerepo=*testing*"
 
+        command = "yum -y {!s} install".format(parameter)
+
         for package in self.packages:
             if self.installed_only:
                 commands.append(
@@ -158,6 +374,14 @@ class RedHatPrepare(Prepare):
 
         self.commands = commands
 
+        if self.packages:
+            if self.installed_only:
+                self.transaction = INSTALLED_ONLY.format(
+                    packages=" ".join(self.packages), command=command
+                )
+            else:
+                self.transaction = "{!s} {!s}".format(command, " ".join(self.packages))
+
 
 class CaaSPPrepare(Prepare):
     def run(self):
@@ -177,21 +401,37 @@ Preparer = DictWithInjections(
 
 
 class ZypperDowngrade(Downgrade):
+    success = ZYPPER_SUCCESS
+
     def __init__(self, *a, **kw):
         super().__init__(*a, **kw)
 
-        self.list_command = r"""
-            for p in {!s}; do \
-              zypper -n se -s --match-exact -t package $p; \
-            done \
-            | grep -v "(System" \
-            | grep ^[iv] \
-            | sed "s, ,,g" \
-            | awk -F "|" '{{ print $2,"=",$4 }}'
-        """.format(
-            " ".join(self.packages)
+        self.list_command = (
+            "zypper -n --xmlout se -s --match-exact -t package {!s}".format(
+                " ".join(self.packages)
+            )
         )
         self.install_command = "rpm -q {!s} &>/dev/null && zypper -n in -C --force-resolution -y -l {!s}={!s}"
+        self.transaction_command = (
+            "zypper -n in -C --oldpackage --force-resolution -y -l {!s}"
+        )
+
+    def parse_versions(self, stdout):
+        try:
+            solvables = parse_search(stdout)
+        except ParseError as e:
+            logger.warning("failed to parse package versions: {!s}".format(e))
+            return {}
+
+        # only versions in repositories of packages installed on the host
+        release = {}
+        for x in solvables:
+            if x.status not in ("installed", "other-version"):
+                continue
+            if x.repository.startswith(("(System", "@System")):
+                continue
+            release.setdefault(x.name, []).append(x.edition)
+        return release
 
 
 class RedHatDowngrade(Downgrade):
@@ -0,0 +1,164 @@
+from types import SimpleNamespace
+
+import pytest
+
+from mtui.messages import BatchProductMismatchError
+from mtui.target import Target
+from mtui.target.update import Update
+from mtui.template.batchtestreport import BatchTestReport
+from mtui.template.testreport import TestReport
+from mtui.types.package import Package
+from mtui.types.versionmatrix import VersionMatrix
+
+
+class FakeReport:
+    def __init__(self, mid, packages):
+        self.config = SimpleNamespace(snapshot_rollback=False, repo_cache=False)
+        self.rrid = SimpleNamespace(maintenance_id=mid)
+        self.id = "SUSE:Maintenance:{}:1".format(mid)
+        self.update_repos = {"SLES": mid}
+        self.packages = {"15-SP3": dict.fromkeys(packages, "1.0")}
+        self.batch_versions = VersionMatrix()
+        self.scripts = []
+
+    def get_package_list(self):
+        return list(self.packages["15-SP3"])
+
+    def run_scripts(self, s, targets):
+        self.scripts.append(s)
+
+
+class FakeTarget:
+    def __init__(self):
+        self.commands = []
+
+    def issue_repos(self, repos, rrid):
+        return [("issue-{}".format(rrid.maintenance_id), "http://r")]
+
+    def run_zypper_repos(self, cmd, repos):
+        self.commands.append((cmd, repos))
+
+
+def test_batch_testreport():
+    reports = [FakeReport(1, ["a", "b"]), FakeReport(2, ["b", "c"])]
+    batch = BatchTestReport(reports)
+
+    assert batch.id == "SUSE:Maintenance:1:1,SUSE:Maintenance:2:1"
+    assert [x.maintenance_id for x in batch.rrids] == [1, 2]
+    assert batch.get_package_list() == ["a", "b", "c"]
+
+    batch.run_scripts("pre", {})
+    assert [x.scripts for x in reports] == [["pre"], ["pre"]]
+
+
+def test_batch_set_repo():
+    target = FakeTarget()
+    batch = BatchTestReport([FakeReport(1, ["a"]), FakeReport(2, ["b"])])
+
+    batch.set_repo(target, "add")
+    batch.set_repo(target, "remove")
+
+    repos = [("issue-1", "http://r"), ("issue-2", "http://r")]
+    assert target.commands == [("-n ar -ckn", repos), ("-n rr", repos)]
+
+
+def test_report_results_of_batch_hosts():
+    versions, batch_versions = VersionMatrix(), VersionMatrix()
+    packages = {x: Package(x, versions, "host") for x in ("a", "c")}
+    Package("b", batch_versions, "host").after = "2.0"
+    t = SimpleNamespace(
+        hostname="host", system="SLES", packages=packages, versions=versions, out=[]
+    )
+    report = SimpleNamespace(
+        get_package_list=lambda: ["a", "b", "d"], batch_versions=batch_versions
+    )
+
+    (result,) = TestReport.report_results(report, [t])
+
+    assert sorted(result.packages) == ["a", "b"]
+    assert result.packages["b"].after == "2.0"
+
+
+def test_batch_products_must_match():
+    other = FakeReport(2, ["b"])
+    other.update_repos = {"SLED": 2}
+
+    with pytest.raises(BatchProductMismatchError):
+        BatchTestReport([FakeReport(1, ["a"]), other])
+
+
+class FakeHosts(dict):
+    def add_history(self, data):
+        pass
+
+
+def batch_target(versions):
+    t = Target(SimpleNamespace(facts_cache=False, hostlog_limit=0), "host")
+    t.versions = versions
+    t.system = SimpleNamespace(get_base=lambda: SimpleNamespace(version="15-SP3"))
+    t.packages = {"b": Package("b", versions, "host")}
+    t.packages["b"].required = "1.0"
+    return t
+
+
+def test_batch_update_restores_packages():
+    versions = VersionMatrix()
+    t = batch_target(versions)
+    own = dict(t.packages)
+
+    loaded, other = FakeReport(1, ["b"]), FakeReport(2, ["b", "c"])
+    other.packages["15-SP3"]["b"] = "2.0"
+    seen = []
+
+    class Updater:
+        def __init__(self, targets, testreport):
+            seen.append(sorted(targets["host"].packages))
+
+        def run(self, params):
+            t.packages["c"].after = "1.0"
+
+    loaded.get_updater = lambda: Updater
+    BatchTestReport([loaded, other]).perform_update(FakeHosts(host=t), [])
+
+    assert seen == [["b", "c"]]
+    assert t.packages == own
+    assert t.packages["b"].required == "1.0"
+    assert not versions.has("host", "c")
+    assert other.batch_versions.has("host", "c")
+    assert not loaded.batch_versions.has("host", "c")
+
+
+class PlainUpdate(Update):
+    def lock_and_run(self):
+        pass
+
+    def check(self, target, stdin, stdout, stderr, exitcode):
+        pass
+
+
+def test_plain_update_after_batch(caplog):
+    versions = VersionMatrix()
+    t = batch_target(versions)
+    t.query_versions = lambda: None
+    t.journal_packages = lambda: None
+
+    loaded, other = FakeReport(1, ["b"]), FakeReport(2, ["c"])
+
+    class Updater:
+        def __init__(self, targets, testreport):
+            pass
+
+        def run(self, params):
+            t.packages["c"].after = "1.0"
+
+    loaded.get_updater = lambda: Updater
+    BatchTestReport([loaded, other]).perform_update(FakeHosts(host=t), [])
+
+    loaded.config.auto = True
+    t.packages["b"].current = "0.9"
+    PlainUpdate(FakeHosts(host=t), loaded)._run(["noprepare"])
+
+    assert [r.getMessage() for r in caplog.records] == [
+        "host: package was not updated: b (0.9)",
+        "host: package does not match required version: b (0.9, required 1.0)",
+    ]
@@ -0,0 +1,55 @@
+from threading import Event, Thread, Timer
+from types import SimpleNamespace
+
+from mtui.target import Target
+from mtui.target.factscache import HostFactsCache
+from mtui.target.parsers import HostFacts
+from mtui.types import Product
+from mtui.types.systems import System
+
+
+def test_roundtrip(tmp_path):
+    path = tmp_path / "hostfacts.json"
+    system = System(
+        Product("SLES", "15-SP3", "x86_64"),
+        {Product("sle-module-basesystem", "15-SP3", "x86_64")},
+    )
+    HostFactsCache(path).put("h1", HostFacts(system, "5.3.18", "lock", "fp"))
+
+    facts = HostFactsCache(path).get("h1")
+    assert facts.system == system
+    assert facts.kernel == "5.3.18"
+    assert facts.fingerprint == "fp"
+    # lock state is never cached
+    assert facts.lock is None
+
+
+def test_missing_and_broken(tmp_path):
+    path = tmp_path / "hostfacts.json"
+    assert HostFactsCache(path).get("h1") is None
+
+    path.write_text("{not json")
+    assert HostFactsCache(path).get("h1") is None
+
+
+def test_no_fingerprint_not_cached(tmp_path):
+    path = tmp_path / "hostfacts.json"
+    system = System(Product("SLES", "15", "x86_64"))
+    HostFactsCache(path).put("h1", HostFacts(system, "5.3", "", ""))
+    assert not path.exists()
+
+
+def test_lock_queries_wait_for_verification():
+    t = Target(SimpleNamespace(facts_cache=False, hostlog_limit=0), "host")
+    t._lock = SimpleNamespace(is_locked=lambda: False)
+    verified = Event()
+
+    def verify():
+        verified.wait(5)
+        t._lock = SimpleNamespace(is_locked=lambda: True)
+
+    t._facts_thread = Thread(target=verify, daemon=True)
+    t._facts_thread.start()
+    Timer(0.1, verified.set).start()
+
+    assert t.is_locked()
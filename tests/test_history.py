@@ -0,0 +1,123 @@
+import os
+import subprocess
+
+import pytest
+
+from mtui.target import history
+
+
+def sh(command):
+    p = subprocess.run(["sh", "-c", command], capture_output=True, text=True)
+    assert p.returncode == 0, p.stderr
+    return p.stdout
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_DIR", str(tmp_path / "mtui"))
+    monkeypatch.setattr(history, "HISTORY_FILE", str(tmp_path / "mtui/history.jsonl"))
+    monkeypatch.setattr(history, "LEGACY_FILE", str(tmp_path / "mtui.log"))
+    return tmp_path
+
+
+def add(ts, *comment):
+    sh(history.append_command(history.history_entry("tester", list(comment), ts)))
+
+
+def query(*a, **kw):
+    return history.parse_entries(sh(history.query_command(*a, **kw)))
+
+
+def test_append_and_query(store):
+    (store / "mtui.log").write_text("100:old:connect\n")
+    add(200, "connect")
+    add(300, "update", "1234", "foo bar")
+    add(400, "disconnect")
+
+    assert query(10) == [
+        "100:old:connect",
+        "200:tester:connect",
+        "300:tester:update:1234:foo bar",
+        "400:tester:disconnect",
+    ]
+    assert query(2) == ["300:tester:update:1234:foo bar", "400:tester:disconnect"]
+    assert query(10, ["connect"]) == ["100:old:connect", "200:tester:connect"]
+    assert query(10, since=200, until=300) == [
+        "200:tester:connect",
+        "300:tester:update:1234:foo bar",
+    ]
+
+
+def test_query_merges_legacy_history(store, monkeypatch):
+    monkeypatch.setattr(history, "SEGMENT_SIZE", 100)
+    (store / "mtui.log").write_text(
+        "150:old:connect\n250:old:update:1234\n350:old:disconnect\n"
+    )
+    for ts in (100, 200, 300, 400):
+        add(ts, "connect")
+
+    assert query(10) == [
+        "100:tester:connect",
+        "150:old:connect",
+        "200:tester:connect",
+        "250:old:update:1234",
+        "300:tester:connect",
+        "350:old:disconnect",
+        "400:tester:connect",
+    ]
+    assert query(3) == [
+        "300:tester:connect",
+        "350:old:disconnect",
+        "400:tester:connect",
+    ]
+    assert query(10, since=200, until=300) == [
+        "200:tester:connect",
+        "250:old:update:1234",
+        "300:tester:connect",
+    ]
+    assert query(10, ["update", "disconnect"]) == [
+        "250:old:update:1234",
+        "350:old:disconnect",
+    ]
+
+
+def test_rotation(store, monkeypatch):
+    monkeypatch.setattr(history, "SEGMENT_SIZE", 100)
+    monkeypatch.setattr(history, "SEGMENTS", 2)
+
+    for ts in range(1000, 1020):
+        add(ts, "connect")
+
+    segments = sorted(x.name for x in (store / "mtui").iterdir())
+    assert len(segments) == 3
+    assert segments[-1] == "history.jsonl"
+    assert all(x.startswith("history.000000") for x in segments[:-1])
+
+    entries = query(100)
+    assert entries[-1] == "1019:tester:connect"
+    assert len(entries) < 20
+    assert query(1, until=1005) == []
+    assert query(100, until=1016)[-1] == "1016:tester:connect"
+
+
+def test_query_stops_at_since(store, monkeypatch):
+    monkeypatch.setattr(history, "SEGMENT_SIZE", 100)
+    for ts in range(1000, 1020):
+        add(ts, "connect")
+    # reading a segment older than `since` would block on the fifo
+    os.mkfifo(store / "mtui/history.0000000001.jsonl")
+
+    command = history.query_command(100, ["update"], since=1010)
+    p = subprocess.run(["sh", "-c", command], capture_output=True, timeout=10)
+    assert p.stdout == b""
+
+    entries = history.parse_entries(
+        subprocess.run(
+            ["sh", "-c", history.query_command(100, since=1010)],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        ).stdout
+    )
+    assert entries[0] == "1010:tester:connect"
+    assert len(entries) == 10
@@ -0,0 +1,86 @@
+from threading import Event
+from time import monotonic
+
+from mtui.target.hostgroup import HostsGroup
+from mtui.target.locks import TargetLockedError
+
+import pytest
+
+
+class FakeTarget:
+    def __init__(self, hostname, fail=None):
+        self.hostname = hostname
+        self.fail = fail
+        self.calls = []
+
+    def _call(self, name, *args):
+        self.calls.append((name,) + args)
+        if self.fail:
+            raise self.fail
+
+    def lock(self, comment=None):
+        self._call("lock", comment)
+
+    def unlock(self, force=False):
+        self._call("unlock", force)
+
+    def add_history(self, data):
+        self._call("add_history", data)
+
+    def close(self, action=None):
+        self._call("close", action)
+
+    def query_package_versions(self, packages):
+        self._call("query", packages)
+        return {p: self.hostname for p in packages}
+
+
+def test_query_versions_keeps_order():
+    hosts = [FakeTarget("h{}".format(i)) for i in range(20)]
+    rs = HostsGroup(hosts).query_versions(["a", "b"])
+
+    assert [t.hostname for t, _ in rs] == [h.hostname for h in hosts]
+    assert all(pvs == {"a": t.hostname, "b": t.hostname} for t, pvs in rs)
+
+
+def test_lock_ignores_locked_hosts():
+    locked = FakeTarget("locked", TargetLockedError("locked"))
+    free = FakeTarget("free")
+
+    HostsGroup([locked, free]).lock("comment")
+
+    assert free.calls == [("lock", "comment")]
+    assert locked.calls == [("lock", "comment")]
+
+
+def test_unlock_reraises_unexpected_after_all_hosts():
+    broken = FakeTarget("broken", IOError("lost"))
+    hosts = [FakeTarget("h{}".format(i)) for i in range(5)] + [broken]
+
+    with pytest.raises(IOError):
+        HostsGroup(hosts).unlock(force=True)
+
+    assert all(h.calls == [("unlock", True)] for h in hosts)
+
+
+def test_close_logs_errors():
+    broken = FakeTarget("broken", RuntimeError("lost"))
+    ok = FakeTarget("ok")
+
+    HostsGroup([broken, ok]).close("reboot")
+
+    assert ok.calls == [("close", "reboot")]
+
+
+def test_close_gives_up_on_hung_hosts():
+    release = Event()
+    hung = FakeTarget("hung")
+    hung.close = lambda action=None: release.wait(5)
+    ok = FakeTarget("ok")
+
+    start = monotonic()
+    HostsGroup([hung, ok]).close(timeout=0.2)
+    release.set()
+
+    assert monotonic() - start < 2
+    assert ok.calls == [("close", None)]
@@ -0,0 +1,40 @@
+from mtui.journal import SessionJournal
+from mtui.types.hostlog import HostLog
+from mtui.types.package import Package
+
+
+def test_replay_last_session(tmp_path):
+    path = tmp_path / "journal.db"
+    journal = SessionJournal(path)
+    log = HostLog()
+    log.append(["zypper up", "done\n", "", 0, 1.5])
+    pkg = Package("foo")
+    pkg.before = "1.0-1"
+    pkg.after = "1.1-1"
+
+    journal.record("a", "connect")
+    journal.record("b", "connect")
+    journal.command("a", log[-1])
+    journal.packages("a", {"foo": pkg})
+    journal.lock("a", "1600000000:me:42")
+    journal.record("b", "disconnect")
+    journal.close()
+
+    hosts = SessionJournal(path, resume=True).replay()
+
+    assert list(hosts) == ["a"]
+    assert hosts["a"].commands == [["zypper up", "done\n", "", 0, 1.5]]
+    assert hosts["a"].packages["foo"]["after"] == "1.1-1"
+    assert hosts["a"].lock == "1600000000:me:42"
+
+
+def test_new_session_starts_empty(tmp_path):
+    path = tmp_path / "journal.db"
+    journal = SessionJournal(path)
+    journal.record("a", "connect")
+    journal.lock("a", "1600000000:me:42")
+    journal.lock("a", "")
+    journal.close()
+
+    assert SessionJournal(path, resume=True).replay()["a"].lock is None
+    assert SessionJournal(path).replay() == {}
@@ -0,0 +1,250 @@
+import subprocess
+from threading import Timer
+from types import SimpleNamespace
+
+import pytest
+
+from mtui.target.hostgroup import HostsGroup
+from mtui.target.locks import RemoteLock, TargetLock, TargetLockedError
+from mtui.target.registry import SQLiteLockRegistry
+
+
+class FakeConnection:
+    """
+    Runs the lock operations against a local file
+    """
+
+    hostname = "host"
+
+    def __init__(self):
+        self.reads = 0
+        self.commands = 0
+
+    def open(self, filename, mode="r"):
+        if mode == "r":
+            self.reads += 1
+        return open(filename, mode)
+
+    def remove(self, filename):
+        subprocess.run(["rm", filename], check=True)
+
+    def execute(self, command, lock=None):
+        self.commands += 1
+        p = subprocess.run(["sh", "-c", command], capture_output=True, text=True)
+        return p.returncode, p.stdout, p.stderr
+
+
+@pytest.fixture
+def lockfile(tmp_path):
+    return tmp_path / "mtui.lock"
+
+
+def lock(lockfile, user="me", registry=None):
+    tl = TargetLock(
+        FakeConnection(), SimpleNamespace(session_user=user), registry=registry
+    )
+    tl.filename = str(lockfile)
+    return tl
+
+
+def test_queries_share_one_read(lockfile):
+    lockfile.write_text("1600000000:other:42:testing")
+    tl = lock(lockfile)
+
+    assert tl.is_locked()
+    assert not tl.is_mine()
+    assert tl.locked_by() == "other"
+    assert tl.comment() == "testing"
+    tl.time()
+    assert tl.connection.reads == 1
+
+
+def test_reads_again_after_ttl(lockfile, monkeypatch):
+    tl = lock(lockfile)
+    assert not tl.is_locked()
+
+    monkeypatch.setattr(tl, "ttl", 0)
+    lockfile.write_text("1600000000:other:42")
+    assert tl.is_locked()
+    assert tl.connection.reads == 2
+
+
+def test_lock_in_one_command(lockfile):
+    tl = lock(lockfile)
+    tl.lock("comment")
+
+    assert tl.connection.commands == 1
+    assert tl.connection.reads == 0
+    assert tl.is_locked() and tl.is_mine()
+    assert tl.comment() == "comment"
+    assert lockfile.read_text().split(":")[1:] == ["me", str(tl.i_am_pid), "comment"]
+
+    tl.lock("other comment")
+    assert lockfile.read_text().endswith(":other comment")
+
+    tl.unlock()
+    assert not lockfile.exists()
+    assert not tl.is_locked()
+    assert tl.connection.reads == 0
+
+
+def test_lock_reports_current_owner(lockfile):
+    lock(lockfile, "other").lock("mine")
+    tl = lock(lockfile)
+
+    with pytest.raises(TargetLockedError, match="locked by other"):
+        tl.lock()
+
+    assert tl.connection.reads == 0
+    assert tl.locked_by() == "other"
+    assert tl.comment() == "mine"
+    assert lockfile.read_text().split(":")[1] == "other"
+
+
+def test_abandoned_empty_lockfile_is_taken(lockfile):
+    lockfile.write_text("")
+    tl = lock(lockfile)
+    tl.retry_delay = 0
+    tl.lock()
+
+    assert lockfile.read_text().split(":")[1] == "me"
+    assert not list(lockfile.parent.glob("mtui.lock.*"))
+
+
+def test_empty_lockfile_being_written_is_busy(lockfile):
+    lockfile.write_text("")
+    writer = Timer(0.3, lockfile.write_text, ["1600000000:other:42"])
+    writer.start()
+
+    tl = lock(lockfile)
+    with pytest.raises(TargetLockedError, match="locked by other"):
+        tl.lock()
+    writer.join()
+
+    assert lockfile.read_text() == "1600000000:other:42"
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = SQLiteLockRegistry(tmp_path / "locks.db", lease=60)
+    yield registry
+    registry.close()
+
+
+def test_registry_lease(registry):
+    mine = RemoteLock.from_lockfile("1600000000:me:1")
+    other = RemoteLock.from_lockfile("1600000001:other:2:testing")
+
+    assert registry.acquire("host", mine) == (True, None)
+    acquired, holder = registry.acquire("host", other)
+    assert not acquired and holder.user == "me"
+    assert set(registry.query(["host", "free"])) == {"host"}
+
+    registry.lease = -1
+    registry.renew(["host"], "me", 1)
+    assert registry.query(["host"]) == {}
+    acquired, stale = registry.acquire("host", other)
+    assert acquired and stale.to_lockfile() == mine.to_lockfile()
+
+    registry.release("host", mine)
+    registry.release("host", other)
+    assert registry.query(["host"]) == {}
+
+
+def test_lock_with_registry(lockfile, registry):
+    other = lock(lockfile, "other", registry)
+    other.lock("testing")
+    assert registry.query(["host"])["host"].user == "other"
+
+    tl = lock(lockfile, registry=registry)
+    with pytest.raises(TargetLockedError, match="locked by other"):
+        tl.lock()
+    assert tl.connection.commands == 0
+
+    other.unlock()
+    assert registry.query(["host"]) == {}
+    tl.lock()
+    assert registry.query(["host"])["host"].user == "me"
+
+
+def test_expired_lease_takes_over_lockfile(lockfile, registry):
+    registry.lease = -1
+    lock(lockfile, "crashed", registry).lock()
+    registry.lease = 60
+
+    tl = lock(lockfile, registry=registry)
+    tl.lock()
+
+    assert lockfile.read_text().split(":")[1] == "me"
+    assert registry.query(["host"])["host"].user == "me"
+
+
+def test_host_lock_without_lease_is_kept(lockfile, registry):
+    lock(lockfile, "legacy").lock()
+
+    tl = lock(lockfile, registry=registry)
+    with pytest.raises(TargetLockedError, match="locked by legacy"):
+        tl.lock()
+
+    assert registry.query(["host"]) == {}
+
+
+def test_unlock_releases_lease_without_lockfile(lockfile, registry):
+    tl = lock(lockfile, registry=registry)
+    tl.lock()
+    heartbeat = registry._heartbeat
+    assert heartbeat.is_alive()
+
+    lockfile.unlink()
+    tl.invalidate()
+    tl.unlock()
+
+    assert registry.query(["host"]) == {}
+    assert registry._heartbeat is None
+    heartbeat.join(1)
+    assert not heartbeat.is_alive()
+
+
+class LockTarget:
+    state = "enabled"
+
+    def __init__(self, tl):
+        self.hostname = tl.hostname
+        self._lock = tl
+        self.refreshed = 0
+
+    def refresh_lock(self):
+        self.refreshed += 1
+        self._lock.load(force=True)
+
+
+def test_refresh_locks_combines_registry_and_lockfile(lockfile, registry):
+    lock(lockfile, "legacy").lock()
+    tl = lock(lockfile, registry=registry)
+
+    HostsGroup([LockTarget(tl)]).refresh_locks()
+    assert tl.locked_by() == "legacy"
+
+    lockfile.unlink()
+    registry.acquire("host", RemoteLock.from_lockfile("1600000000:other:2"))
+    target = LockTarget(tl)
+    HostsGroup([target]).refresh_locks()
+    assert tl.locked_by() == "other"
+    assert target.refreshed == 0
+
+
+def test_adopt_lock_of_crashed_session(lockfile):
+    crashed = lock(lockfile)
+    crashed.i_am_pid = 1
+    crashed.lock("updating")
+    previous = crashed.state
+
+    tl = lock(lockfile)
+    tl.adopt(previous)
+
+    assert tl.is_locked() and tl.is_mine()
+    assert tl.comment() == "updating"
+    assert lockfile.read_text().split(":")[2] == str(tl.i_am_pid)
+
+    with pytest.raises(TargetLockedError):
+        lock(lockfile).adopt(lock(lockfile, "other").state)
@@ -0,0 +1,57 @@
+from mtui.target.reboot import BootState, Reboot, parse_boot_state, unexpected_boot
+
+
+def test_parse_boot_state():
+    stdout = (
+        "0c9ae5c6-3b4b-4d8c-9a1e-2f5a0f7d3a11\n"
+        "5.14.21-150400.24.46-default\n"
+        "BOOT_IMAGE=/boot/vmlinuz root=UUID=x rootflags=subvol=@/.snapshots/42/snapshot\n"
+    )
+    assert parse_boot_state(stdout) == BootState(
+        "0c9ae5c6-3b4b-4d8c-9a1e-2f5a0f7d3a11", "5.14.21-150400.24.46-default", "42"
+    )
+
+
+def test_parse_boot_state_defaults():
+    state = parse_boot_state(
+        "id\n5.14.21-2-default\nrootflags=subvol=@/.snapshots/42/snapshot\n"
+        "vmlinuz-5.14.21-3-default\n"
+        "ID 300 gen 1 top level 266 path @/.snapshots/43/snapshot\n"
+    )
+    assert state.next_kernel == "5.14.21-3-default"
+    assert state.next_snapshot == "43"
+
+    state = parse_boot_state("id\n4.18.0-1\nBOOT_IMAGE=/vmlinuz\n\n\n")
+    assert state.next_kernel is None and state.next_snapshot is None
+
+
+def test_unexpected_boot():
+    before = BootState("a", "5.14.21-2-default", "42", "5.14.21-3-default", "43")
+
+    assert unexpected_boot(before, BootState("b", "5.14.21-3-default", "43")) == []
+    assert unexpected_boot(before, BootState("b", "5.14.21-2-default", "42")) == [
+        "kernel 5.14.21-2-default instead of 5.14.21-3-default",
+        "snapshot 42 instead of 43",
+    ]
+    assert unexpected_boot(BootState("a", "4.18.0-1", None, None, "1"), before) == []
+
+
+def test_parse_boot_state_no_snapshot():
+    state = parse_boot_state("id\n4.12.14-122.37-default\nBOOT_IMAGE=/vmlinuz\n")
+    assert state.snapshot is None
+
+
+def test_parse_boot_state_incomplete():
+    assert parse_boot_state("id\n") is None
+
+
+class T:
+    def __init__(self, hostname):
+        self.hostname = hostname
+
+
+def test_waves():
+    targets = {hn: T(hn) for hn in "edcba"}
+    waves = Reboot(targets, wave_size=2).waves()
+    assert [[t.hostname for t in w] for w in waves] == [["a", "b"], ["c", "d"], ["e"]]
+    assert len(Reboot(targets).waves()) == 1
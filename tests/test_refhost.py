@@ -0,0 +1,151 @@
+import json
+import random
+
+import pytest
+
+from mtui.refhost import Attributes, Refhosts
+
+ARCHS = ["x86_64", "s390x", "ppc64le", "aarch64"]
+PRODUCTS = ["sles", "sled", "rhel"]
+ADDONS = ["sdk", "ha", "we", "Web-Scripting"]
+MINORS = [None, "", 0, 1, "sp1", "sp2"]
+TAGS = ["kernel", "virtual", "xen"]
+
+
+def _version(rnd):
+    version = {"major": rnd.choice([11, 12, 15])}
+    minor = rnd.choice(MINORS)
+    if minor is not None:
+        version["minor"] = minor
+    return version
+
+
+def _host(rnd, n):
+    host = {"name": "host{}".format(n), "arch": rnd.choice(ARCHS)}
+    if rnd.random() < 0.9:
+        host["product"] = {"name": rnd.choice(PRODUCTS), "version": _version(rnd)}
+    if rnd.random() < 0.5:
+        host["addons"] = [
+            {"name": name, "version": _version(rnd)}
+            for name in rnd.sample(ADDONS, rnd.randint(0, 3))
+        ]
+    for tag in TAGS:
+        if rnd.random() < 0.2:
+            host[tag] = {"enabled": rnd.choice([True, False])}
+    # entries the index can't describe
+    if rnd.random() < 0.03:
+        host["arch"] = ARCHS[:2]
+    if rnd.random() < 0.03:
+        host["product"] = {"name": rnd.choice(PRODUCTS), "version": {"minor": 1}}
+    return host
+
+
+def _version_tp(rnd):
+    version = "major={}".format(rnd.choice([11, 12, 15]))
+    minor = rnd.choice(MINORS)
+    if minor is not None:
+        version += ",minor={}".format(minor)
+    return version
+
+
+def _testplatform(rnd):
+    parts = ["base={}({})".format(rnd.choice(PRODUCTS), _version_tp(rnd))]
+    parts.append("arch=[{}]".format(",".join(rnd.sample(ARCHS, rnd.randint(1, 3)))))
+    for name in rnd.sample(ADDONS, rnd.randint(0, 2)):
+        parts.append("addon={}({})".format(name, _version_tp(rnd)))
+    if rnd.random() < 0.3:
+        parts.append("tags=({})".format(rnd.choice(TAGS)))
+    rnd.shuffle(parts)
+    return ";".join(parts)
+
+
+def _outcome(function, *args):
+    try:
+        return function(*args)
+    except Exception as e:
+        return type(e)
+
+
+def _scan(refhosts, attributes):
+    results = []
+    for attribute in attributes:
+        host = refhosts._scan(refhosts.location, attribute)
+        if host == [] and refhosts.location != refhosts._default_location:
+            host = refhosts._scan(refhosts._default_location, attribute)
+        results += host
+    return results
+
+
+@pytest.mark.parametrize("location", ["default", "prague"])
+def test_search_matches_scan(tmp_path, location):
+    rnd = random.Random(42)
+    hosts = [_host(rnd, n) for n in range(300)]
+    data = {"default": hosts[:200], "prague": hosts[200:]}
+    path = tmp_path / "refhosts.yml"
+    path.write_text(json.dumps(data))
+    refhosts = Refhosts(str(path), location)
+
+    queries = [[Attributes()]]
+    queries += [Attributes.from_testplatform(_testplatform(rnd)) for _ in range(500)]
+    matched = 0
+    for attributes in queries:
+        expected = _outcome(_scan, refhosts, attributes)
+        assert _outcome(refhosts.search, attributes) == expected
+        matched += isinstance(expected, list) and bool(expected)
+    assert matched > 50
+
+
+def test_search(tmp_path):
+    data = {
+        "default": [
+            {
+                "name": "a",
+                "arch": "x86_64",
+                "product": {"name": "sles", "version": {"major": 12, "minor": "sp1"}},
+                "addons": [{"name": "sdk", "version": {"major": 12}}],
+            },
+            {
+                "name": "b",
+                "arch": "x86_64",
+                "product": {"name": "sles", "version": {"major": 12, "minor": "sp1"}},
+                "addons": [
+                    {"name": "sdk", "version": {"major": 12, "minor": "sp1"}},
+                ],
+                "kernel": {"enabled": True},
+            },
+            {
+                "name": "c",
+                "arch": "s390x",
+                "product": {"name": "sles", "version": {"major": 12, "minor": "sp1"}},
+            },
+        ],
+        "prague": [
+            {
+                "name": "d",
+                "arch": "s390x",
+                "product": {"name": "sles", "version": {"major": 15}},
+            }
+        ],
+    }
+    path = tmp_path / "refhosts.yml"
+    path.write_text(json.dumps(data))
+    refhosts = Refhosts(str(path), "prague")
+
+    def search(tp):
+        return refhosts.search(Attributes.from_testplatform(tp))
+
+    assert search("base=sles(major=12,minor=sp1);arch=[x86_64,s390x]") == [
+        "a",
+        "b",
+        "c",
+    ]
+    assert search("base=sles(major=12);arch=[x86_64];addon=sdk(major=12)") == [
+        "a",
+        "b",
+    ]
+    assert search("base=sles(major=12);arch=[x86_64];addon=sdk(major=12,minor=)") == [
+        "a"
+    ]
+    assert search("base=sles(major=12);arch=[x86_64];tags=(kernel)") == ["b"]
+    assert search("base=sles(major=15);arch=[s390x,x86_64]") == ["d"]
+    assert search("base=sles(major=12,minor=sp2);arch=[x86_64]") == []
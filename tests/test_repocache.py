@@ -0,0 +1,119 @@
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from types import SimpleNamespace
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from paramiko import SSHException
+import pytest
+
+from mtui.connection import Connection
+from mtui.target.repocache import RepoCache, cacheable
+
+
+def test_cacheable():
+    assert cacheable("/SUSE:/Maintenance:/1/x86_64/foo-1.0-1.x86_64.rpm")
+    assert cacheable("/SUSE:/Maintenance:/1/repodata/0123-primary.xml.gz")
+    assert not cacheable("/SUSE:/Maintenance:/1/repodata/repomd.xml")
+    assert not cacheable("/SUSE:/Maintenance:/1/repodata/repomd.xml.asc")
+    assert not cacheable("/SUSE:/Maintenance:/1/")
+
+
+@pytest.fixture
+def upstream(tmp_path):
+    root = tmp_path / "upstream"
+    (root / "repo" / "repodata").mkdir(parents=True)
+    (root / "repo" / "foo.rpm").write_bytes(b"x" * 1000)
+    (root / "repo" / "repodata" / "repomd.xml").write_text("<repomd/>")
+
+    requests = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def log_message(self, *a):
+            requests.append(self.path)
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(Handler, directory=str(root))
+    )
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:{}/".format(server.server_address[1]), requests
+    server.shutdown()
+
+
+def get(cache, path):
+    with urlopen("http://127.0.0.1:{}{}".format(cache.port, path)) as r:
+        return r.read()
+
+
+def test_repo_cache(tmp_path, upstream):
+    url, requests = upstream
+    cache = RepoCache(url, tmp_path / "cache")
+
+    for _ in range(3):
+        assert get(cache, "/repo/foo.rpm") == b"x" * 1000
+        assert get(cache, "/repo/repodata/repomd.xml") == b"<repomd/>"
+
+    assert requests.count("/repo/foo.rpm") == 1
+    assert requests.count("/repo/repodata/repomd.xml") == 3
+    assert cache.stats() == (2, 1, 2000)
+    assert "67% hit ratio" in cache.summary()
+
+
+def test_repo_cache_concurrent_fetch(tmp_path, upstream):
+    url, requests = upstream
+    cache = RepoCache(url, tmp_path / "cache")
+
+    threads = [Thread(target=cache.fetch, args=("/repo/foo.rpm",)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert requests.count("/repo/foo.rpm") == 1
+    assert cache.stats() == (7, 1, 7000)
+    assert cache._fetching == {}
+
+
+def test_repo_cache_errors(tmp_path, upstream):
+    cache = RepoCache(upstream[0], tmp_path / "cache")
+
+    with pytest.raises(HTTPError) as e:
+        get(cache, "/repo/missing.rpm")
+    assert e.value.code == 404
+    with pytest.raises(HTTPError) as e:
+        get(cache, "/repo/../../etc/foo.rpm")
+    assert e.value.code in (400, 404)
+    assert cache.stats() == (0, 0, 0)
+
+
+class FakeTransport:
+    def __init__(self, taken=()):
+        self.taken = set(taken)
+        self.next = 40000
+
+    def request_port_forward(self, address, port, handler):
+        if port in self.taken:
+            raise SSHException("TCP forwarding request denied")
+        if not port:
+            self.next += 1
+            return self.next
+        return port
+
+
+def connection(transport):
+    conn = Connection.__new__(Connection)
+    conn.hostname = "host"
+    conn.forwards = {}
+    conn.client = SimpleNamespace(get_transport=lambda: transport)
+    return conn
+
+
+def test_forwarded_port_kept_across_connections():
+    conn = connection(FakeTransport(taken=[8123]))
+    port = conn.forward_remote(8123)
+    assert port == 40001
+    assert conn.forward_remote(8123) == port
+
+    # new connection, e.g. after a reconnect, binds the same remote port
+    assert connection(FakeTransport()).forward_remote(8123) == port
@@ -1,4 +1,4 @@
-from mtui.types.rpmver import RPMVersion
+from mtui.types.rpmver import RPMVersion, rpmvercmp
 import pytest
 
 
@@ -59,3 +59,63 @@ def test_version_none():
 )
 def test_version_str(version, s):
     assert str(RPMVersion(version)) == s
+
+
+@pytest.mark.parametrize(
+    "lower,higher",
+    [
+        ("1.0~rc1", "1.0"),
+        ("1.0", "1.0^git1"),
+        ("1.0^git1", "1.0.1"),
+        ("1.0a", "1.0.1"),
+        ("1.0", "1.0a"),
+        ("1.9", "1.10"),
+    ],
+)
+def test_rpmvercmp(lower, higher):
+    assert rpmvercmp(lower, higher) == -1
+    assert rpmvercmp(higher, lower) == 1
+
+
+@pytest.mark.parametrize("a,b", [("1.01", "1.1"), ("1.0", "1_0"), ("1.0.", "1.0")])
+def test_rpmvercmp_equal(a, b):
+    assert rpmvercmp(a, b) == 0
+    assert hash(RPMVersion(a)) == hash(RPMVersion(b))
+
+
+def test_version_arch_suffix():
+    assert RPMVersion("1.2-3.x86_64") == RPMVersion("1.2-3")
+    assert str(RPMVersion("1.2-3.noarch")) == "1.2-3"
+
+
+def test_version_sort():
+    versions = ["1.10-1", "1.9-2", "1.9-10", "1.9~rc1-1"]
+    assert sorted(versions, key=RPMVersion) == [
+        "1.9~rc1-1",
+        "1.9-2",
+        "1.9-10",
+        "1.10-1",
+    ]
+
+
+def test_matches_label_compare():
+    rpm = pytest.importorskip("rpm")
+    hypothesis = pytest.importorskip("hypothesis")
+    st = hypothesis.strategies
+
+    segment = st.one_of(
+        st.integers(0, 1000).map(str),
+        st.text("abcz", min_size=1, max_size=3),
+        st.sampled_from([".", "_", "+", "~", "^"]),
+    )
+    version = st.lists(segment, min_size=1, max_size=6).map("".join)
+    label = st.tuples(version, version)
+
+    @hypothesis.settings(max_examples=500, deadline=None)
+    @hypothesis.given(label, label)
+    def check(a, b):
+        expected = rpm.labelCompare(("1",) + a, ("1",) + b)
+        x, y = RPMVersion("-".join(a)), RPMVersion("-".join(b))
+        assert (x > y) - (x < y) == expected
+
+    check()
@@ -0,0 +1,88 @@
+from mtui.target import snapshot
+from mtui.target.reboot import RebootResult
+from mtui.target.snapshot import Rollback, create_snapshots, parse_snapshot
+
+
+def test_parse_snapshot():
+    assert parse_snapshot("42\n") == 42
+    assert parse_snapshot("") is None
+    assert parse_snapshot("snapper: command not found\n") is None
+
+
+class T:
+    def __init__(self, hostname, stdout, exitcode=0):
+        self.hostname = hostname
+        self.stdout = stdout
+        self.exitcode = exitcode
+        self.snapshot = None
+        self.commands = []
+        self.locked = False
+        self.invalidated = False
+
+    def run(self, command):
+        self.commands.append(command)
+
+    def lastout(self):
+        return self.stdout
+
+    def lasterr(self):
+        return ""
+
+    def lastexit(self):
+        return self.exitcode
+
+    def lock(self):
+        self.locked = True
+
+    def unlock(self):
+        self.locked = False
+
+    def invalidate_versions(self):
+        self.invalidated = True
+
+
+class Targets(dict):
+    def run(self, command):
+        for hn, t in self.items():
+            t.run(command[hn] if isinstance(command, dict) else command)
+
+    def select(self, hosts):
+        return Targets((hn, t) for hn, t in self.items() if hn in hosts)
+
+
+def test_create_snapshots():
+    targets = Targets(btrfs=T("btrfs", "17\n"), ext4=T("ext4", "", 1))
+
+    assert create_snapshots(targets, "before update") == {"btrfs": 17}
+    assert targets["btrfs"].snapshot == 17
+    assert targets["ext4"].snapshot is None
+    assert "'before update'" in targets["ext4"].commands[0]
+
+
+def test_rollback(monkeypatch):
+    rebooted = []
+
+    class Reboot:
+        def __init__(self, targets, timeout):
+            rebooted.extend(targets)
+
+        def run(self):
+            return {hn: RebootResult(hn, None, None, 1, None) for hn in rebooted}
+
+    monkeypatch.setattr(snapshot, "Reboot", Reboot)
+    targets = Targets(a=T("a", ""), b=T("b", ""), c=T("c", "", 1))
+    targets["a"].snapshot = 3
+    targets["c"].snapshot = 5
+
+    assert Rollback(targets, "rollback").run() == ["a"]
+    assert rebooted == ["a"]
+    assert targets["a"].commands == [
+        "snapper --no-dbus rollback --description rollback 3"
+    ]
+    assert targets["a"].snapshot is None and targets["a"].invalidated
+    assert targets["b"].commands == []
+    assert targets["c"].snapshot == 5 and not targets["c"].locked
+
+
+def test_rollback_without_snapshots():
+    assert Rollback(Targets(a=T("a", "")), "rollback").run() == []
@@ -0,0 +1,213 @@
+from xml.etree.ElementTree import ParseError
+
+import pytest
+
+from mtui.target.parsers import (
+    MARKER,
+    gather_facts,
+    parse_facts,
+    parse_pkgdb,
+    system_from_facts,
+)
+from mtui.target.parsers.zypper import (
+    Message,
+    Patch,
+    Progress,
+    Prompt,
+    Solvable,
+    ZypperXMLParser,
+    installed_versions,
+    parse_patches,
+    parse_search,
+    patches_of,
+)
+from mtui.types import Product
+
+PROD = """<?xml version="1.0" encoding="UTF-8"?>
+<product schemeversion="0">
+  <vendor>SUSE</vendor>
+  <name>{name}</name>
+  <version>{version}</version>
+  <baseversion>{base}</baseversion>
+  <patchlevel>{sp}</patchlevel>
+  <arch>x86_64</arch>
+</product>
+"""
+
+SLES = PROD.format(name="SLES", version="15.3", base="15", sp="3")
+BASESYSTEM = PROD.format(
+    name="sle-module-basesystem", version="15.3", base="15", sp="3"
+)
+
+
+def blob(*sections):
+    return "".join(
+        "{}{}\n{}".format(MARKER, name, content) for name, content in sections
+    )
+
+
+SLES_BLOB = blob(
+    ("kernel", "5.3.18-59.37-default\n"),
+    ("baseproduct", "SLES.prod\n"),
+    ("product:SLES.prod", SLES + "\n"),
+    ("product:sle-module-basesystem.prod", BASESYSTEM + "\n"),
+    ("os-release", 'NAME="SLES"\nID="sles"\nVERSION_ID="15.3"\n'),
+    ("lock", "1600000000:tester:42:exclusive\n"),
+)
+
+
+def test_parse_facts_sections():
+    sections = parse_facts(SLES_BLOB)
+    assert sections["kernel"] == ["5.3.18-59.37-default\n"]
+    assert "product:SLES.prod" in sections
+
+
+def test_system_from_facts_suse():
+    system = system_from_facts(parse_facts(SLES_BLOB))
+    assert system.get_base() == Product("SLES", "15-SP3", "x86_64")
+    assert system.get_addons() == {Product("sle-module-basesystem", "15-SP3", "x86_64")}
+
+
+def test_system_from_facts_os_release():
+    sections = parse_facts(
+        blob(("kernel", "5.4\n"), ("os-release", 'ID="ubuntu"\nVERSION_ID="20.04"\n'))
+    )
+    assert system_from_facts(sections).get_base() == Product(
+        "ubuntu", "20.04", "x86_64"
+    )
+
+
+def test_system_from_facts_old_rhel():
+    sections = parse_facts(blob(("kernel", "2.6\n")))
+    assert system_from_facts(sections).get_base() == Product("rhel", "6", "x86_64")
+
+
+class FakeConnection:
+    hostname = "fake"
+
+    def __init__(self, stdout):
+        self._stdout = stdout
+        self.commands = []
+
+    def execute(self, command, lock=None, interactive=True):
+        self.commands.append(command)
+        return 0, self._stdout, ""
+
+
+def test_gather_facts():
+    conn = FakeConnection(SLES_BLOB)
+    facts = gather_facts(conn, "/var/lock/mtui.lock", '{"event":"connect"}')
+
+    assert len(conn.commands) == 1
+    assert '\'{"event":"connect"}\' >> "$f"' in conn.commands[0]
+    assert facts.kernel == "5.3.18-59.37-default"
+    assert facts.lock == "1600000000:tester:42:exclusive"
+    assert facts.system.get_base().name == "SLES"
+
+
+def test_gather_facts_state_only():
+    conn = FakeConnection(SLES_BLOB)
+    facts = gather_facts(conn, "/var/lock/mtui.lock", products=False)
+
+    assert "products.d/*.prod" not in conn.commands[0]
+    assert facts.system is None
+
+
+def test_gather_facts_garbage():
+    assert gather_facts(FakeConnection("bash: error\n"), "/var/lock/mtui.lock") is None
+
+
+def test_parse_pkgdb():
+    out = "{m}pkgdb /b 2 2\na 1.0-1\n{m}pkgdb /a 1 1\n".format(m=MARKER)
+
+    assert parse_pkgdb(out) == "{m}pkgdb /a 1 1\n{m}pkgdb /b 2 2".format(m=MARKER)
+    assert parse_pkgdb("a 1.0-1\n") == ""
+
+
+PATCHES = """<?xml version='1.0'?>
+<stream>
+<update-status version="0.6">
+<update-list>
+<update name="SUSE-2021-1234" edition="1" arch="noarch" status="needed" category="security" kind="patch">
+<summary>Security update for foo</summary>
+<source url="http://download.suse.de/ibs/SUSE:/Maintenance:/1234/" alias="issue-SLES:15-SP3:p=1234"/>
+</update>
+<update name="SUSE-2021-999" edition="1" arch="noarch" status="applied" category="recommended" kind="patch">
+<source url="http://example.com/" alias="issue-SLES:15-SP3:p=12345"/>
+</update>
+<update name="foo" edition="1.1" arch="x86_64" kind="package">
+<source url="http://example.com/" alias="issue-SLES:15-SP3:p=1234"/>
+</update>
+</update-list>
+</update-status>
+</stream>
+"""
+
+
+def test_parse_patches():
+    patches = parse_patches("Loading repository data...\n" + PATCHES)
+    assert [p.name for p in patches] == ["SUSE-2021-1234", "SUSE-2021-999"]
+    assert patches[0] == Patch(
+        "SUSE-2021-1234", "needed", "security", "issue-SLES:15-SP3:p=1234"
+    )
+
+
+def test_patches_of_repository():
+    patches = patches_of(parse_patches(PATCHES), r":p=1234\b")
+    assert [p.name for p in patches] == ["SUSE-2021-1234"]
+
+
+def test_parse_patches_invalid():
+    with pytest.raises(ParseError):
+        parse_patches("Repository 'foo' is invalid.")
+
+
+def test_parse_search():
+    solvables = parse_search(
+        "<?xml version='1.0'?><stream><search-result><solvable-list>"
+        '<solvable status="other-version" name="foo" kind="package"'
+        ' edition="1.0-1" arch="noarch" repository="Pool"/>'
+        "</solvable-list></search-result></stream>"
+    )
+    assert solvables == [Solvable("foo", "1.0-1", "noarch", "other-version", "Pool")]
+
+
+def test_installed_versions():
+    solvables = [
+        Solvable("foo", "1.1-1", "noarch", "installed", "(System Packages)"),
+        Solvable("foo", "1.1-1", "noarch", "installed", "Updates"),
+        Solvable("foo", "1.0-1", "noarch", "other-version", "Pool"),
+        Solvable("bar", "2.0-1", "noarch", "not-installed", "Pool"),
+    ]
+    assert installed_versions(solvables) == {"foo": ("1.0-1", "1.1-1")}
+
+
+def test_zypper_xml_parser_chunks():
+    output = (
+        "Refreshing service 'foo'.\n"
+        "<?xml version='1.0'?>\n<stream>\n"
+        '<progress id="3" name="Downloading: bär" value="50"/>\n'
+        '<progress id="3" name="Downloading: bär" value="100" done="1"/>\n'
+        '<message type="error">File conflict</message>\n'
+        '<prompt id="8"><text>Continue?</text>'
+        '<option value="y"/><option value="n"/></prompt>\n'
+        "</stream>\n"
+    ).encode()
+    parser = ZypperXMLParser()
+    for i in range(0, len(output), 7):
+        parser.feed(output[i : i + 7])
+    parser.close()
+
+    assert parser.events(Progress)[-1] == Progress("3", "Downloading: bär", "100", True)
+    assert parser.events(Message) == [Message("error", "File conflict")]
+    assert parser.events(Prompt) == [Prompt("8", "Continue?", ["y", "n"])]
+    assert parser.errors() == ["File conflict"]
+    assert parser.prompt() == Prompt("8", "Continue?", ["y", "n"])
+
+
+def test_zypper_xml_parser_truncated():
+    parser = ZypperXMLParser()
+    parser.feed(b"<?xml version='1.0'?><stream><message type='info'>x</message>")
+    assert parser.events(Message) == [Message("info", "x")]
+    with pytest.raises(ParseError):
+        parser.close()
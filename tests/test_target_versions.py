@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+from mtui.target import Target
+from mtui.target.parsers import MARKER, PKGDB_COMMAND
+from mtui.types import Product
+from mtui.types.systems import System
+
+
+class FakeConnection:
+    def __init__(self):
+        self.pkgdb = "{}pkgdb /var/lib/rpm/Packages 1600000000 1024\n".format(MARKER)
+        self.installed = "a 1.0-1\n"
+        self.commands = []
+        self.stdout = ""
+        self.stderr = ""
+
+    def execute(self, command, lock=None):
+        self.commands.append(command)
+        stdout = self.pkgdb
+        if command != PKGDB_COMMAND:
+            stdout += self.installed + "package b is not installed\n"
+        return 0, stdout, ""
+
+    def run(self, command, lock=None, feed=None):
+        exitcode, self.stdout, self.stderr = self.execute(command, lock)
+        return exitcode
+
+
+def target():
+    t = Target(SimpleNamespace(facts_cache=False, hostlog_limit=0), "host")
+    t.connection = FakeConnection()
+    t.system = System(Product("SLES", "15-SP3", "x86_64"))
+    return t
+
+
+def test_versions_cached_until_pkgdb_changes():
+    t = target()
+
+    first = t.query_package_versions(["a", "b"])
+    assert str(first["a"]) == "1.0-1"
+    assert first["b"] is None
+
+    assert t.query_package_versions(["a"]) == {"a": first["a"]}
+    assert t.connection.commands[-1] == PKGDB_COMMAND
+    assert len(t.out) == 1
+
+    t.connection.pkgdb = t.connection.pkgdb.replace("1024", "2048")
+    t.connection.installed = "a 1.1-1\n"
+    assert str(t.query_package_versions(["a"])["a"]) == "1.1-1"
+    assert len(t.out) == 2
+
+
+def test_invalidate_versions():
+    t = target()
+    t.query_package_versions(["a"])
+    t.invalidate_versions()
+    t.query_package_versions(["a"])
+
+    assert PKGDB_COMMAND not in t.connection.commands
+    assert len(t.out) == 2
+
+
+def test_add_packages():
+    t = target()
+    t._pkgs = {"15-SP3": {"a": "1.0-1", "c": "3.0-1"}, "12": {"x": "1"}}
+    t.packages = t._parse_packages()
+    t.packages["a"].before = "0.9-1"
+
+    t.add_packages({"15-SP3": {"a": "1.1-1", "b": "2.0-1", "c": "2.9-1"}})
+
+    assert sorted(t.packages) == ["a", "b", "c"]
+    assert t.packages["a"].required == "1.1-1"
+    assert t.packages["a"].before == "0.9-1"
+    assert t.packages["b"].required == "2.0-1"
+    assert t.packages["c"].required == "3.0-1"
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+from mtui.template.testreport import TestReport, group_versions
+
+SEARCH = """<?xml version='1.0'?>
+<stream><search-result version="0.0"><solvable-list>
+<solvable status="installed" name="foo" kind="package" edition="{}" arch="noarch" repository="Updates"/>
+<solvable status="other-version" name="foo" kind="package" edition="1.0-1" arch="noarch" repository="Pool"/>
+<solvable status="installed" name="bar" kind="package" edition="2.0-1" arch="noarch" repository="Pool"/>
+</solvable-list></search-result></stream>
+"""
+
+
+class FakeTargets(dict):
+    def run(self, command, feed=None):
+        self.command = command
+        for hn, output in self.items():
+            feed[hn](output.encode())
+
+
+def test_group_versions():
+    grouped = group_versions(
+        {
+            "a": {"foo": ("1.0", "1.1"), "bar": ("2.0",)},
+            "b": {"foo": ("1.0", "1.1"), "bar": ("2.1",)},
+        }
+    )
+    assert grouped == {
+        ("a", "b"): [("foo", ("1.0", "1.1"))],
+        ("a",): [("bar", ("2.0",))],
+        ("b",): [("bar", ("2.1",))],
+    }
+
+
+def test_list_versions_single_query():
+    targets = FakeTargets(a=SEARCH.format("1.1-1"), b=SEARCH.format("1.2-1"), c="")
+    report = SimpleNamespace(get_package_list=lambda: ["foo", "bar"])
+
+    grouped = TestReport.list_versions(
+        report, lambda targets, grouped: grouped, targets, []
+    )
+
+    assert targets.command.endswith("-t package bar foo")
+    assert grouped == {
+        ("a",): [("foo", ("1.0-1", "1.1-1"))],
+        ("a", "b"): [("bar", ("2.0-1",))],
+        ("b",): [("foo", ("1.0-1", "1.2-1"))],
+    }
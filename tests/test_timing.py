@@ -0,0 +1,110 @@
+import sqlite3
+from time import sleep
+
+from mtui.target.timing import (
+    PhaseTimer,
+    Timings,
+    expected_table,
+    format_duration,
+)
+from mtui.types.hostlog import HostLog
+
+
+def test_timings_expected(tmp_path):
+    timings = Timings(tmp_path / "timings.db")
+    for duration in (10, 30, 20):
+        timings.record("a", "update", "prepare", duration)
+        timings.record("a", "update", "install", duration * 2)
+    timings.record("b", "update", "install", 5)
+    timings.record("b", "downgrade", "install", 100)
+
+    phases, expected = timings.expected(["a", "b", "c"], "update")
+
+    assert phases == ["prepare", "install"]
+    assert expected == {"a": {"prepare": 20, "install": 40}, "b": {"install": 5}}
+    assert timings.expected(["a"], "update", runs=1)[1]["a"]["prepare"] == 20
+    assert timings.expected(["c"], "update") == ([], {})
+
+
+def test_timings_sum_phases_per_run(tmp_path):
+    timings = Timings(tmp_path / "timings.db")
+    for run, durations in [("r1", (10, 20)), ("r2", (5, 5, 5)), ("r3", (40,))]:
+        for duration in durations:
+            timings.record("a", "update", "query", duration, run)
+
+    assert timings.expected(["a"], "update")[1] == {"a": {"query": 30}}
+    assert timings.expected(["a"], "update", runs=2)[1]["a"]["query"] == 27.5
+
+
+def test_timings_upgrades_database(tmp_path):
+    path = tmp_path / "timings.db"
+    db = sqlite3.connect(str(path))
+    db.execute(
+        "CREATE TABLE spans (id INTEGER PRIMARY KEY, ts REAL, hostname TEXT,"
+        " action TEXT, phase TEXT, duration REAL)"
+    )
+    db.execute("INSERT INTO spans VALUES (1, 0, 'a', 'update', 'install', 10)")
+    db.execute("INSERT INTO spans VALUES (2, 0, 'a', 'update', 'install', 20)")
+    db.commit()
+    db.close()
+
+    timings = Timings(path)
+    timings.record("a", "update", "install", 100, "r1")
+
+    assert timings.expected(["a"], "update")[1] == {"a": {"install": 20}}
+
+
+class FakeTarget:
+    def __init__(self):
+        self.out = HostLog()
+
+    def run(self, runtime):
+        self.out.append("true", "", "", 0, runtime)
+
+
+def test_phase_timer(tmp_path):
+    targets = {"a": FakeTarget(), "b": FakeTarget()}
+    targets["a"].run(100)
+    timings = Timings(tmp_path / "timings.db")
+    timer = PhaseTimer(targets, "update", timings)
+
+    with timer("install"):
+        targets["a"].run(2)
+        targets["a"].run(3)
+    with timer("cleanup", {"a": targets["a"]}):
+        targets["a"].run(1)
+
+    assert timer.spans[0] == ("a", "install", 5)
+    assert timer.spans[1][:2] == ("b", "install")
+    assert timer.spans[1][2] < 1
+    assert timer.spans[2] == ("a", "cleanup", 1)
+    assert timings.expected(["a"], "update")[0] == ["install", "cleanup"]
+
+    with timer("compare", local=True):
+        targets["a"].out.append("compare", "", "", 0, 0)
+        sleep(0.1)
+    assert timer.spans[3][:2] == ("a", "compare")
+    assert timer.spans[3][2] >= 0.1
+
+    with timer("install"):
+        targets["a"].run(4)
+    assert timings.expected(["a"], "update")[1]["a"]["install"] == 9
+
+
+def test_expected_table(tmp_path):
+    timings = Timings(tmp_path / "timings.db")
+    for hn, duration in [("fast", 10), ("slow", 90), ("other", 12)]:
+        timings.record(hn, "update", "install", duration)
+
+    table = expected_table(timings, ["fast", "slow", "other", "new"], "update")
+
+    assert [x.split()[0] for x in table] == ["host", "slow", "other", "fast", "no"]
+    assert "1m30s" in table[1]
+    assert table[-1] == "no past runs on new"
+    assert expected_table(timings, ["new"], "update") == []
+
+
+def test_format_duration():
+    assert format_duration(0.4) == "0s"
+    assert format_duration(59.6) == "1m00s"
+    assert format_duration(125) == "2m05s"
@@ -1,4 +1,5 @@
 from mtui.types import obs
+from mtui.types.hostlog import HostLog
 
 from random import randint
 import pytest
@@ -81,3 +82,25 @@ def test_cmp():
 
     assert obs.RequestReviewID(rrid_1) == obs.RequestReviewID(rrid_1)
     assert obs.RequestReviewID(rrid_1) != obs.RequestReviewID(rrid_2)
+
+
+def test_hostlog_compresses_cold_entries():
+    log = HostLog(hot=2, threshold=10)
+    for i in range(5):
+        log.append(["cmd {}".format(i), "out {}\n".format(i) * 10, b"err", i, 0.0015])
+
+    assert len(log) == 5
+    assert sum(1 for x in log._entries if x[4] is not None) == 3
+    assert log[0] == ("cmd 0", "out 0\n" * 10, "err", 0, 0.0015)
+    assert log[-1].stdout == "out 4\n" * 10
+    assert [x.command for x in log[1:3]] == ["cmd 1", "cmd 2"]
+
+
+def test_hostlog_maxlen():
+    log = HostLog(maxlen=3)
+    for i in range(5):
+        log.append("cmd {}".format(i), "", "", 0, 0)
+
+    assert [x.command for x in log] == ["cmd 2", "cmd 3", "cmd 4"]
+    with pytest.raises(ValueError):
+        log.append(["cmd"])
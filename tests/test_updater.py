@@ -0,0 +1,224 @@
+import os
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from mtui.target.actions import UpdateError
+from mtui.types.hostlog import HostLog
+from mtui.updater import (
+    RedHatPrepare,
+    ZypperDowngrade,
+    ZypperOBSUpdate,
+    ZypperPrepare,
+)
+
+FAKE_RPM = """shift 3
+for p in "$@"; do
+  case "$p" in
+    missing) echo "package $p is not installed" ;;
+    *) echo "$p" ;;
+  esac
+done
+"""
+
+
+def test_zypper_prepare_single_transaction():
+    prepare = ZypperPrepare({}, ["a", "b", "sles-branding-upstream"], None)
+
+    assert prepare.transaction == "zypper -n in -y -l  a b"
+    assert prepare.commands == ["zypper -n in -y -l  a", "zypper -n in -y -l  b"]
+
+
+def test_redhat_prepare_single_transaction():
+    prepare = RedHatPrepare({}, ["a", "b"], None, testing=True)
+
+    assert prepare.transaction == "yum -y  install a b"
+    assert len(prepare.commands) == 2
+
+
+def test_prepare_installed_only(tmp_path):
+    for name, script in [("rpm", FAKE_RPM), ("zypper", 'echo "zypper $*"\n')]:
+        (tmp_path / name).write_text("#!/bin/sh\n" + script)
+        (tmp_path / name).chmod(0o755)
+
+    def run(packages):
+        command = ZypperPrepare({}, packages, None, installed_only=True).transaction
+        env = dict(os.environ, PATH="{}:{}".format(tmp_path, os.environ["PATH"]))
+        p = subprocess.run(
+            ["sh", "-c", command], capture_output=True, text=True, env=env
+        )
+        assert p.returncode == 0
+        return p.stdout
+
+    assert run(["b", "missing", "a"]) == "zypper -n in -y -l a b\n"
+    assert run(["missing"]) == ""
+
+
+PATCHES = """<?xml version='1.0'?>
+<stream><update-status version="0.6"><update-list>
+<update name="SUSE-2021-1" status="{}" category="security" kind="patch">
+<source url="http://example.com/" alias="issue-SLES:15-SP3:p=1234"/>
+</update>
+<update name="SUSE-2021-2" status="needed" category="security" kind="patch">
+<source url="http://example.com/" alias="issue-SLES:15-SP3:p=12345"/>
+</update>
+</update-list></update-status></stream>
+"""
+
+INSTALL = """<?xml version='1.0'?>
+<stream>
+<progress id="1" name="Installing: foo-1.1" value="100" done="1"/>
+<message type="info">Additional rpm output:
+warning: foo.conf created as foo.conf.rpmnew</message>
+</stream>
+"""
+
+
+class FakeTarget:
+    def __init__(self, hostname, status):
+        self.hostname = hostname
+        self.status = status
+        self.log = []
+        self.out = HostLog()
+
+    def run(self, command, lock=None, feed=None):
+        self.log.append(command)
+        self.out.append(command, "", "", 0, 0.1)
+        self.stdout = ""
+        if "--xmlout patches" in command:
+            self.stdout = PATCHES.format(self.status)
+        elif "-t patch" in command:
+            self.status = "applied"
+            self.stdout = INSTALL
+        if feed:
+            feed(self.stdout.encode())
+
+    def lastin(self):
+        return self.log[-1]
+
+    def lastout(self):
+        return self.stdout
+
+    def lasterr(self):
+        return ""
+
+    def lastexit(self):
+        return 0
+
+
+class FakeTargets(dict):
+    def run(self, command, feed=None):
+        for hn, t in self.items():
+            t.run(
+                command[hn] if isinstance(command, dict) else command,
+                feed=(feed or {}).get(hn),
+            )
+
+    def select(self, hosts):
+        return FakeTargets((hn, t) for hn, t in self.items() if hn in hosts)
+
+
+def test_zypper_obs_update_single_install():
+    targets = FakeTargets(a=FakeTarget("a", "needed"), b=FakeTarget("b", "applied"))
+    testreport = SimpleNamespace(rrids=[SimpleNamespace(maintenance_id=1234)])
+
+    ZypperOBSUpdate(targets, testreport)._run_commands()
+
+    installs = [c for c in targets["a"].log if "-t patch" in c]
+    assert installs == [
+        "zypper -n --xmlout --pkg-cache-dir /var/cache/mtui/packages install -l -y"
+        " -t patch SUSE-2021-1"
+    ]
+    assert not [c for c in targets["b"].log if "-t patch" in c]
+    assert targets["a"].log[-1].startswith("zypper -n lr |")
+
+
+def test_zypper_obs_update_install_error():
+    targets = FakeTargets(a=FakeTarget("a", "needed"))
+    testreport = SimpleNamespace(rrids=[SimpleNamespace(maintenance_id=1234)])
+    targets["a"].run = lambda command, lock=None, feed=None: feed(
+        b"<?xml version='1.0'?><stream>"
+        b'<prompt id="1"><text>Problem: nothing provides bar</text>'
+        b'<option value="1"/><option value="c"/></prompt></stream>'
+    )
+    targets["a"].lastexit = lambda: 4
+    targets["a"].log = ["zypper install"]
+
+    with pytest.raises(UpdateError):
+        ZypperOBSUpdate(targets, testreport).check_events(
+            targets["a"], ZypperOBSUpdate.run_xml(targets, "zypper install")["a"]
+        )
+
+
+def test_zypper_obs_update_answered_prompt():
+    targets = FakeTargets(a=FakeTarget("a", "needed"))
+    testreport = SimpleNamespace(rrids=[SimpleNamespace(maintenance_id=1234)])
+    targets["a"].run = lambda command, lock=None, feed=None: feed(
+        b"<?xml version='1.0'?><stream>"
+        b'<prompt id="1"><text>Continue?</text>'
+        b'<option value="y"/><option value="n"/></prompt></stream>'
+    )
+    targets["a"].log = ["zypper install"]
+
+    for exitcode in (0, 102, 106):
+        targets["a"].lastexit = lambda: exitcode
+        ZypperOBSUpdate(targets, testreport).check_events(
+            targets["a"], ZypperOBSUpdate.run_xml(targets, "zypper install")["a"]
+        )
+
+    targets["a"].lastexit = lambda: 8
+    with pytest.raises(UpdateError):
+        ZypperOBSUpdate(targets, testreport).check_events(
+            targets["a"], ZypperOBSUpdate.run_xml(targets, "zypper install")["a"]
+        )
+
+
+class FakeConnection:
+    def __init__(self, status):
+        self.status = status
+        self.log = []
+
+    def execute(self, command, feed=None, interactive=True):
+        # prefetching runs in background and must never ask the user
+        assert not interactive
+        self.log.append(command)
+        if "--xmlout patches" in command:
+            feed(PATCHES.format(self.status).encode())
+            return 0, PATCHES.format(self.status), ""
+        if "zypper -n ar" in command:
+            return 0, "issue-SLES:15-SP3:p=1234\n", ""
+        return 0, "", ""
+
+
+def test_zypper_obs_update_prefetch():
+    target = FakeTarget("a", "needed")
+    target.connection = FakeConnection("needed")
+    target.issue_repos = lambda repos, rrid: [("issue-SLES:15-SP3:p=1234", "http://r")]
+    rrid = SimpleNamespace(maintenance_id=1234)
+    testreport = SimpleNamespace(rrid=rrid, rrids=[rrid], update_repos={})
+
+    ZypperOBSUpdate(FakeTargets(a=target), testreport)._prefetch(target)
+
+    log = target.connection.log
+    assert "--download-only -l -y -t patch SUSE-2021-1" in log[-2]
+    assert log[-1] == "zypper -n rr issue-SLES:15-SP3:p=1234"
+    assert target.log == []
+
+
+SEARCH = """<?xml version='1.0'?>
+<stream><search-result version="0.0"><solvable-list>
+<solvable status="installed" name="foo" kind="package" edition="1.1-2" arch="x86_64" repository="(System Packages)"/>
+<solvable status="installed" name="foo" kind="package" edition="1.1-2" arch="x86_64" repository="SLES-Updates"/>
+<solvable status="other-version" name="foo" kind="package" edition="1.0-1" arch="x86_64" repository="SLES-Pool"/>
+<solvable status="not-installed" name="bar" kind="package" edition="2.0-1" arch="x86_64" repository="SLES-Pool"/>
+</solvable-list></search-result></stream>
+"""
+
+
+def test_zypper_downgrade_versions():
+    downgrade = ZypperDowngrade({}, ["foo", "bar"], None)
+
+    assert downgrade.list_command.endswith("-t package foo bar")
+    assert downgrade.parse_versions(SEARCH) == {"foo": ["1.1-2", "1.0-1"]}
+    assert downgrade.parse_versions("Unknown option") == {}
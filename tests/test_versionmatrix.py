@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+
+from mtui.types.package import Package
+from mtui.types.rpmver import RPMVersion
+from mtui.types.versionmatrix import (
+    NEEDS_UPDATE,
+    NOT_INSTALLED,
+    TOO_RECENT,
+    UPDATED,
+    VersionMatrix,
+    compare,
+)
+
+
+def test_intern():
+    m = VersionMatrix()
+    assert m.host("a") == 0
+    assert m.package("x") == 0
+    assert m.host("b") == 1
+    assert m.host("a") == 0
+    assert m.hosts == ["a", "b"]
+
+
+def test_grow_keeps_cells():
+    m = VersionMatrix()
+    a, b = m.host("a"), m.host("b")
+    x = m.package("x")
+    m.set("required", a, x, "1-1")
+    m.set("required", b, x, "2-1")
+
+    y = m.package("y")
+    m.set("required", a, y, "3-1")
+
+    assert m.get("required", a, x) == "1-1"
+    assert m.get("required", b, x) == "2-1"
+    assert m.get("required", a, y) == "3-1"
+    assert m.get("required", b, y) is None
+    assert m.version("required", b, x) == RPMVersion("2-1")
+
+
+def test_set_none():
+    m = VersionMatrix()
+    a, x = m.host("a"), m.package("x")
+    m.set("current", a, x, "1-1")
+    m.set("current", a, x, None)
+    assert m.get("current", a, x) is None
+    assert m.version("current", a, x) is None
+
+
+def test_compare():
+    m = VersionMatrix()
+    a, b = m.host("a"), m.host("b")
+    for name, required in [("x", "2-1"), ("y", "2-1"), ("z", "2-1")]:
+        m.set("required", a, m.package(name), required)
+    m.set("before", a, m.package("x"), "1-1")
+    m.set("before", a, m.package("y"), "2-1")
+    m.set("before", a, m.package("z"), "3-1")
+    m.set("before", b, m.package("x"), "1-1")
+
+    assert m.compare("before", "required") == {
+        "a": {"x": NEEDS_UPDATE, "y": UPDATED, "z": TOO_RECENT},
+        "b": {},
+    }
+    assert m.compare("before", "required", ["b"]) == {"b": {}}
+
+    m.set("required", b, m.package("x"), "1-1")
+    m.set("required", b, m.package("w"), "1-1")
+    assert m.compare("before", "required", ["b", "c"]) == {
+        "b": {"x": UPDATED, "w": NOT_INSTALLED}
+    }
+
+
+def test_compare_targets_own_packages():
+    m = VersionMatrix()
+    a = m.host("a")
+    m.set("required", a, m.package("x"), "2-1")
+    m.set("required", a, m.package("y"), "2-1")
+    targets = {"a": SimpleNamespace(versions=m, packages={"x": None})}
+
+    assert compare(targets, "before", "required") == {"a": {"x": NOT_INSTALLED}}
+
+
+def test_clear_host():
+    m = VersionMatrix()
+    a, b, x = m.host("a"), m.host("b"), m.package("x")
+    m.set("required", a, x, "1-1")
+    m.set("required", b, x, "1-1")
+    m.clear_host("a")
+    assert m.get("required", a, x) is None
+    assert m.get("required", b, x) == "1-1"
+
+
+def test_package_views():
+    m = VersionMatrix()
+    p = Package("x", m, "a")
+    p.required = "2-1"
+    p.before = "1-1"
+
+    assert Package("x", m, "a").required == "2-1"
+    assert Package("x", m, "b").required is None
+    assert p.version("before") < p.version("required")
+    assert p.after is None
+    assert p.version("after") is None
+
+
+def test_package_own_matrix():
+    p = Package("x")
+    p.current = "1-1"
+    assert p.current == "1-1"
+    assert Package("x").current is None
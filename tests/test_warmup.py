@@ -0,0 +1,106 @@
+from pathlib import Path
+from subprocess import CalledProcessError
+from threading import Event
+from types import SimpleNamespace
+
+import pytest
+
+from mtui.target import Target
+from mtui.target.actions import wait_for_prefetch
+from mtui.template.obstestreport import OBSTestReport
+
+
+def target():
+    return Target(SimpleNamespace(facts_cache=False, hostlog_limit=0), "host")
+
+
+def test_background_jobs_run_in_order():
+    t = target()
+    started = Event()
+    order = []
+
+    def first():
+        started.wait(5)
+        order.append("warm-up")
+
+    def fail():
+        order.append("prefetch")
+        raise RuntimeError
+
+    t.prefetch(first, "warm-up")
+    t.prefetch(fail)
+    assert t.background in (None, ("warm-up", "running"))
+
+    started.set()
+    t.wait_for_prefetch()
+
+    assert order == ["warm-up", "prefetch"]
+    assert t.background == ("prefetch", "failed")
+
+
+def test_only_package_manager_commands_wait():
+    t = target()
+    started = Event()
+    order = []
+    t.connection = SimpleNamespace(
+        run=lambda command, lock, feed: order.append(command) or 0,
+        stdout="",
+        stderr="",
+    )
+
+    t.prefetch(lambda: started.wait(5) and order.append("prefetch"))
+    t.run("uname -r")
+    assert order == ["uname -r"]
+
+    started.set()
+    wait_for_prefetch({"host": t})
+    t.run("zypper -n in foo")
+
+    assert order == ["uname -r", "prefetch", "zypper -n in foo"]
+
+
+class FakeConnection:
+    def __init__(self, exitcode=0):
+        self.exitcode = exitcode
+        self.commands = []
+
+    def execute(self, command, interactive=True):
+        assert not interactive
+        self.commands.append(command)
+        return self.exitcode, "", "error"
+
+
+def fake_target(release, exitcode=0):
+    return SimpleNamespace(
+        hostname="host",
+        system=SimpleNamespace(get_release=lambda: release),
+        connection=FakeConnection(exitcode),
+        issue_repos=lambda repos, rrid: [("issue-1", "http://r/1")],
+    )
+
+
+def report():
+    config = SimpleNamespace(datadir=Path("/nonexistent"), template_dir=Path("/tmp"))
+    return OBSTestReport(config)
+
+
+def test_warm_up_commands():
+    t = fake_target("15")
+
+    report().warm_up(t)
+
+    (command,) = t.connection.commands
+    assert command.startswith("renice -n 19 -p $$")
+    assert command.endswith("; zypper -n ref")
+    assert "issue-1" not in command
+
+
+def test_warm_up_yum():
+    t = fake_target("YUM")
+    report().warm_up(t)
+    assert t.connection.commands[0].endswith("; yum -q makecache")
+
+
+def test_warm_up_failed():
+    with pytest.raises(CalledProcessError):
+        report().warm_up(fake_target("15", exitcode=4))